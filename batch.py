@@ -0,0 +1,141 @@
+"""
+Headless batch runner: answers every prompt of a JSONL file without user interaction.
+
+Each input line is a JSON object with a "prompt" and optionally an "id" (defaults to the line
+number) and a "system" prompt. Conversations run concurrently on one event loop, each with its
+own messages, and tool calls are approved by an ApprovalPolicy instead of the y/n prompt. Results
+are appended to the output file as they finish, so a partial run can be resumed with --resume.
+
+    python batch.py prompts.jsonl results.jsonl --concurrency 16 --approval allow:ShellTool,GptTool
+"""
+from utils.tool_manager import ToolManager
+from utils.response_cache import ResponseCache
+from utils.approval import ApprovalPolicy
+from utils.llm_client import LLMClient
+from typing import Iterator, Set
+import argparse
+import asyncio
+import logging
+import json
+import time
+import os
+
+BASE_SYSTEM_PROMPT = "Help user achieve ends by utilizing and improving available tools"
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already present in an earlier run's output."""
+    if not os.path.exists(output_path):
+        return set()
+    ids = set()
+    with open(output_path) as f:
+        for line in f:
+            try:
+                ids.add(str(json.loads(line)['id']))
+            except (ValueError, KeyError):
+                continue  # A torn last line from an interrupted run
+    return ids
+
+
+def load_jobs(input_path: str, skip: Set[str] = frozenset()) -> Iterator[dict]:
+    """
+    Read jobs lazily so a large input file is never held in memory at once. A line that is not a
+    JSON object becomes a job carrying an "error", so it is reported in the output like a failed job.
+    """
+    with open(input_path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError(f"expected a JSON object, got {type(job).__name__}")
+            except ValueError as e:
+                logging.warning(f"Line {line_number} of {input_path} is not a valid job: {e}")
+                job = {"error": f"Invalid job: {e}"}
+            job['id'] = str(job.get('id', line_number))
+            if job['id'] not in skip:
+                yield job
+
+
+async def run_job(tm: ToolManager, job: dict) -> dict:
+    if 'error' in job:
+        return {"id": job['id'], "error": job['error'], "tool_calls": 0, "elapsed": 0.0}
+    messages = []
+    start = time.perf_counter()
+    try:
+        # Inside the try: a job without a prompt fails on its own instead of ending the batch
+        messages.extend([
+            {"role": "system", "content": job.get('system', BASE_SYSTEM_PROMPT)},
+            {"role": "user", "content": job['prompt']}
+        ])
+        response = await tm.aget_response(messages)
+        result = {"id": job['id'], "response": response.content}
+    except Exception as e:
+        logging.exception(f"Job {job['id']} failed")
+        result = {"id": job['id'], "error": f"{type(e).__name__}: {e}"}
+    result["tool_calls"] = sum(1 for m in messages if isinstance(m, dict) and m.get('role') == 'tool')
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def run_batch(tm: ToolManager, jobs: Iterator[dict], output_path: str, concurrency: int) -> int:
+    """Run jobs with at most `concurrency` conversations in flight; returns the number completed."""
+    done = 0
+
+    with open(output_path, 'a') as output:
+        async def worker():
+            nonlocal done
+            # Workers pull from the shared iterator, so only `concurrency` jobs are ever loaded
+            for job in jobs:
+                result = await run_job(tm, job)
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of prompts without user interaction")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"prompt\", \"system\"} object per line")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations in flight at once")
+    parser.add_argument("--approval", default="never", help="Tool approval policy: always, never, allow:<tools> or deny:<tools>")
+    parser.add_argument("--resume", action="store_true", default=False, help="Skip ids already present in the output file")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the log level")
+    parser.add_argument("--lazy-tools", action="store_true", default=False, help="Register tools from the cached manifest and import each one on first use")
+    parser.add_argument("--tool-workers", type=int, default=1, help="Run the tool calls of one turn concurrently on this many threads")
+    parser.add_argument("--token-budget", type=int, default=None, help="Trim old tool output so each request stays within this many tokens")
+    parser.add_argument("--cache-mode", default="off", choices=["off"] + list(ResponseCache.MODES), help="Cache LLM responses on disk; 'replay' never calls the API")
+    parser.add_argument("--cache-dir", default=".pyline_cache/responses", help="Directory of the LLM response cache")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Maximum in-flight LLM requests")
+    parser.add_argument("--requests-per-minute", type=float, default=None, help="Pace LLM requests to this rate")
+    parser.add_argument("--tokens-per-minute", type=float, default=None, help="Pace LLM requests to this token rate")
+    parser.add_argument("--trace-file", default=None, help="Append timing spans to this JSONL file when the batch ends")
+    parser.add_argument("--metrics-file", default=None, help="Write Prometheus text-format metrics when the batch ends")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    response_cache = ResponseCache(args.cache_dir, mode=args.cache_mode) if args.cache_mode != 'off' else None
+    llm = LLMClient(max_concurrency=args.max_concurrency, requests_per_minute=args.requests_per_minute,
+                    tokens_per_minute=args.tokens_per_minute)
+    tm = ToolManager(lazy=args.lazy_tools, max_tool_workers=args.tool_workers, token_budget=args.token_budget,
+                     response_cache=response_cache, llm=llm, approval=ApprovalPolicy.from_spec(args.approval),
+                     echo_tool_output=False)
+
+    skip = completed_ids(args.output) if args.resume else set()
+    start = time.perf_counter()
+    done = asyncio.run(run_batch(tm, load_jobs(args.input, skip), args.output, args.concurrency))
+    print(f"Completed {done} jobs in {time.perf_counter() - start:.1f}s ({len(skip)} skipped)")
+
+    if args.trace_file:
+        tm.tracer.export_jsonl(args.trace_file)
+    if args.metrics_file:
+        tm.tracer.export_prometheus(args.metrics_file)
+
+
+if __name__ == '__main__':
+    main()
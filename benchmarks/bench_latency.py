@@ -0,0 +1,84 @@
+"""
+End-to-end turn latency of ToolManager.get_response against the local stub server.
+
+Model time is what the stub spent serving requests (its scripted latency and token delays);
+everything else in a turn is overhead added by the framework and the tools it runs.
+
+    python benchmarks/bench_latency.py --turns 50 --latency 0.1 --jitter 0.02 --stream --tool-workers 3
+"""
+from pathlib import Path
+import statistics
+import argparse
+import time
+import json
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+from utils.tool_manager import ToolManager  # noqa: E402
+from utils.approval import ApprovalPolicy  # noqa: E402
+from utils.llm_client import LLMClient  # noqa: E402
+
+SCRIPT = {
+    "plain question": {
+        "content": "A short scripted answer that is streamed back a few words at a time."
+    },
+    "run three commands": {
+        "tool_calls": [
+            {"name": "ShellTool", "arguments": {"input": json.dumps({"command": "echo", "args": ["one"]})}},
+            {"name": "ShellTool", "arguments": {"input": json.dumps({"command": "echo", "args": ["two"]})}},
+            {"name": "ShellTool", "arguments": {"input": json.dumps({"command": "echo", "args": ["three"]})}}
+        ],
+        "content": "All three commands ran."
+    }
+}
+
+
+def percentiles(values):
+    if len(values) < 2:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def report(label, values):
+    p50, p95, p99 = percentiles([v * 1000 for v in values])
+    print(f"{label:<10} p50 {p50:8.1f} ms   p95 {p95:8.1f} ms   p99 {p99:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ToolManager end-to-end latency benchmark")
+    parser.add_argument("--turns", type=int, default=30, help="Turns per scripted prompt")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency to first byte, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the stub latency")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub delay between streamed chunks")
+    parser.add_argument("--stream", action="store_true", default=False, help="Use streaming completions")
+    parser.add_argument("--tool-workers", type=int, default=1, help="Concurrent tool calls per turn")
+    args = parser.parse_args()
+
+    with StubServer(SCRIPT, args.latency, args.jitter, args.token_delay) as server:
+        llm = LLMClient(base_url=server.base_url, api_key='stub')
+        tm = ToolManager(stream=args.stream, max_tool_workers=args.tool_workers, on_delta=lambda text: None, llm=llm,
+                         approval=ApprovalPolicy.from_spec('always'), echo_tool_output=False)
+
+        for prompt in SCRIPT:
+            turns, model, overhead = [], [], []
+            for _ in range(args.turns):
+                messages = [{"role": "system", "content": "benchmark"}, {"role": "user", "content": prompt}]
+                start = time.perf_counter()
+                tm.get_response(messages)
+                elapsed = time.perf_counter() - start
+                model_time = server.model_time(since=start)
+                turns.append(elapsed)
+                model.append(model_time)
+                overhead.append(elapsed - model_time)
+
+            print(f"\n{prompt!r} ({args.turns} turns, stream={args.stream}, tool_workers={args.tool_workers})")
+            report('turn', turns)
+            report('model', model)
+            report('overhead', overhead)
+
+
+if __name__ == '__main__':
+    main()
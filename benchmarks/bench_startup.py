@@ -0,0 +1,62 @@
+"""
+Cold-start benchmark for ToolManager: eager discovery vs. lazy manifest-backed registration.
+
+Each sample runs in a fresh interpreter, as a wrapper script invoking main.py would.
+
+    python benchmarks/bench_startup.py --runs 20
+"""
+from pathlib import Path
+import statistics
+import subprocess
+import argparse
+import time
+import sys
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+from utils.tool_manager import ToolManager
+tm = ToolManager(lazy={lazy})
+print(time.perf_counter() - start)
+"""
+
+
+def sample(lazy: bool):
+    """Return (process wall time, in-process import + init time) for one fresh interpreter."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', SNIPPET.format(lazy=lazy)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    return wall, float(completed.stdout.strip().splitlines()[-1])
+
+
+def report(label, samples):
+    walls = [s[0] * 1000 for s in samples]
+    inits = [s[1] * 1000 for s in samples]
+    print(f"{label:<8} process median {statistics.median(walls):7.1f} ms  min {min(walls):7.1f} ms | "
+          f"import+init median {statistics.median(inits):7.1f} ms  min {min(inits):7.1f} ms")
+    return statistics.median(walls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ToolManager startup-time benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="Number of fresh interpreters per mode")
+    args = parser.parse_args()
+
+    # Warm the manifest so that lazy runs measure the steady state
+    sample(lazy=True)
+
+    eager = [sample(lazy=False) for _ in range(args.runs)]
+    lazy = [sample(lazy=True) for _ in range(args.runs)]
+
+    eager_median = report('eager', eager)
+    lazy_median = report('lazy', lazy)
+    print(f"speedup  {eager_median / lazy_median:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
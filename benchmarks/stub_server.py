@@ -0,0 +1,200 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for benchmarks and end-to-end tests.
+
+Responses are scripted by the content of the last user message:
+
+    {
+        "list files": {
+            "tool_calls": [{"name": "ShellTool", "arguments": {"input": "{\"command\": \"ls\"}"}}],
+            "content": "Here are the files."
+        }
+    }
+
+A request whose last message is a user prompt with scripted tool_calls (and tools offered) gets
+those tool calls back; otherwise it gets the scripted content. Unscripted prompts are echoed.
+Every response waits `latency` ± `jitter` seconds before the first byte, and streamed responses
+wait `token_delay` between chunks and end with a usage chunk when
+`stream_options.include_usage` is set. The time spent serving each request is recorded in `served`.
+
+    python benchmarks/stub_server.py --port 8089 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python main.py "hello"
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import argparse
+import random
+import json
+import time
+import uuid
+
+
+class StubServer:
+    def __init__(self, script=None, latency=0.05, jitter=0.0, token_delay=0.0, host='127.0.0.1', port=0):
+        self.script = script or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.served = []  # (start, end) perf_counter timestamps per request
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def model_time(self, since: float = 0.0) -> float:
+        """Total seconds spent serving requests that started after `since`."""
+        with self.lock:
+            return sum(end - start for start, end in self.served if start >= since)
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def respond(self, request: dict) -> dict:
+        """Decide the assistant message for a request: {'content': ...} or {'tool_calls': [...]}."""
+        messages = request.get('messages', [])
+        last = messages[-1] if messages else {}
+        prompt = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), '') or ''
+        rule = self.script.get(prompt, {})
+
+        if last.get('role') == 'user' and rule.get('tool_calls') and request.get('tools'):
+            return {'tool_calls': [
+                {
+                    'id': f"call_{uuid.uuid4().hex[:12]}",
+                    'type': 'function',
+                    'function': {
+                        'name': call['name'],
+                        'arguments': call['arguments'] if isinstance(call['arguments'], str) else json.dumps(call['arguments'])
+                    }
+                }
+                for call in rule['tool_calls']
+            ]}
+        return {'content': rule.get('content', f"You said: {prompt}")}
+
+    @staticmethod
+    def usage(request: dict, message: dict) -> dict:
+        prompt_tokens = len(json.dumps(request.get('messages', []))) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # Otherwise delayed ACKs add ~40ms to every keep-alive response
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                start = time.perf_counter()
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                request = json.loads(body or b'{}')
+                message = server.respond(request)
+                server.delay()
+                if request.get('stream'):
+                    self.stream(request, message)
+                else:
+                    self.complete(request, message)
+                with server.lock:
+                    server.served.append((start, time.perf_counter()))
+
+            def envelope(self, request, obj):
+                return {'id': f"chatcmpl-{uuid.uuid4().hex[:12]}", 'object': obj, 'created': int(time.time()),
+                        'model': request.get('model', 'stub')}
+
+            def complete(self, request, message):
+                response = self.envelope(request, 'chat.completion')
+                response['choices'] = [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': message.get('content'), 'tool_calls': message.get('tool_calls')},
+                    'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop'
+                }]
+                response['usage'] = server.usage(request, message)
+                data = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, request, message):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                envelope = self.envelope(request, 'chat.completion.chunk')
+
+                def send(delta=None, finish_reason=None, raw=None):
+                    if raw is None:
+                        chunk = dict(envelope, choices=[{'index': 0, 'delta': delta or {}, 'finish_reason': finish_reason}])
+                        raw = json.dumps(chunk)
+                    data = f"data: {raw}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                send({'role': 'assistant'})
+                words = (message.get('content') or '').split(' ')
+                for i, word in enumerate(words if message.get('content') else []):
+                    time.sleep(server.token_delay)
+                    send({'content': word if i == len(words) - 1 else word + ' '})
+                for index, call in enumerate(message.get('tool_calls') or []):
+                    send({'tool_calls': [{'index': index, 'id': call['id'], 'type': 'function',
+                                          'function': {'name': call['function']['name'], 'arguments': ''}}]})
+                    arguments = call['function']['arguments']
+                    for i in range(0, len(arguments), 16):
+                        time.sleep(server.token_delay)
+                        send({'tool_calls': [{'index': index, 'function': {'arguments': arguments[i:i + 16]}}]})
+                send(finish_reason='tool_calls' if message.get('tool_calls') else 'stop')
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    send(raw=json.dumps(dict(envelope, choices=[], usage=server.usage(request, message))))
+                send(raw='[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible chat-completions stub server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first byte of each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the latency, in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--script", help="JSON file mapping user prompts to scripted responses")
+    args = parser.parse_args()
+
+    script = json.load(open(args.script)) if args.script else {}
+    server = StubServer(script, args.latency, args.jitter, args.token_delay, port=args.port)
+    print(f"Serving chat completions on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
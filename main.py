@@ -1,7 +1,10 @@
 from utils.tool_manager import ToolManager
+from utils.response_cache import ResponseCache
+from utils.llm_client import LLMClient
 from colorama import Fore, Style, init
 from pathlib import Path
 import datetime
+import json
 import argparse
 import logging
 
@@ -12,6 +15,19 @@ def main():
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the log level")
     parser.add_argument("--log-file", default=f"log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log", help="Set the log file name")
     parser.add_argument("--state", action="store_true", default=False, help="Whether to include state.txt in initial system.txt prompt")
+    parser.add_argument("--state-query", type=str, default=None, help="Snapshot the files most relevant to this query into state.txt (implies --state)")
+    parser.add_argument("--state-budget", type=int, default=None, help="Cut the state.txt snapshot down to this many tokens (implies --state)")
+    parser.add_argument("--lazy-tools", action="store_true", default=False, help="Register tools from the cached manifest and import each one on first use")
+    parser.add_argument("--tool-workers", type=int, default=1, help="Run the tool calls of one turn concurrently on this many threads")
+    parser.add_argument("--stream", action="store_true", default=False, help="Print assistant output as it is generated")
+    parser.add_argument("--token-budget", type=int, default=None, help="Trim old tool output so each request stays within this many tokens")
+    parser.add_argument("--cache-mode", default="off", choices=["off"] + list(ResponseCache.MODES), help="Cache LLM responses on disk; 'replay' never calls the API")
+    parser.add_argument("--cache-dir", default=".pyline_cache/responses", help="Directory of the LLM response cache")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Maximum in-flight LLM requests")
+    parser.add_argument("--requests-per-minute", type=float, default=None, help="Pace LLM requests to this rate")
+    parser.add_argument("--tokens-per-minute", type=float, default=None, help="Pace LLM requests to this token rate")
+    parser.add_argument("--trace-file", default=None, help="Append timing spans of each turn to this JSONL file")
+    parser.add_argument("--metrics-file", default=None, help="Rewrite this Prometheus text-format file after each turn")
     args = parser.parse_args()
 
     # Set up logging
@@ -28,7 +44,20 @@ def main():
     logging.info(f"Starting the ToolManager CLI...")
 
     init(autoreset=True)
-    tm = ToolManager()
+    # When streaming, the "Assistant:" prefix is printed with the first delta of each turn
+    turn = {'started': False}
+
+    def print_delta(text):
+        if not turn['started']:
+            print(f"{Fore.BLUE}Assistant: {Style.RESET_ALL}", end='')
+            turn['started'] = True
+        print(text, end='', flush=True)
+
+    response_cache = ResponseCache(args.cache_dir, mode=args.cache_mode) if args.cache_mode != 'off' else None
+    llm = LLMClient(max_concurrency=args.max_concurrency, requests_per_minute=args.requests_per_minute,
+                    tokens_per_minute=args.tokens_per_minute)
+    tm = ToolManager(lazy=args.lazy_tools, max_tool_workers=args.tool_workers, stream=args.stream, on_delta=print_delta,
+                     token_budget=args.token_budget, response_cache=response_cache, llm=llm)
 
     prompt = args.prompt
     if prompt.lower() == 'debug':
@@ -37,6 +66,11 @@ def main():
         exit()
 
     base_system_prompt = "Help user achieve ends by utilizing and improving available tools"
+    if args.state_query is not None or args.state_budget is not None:
+        # A budgeted snapshot: the most relevant files in full, signatures only for the rest
+        tm.execute_tool('SnapTool', input=json.dumps({'infra': False, 'query': args.state_query or prompt,
+                                                      'budget': args.state_budget}))
+        args.state = True
     if args.state:
         system_prompt = base_system_prompt + f"\n\nCurrent source code:\n\n{open('state.txt').read()}"
     else:
@@ -56,8 +90,16 @@ def main():
     
 
     while True:
+        turn['started'] = False
         response = tm.get_response(messages)
-        print(f"{Fore.BLUE}Assistant: {Style.RESET_ALL}{response.content}")
+        if args.trace_file:
+            tm.tracer.export_jsonl(args.trace_file)
+        if args.metrics_file:
+            tm.tracer.export_prometheus(args.metrics_file)
+        if args.stream:
+            print()
+        else:
+            print(f"{Fore.BLUE}Assistant: {Style.RESET_ALL}{response.content}")
         user_input = input(f"{Fore.YELLOW}User: {Style.RESET_ALL}")
 
         if user_input.lower() in ['exit', 'quit', 'q']:
@@ -1,7 +1,23 @@
 from utils.tool_manager import ToolManager
+from tests.fakes import FakeClient
 import pytest
 import tools
 
 @pytest.fixture(scope='module')
 def tool_manager():
     return ToolManager()
+
+@pytest.fixture
+def make_manager(monkeypatch):
+    """
+    Build a ToolManager whose LLM replies with the given scripted completions, with the given tool
+    classes registered and every tool call approved.
+    """
+    def make(responses=(), tools=(), **kwargs):
+        tm = ToolManager(**kwargs)
+        for tool_class in tools:
+            tm.tools[tool_class.__name__] = tool_class(tm)
+        tm.llm.client = FakeClient(responses)
+        monkeypatch.setattr('builtins.input', lambda prompt: 'y')
+        return tm
+    return make
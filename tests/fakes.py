@@ -0,0 +1,167 @@
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionChunk
+from openai.types.chat import chat_completion_chunk as chunk_types
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall, Function
+from openai.types.completion_usage import CompletionUsage
+from types import SimpleNamespace
+from tools.base_tool import BaseTool
+import threading
+import asyncio
+import time
+
+
+def completion(content=None, tool_calls=(), usage=None):
+    """Build a ChatCompletion; tool_calls are (id, name, arguments) tuples, usage a (prompt, completion) pair."""
+    message = ChatCompletionMessage(
+        role='assistant',
+        content=content,
+        tool_calls=[
+            ChatCompletionMessageToolCall(id=id, type='function', function=Function(name=name, arguments=arguments))
+            for id, name, arguments in tool_calls
+        ] or None
+    )
+    return ChatCompletion(
+        id='chatcmpl-fake',
+        choices=[Choice(finish_reason='tool_calls' if tool_calls else 'stop', index=0, message=message)],
+        created=int(time.time()),
+        model='fake-model',
+        object='chat.completion',
+        usage=CompletionUsage(prompt_tokens=usage[0], completion_tokens=usage[1], total_tokens=sum(usage)) if usage else None
+    )
+
+
+def stream_chunks(response, events=None, include_usage=False):
+    """
+    Split a ChatCompletion into the chunks a `stream=True` request would yield, ending with a usage
+    chunk if one was requested.
+    """
+    message = response.choices[0].message
+
+    def chunk(finish_reason=None, **delta):
+        if events is not None:
+            events.append('chunk')
+        return ChatCompletionChunk(
+            id=response.id, created=response.created, model=response.model, object='chat.completion.chunk',
+            choices=[chunk_types.Choice(index=0, finish_reason=finish_reason, delta=chunk_types.ChoiceDelta(**delta))]
+        )
+
+    yield chunk(role='assistant')
+    for word in (message.content or '').split(' '):
+        if word:
+            yield chunk(content=word + ' ')
+    for index, tool_call in enumerate(message.tool_calls or []):
+        arguments = tool_call.function.arguments
+        third = max(1, len(arguments) // 3)
+        fragments = [arguments[i:i + third] for i in range(0, len(arguments), third)]
+        yield chunk(tool_calls=[chunk_types.ChoiceDeltaToolCall(
+            index=index, id=tool_call.id, type='function',
+            function=chunk_types.ChoiceDeltaToolCallFunction(name=tool_call.function.name, arguments='')
+        )])
+        for fragment in fragments:
+            yield chunk(tool_calls=[chunk_types.ChoiceDeltaToolCall(
+                index=index, function=chunk_types.ChoiceDeltaToolCallFunction(arguments=fragment)
+            )])
+    yield chunk(finish_reason=response.choices[0].finish_reason)
+    if include_usage and response.usage is not None:
+        # The pinned SDK has no usage field on chunks, so it arrives as an extra (dict) field
+        yield ChatCompletionChunk.model_validate({
+            'id': response.id, 'created': response.created, 'model': response.model,
+            'object': 'chat.completion.chunk', 'choices': [], 'usage': response.usage.model_dump()
+        })
+
+
+class FakeClient:
+    """Stands in for `OpenAI()`, returning scripted completions and recording each request."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        self.events = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        response = self.responses.pop(0)
+        if kwargs.get('stream'):
+            stream_options = (kwargs.get('extra_body') or {}).get('stream_options') or {}
+            return stream_chunks(response, self.events, stream_options.get('include_usage', False))
+        return response
+
+
+class AsyncFakeClient(FakeClient):
+    """
+    Stands in for `AsyncOpenAI()`. With a `gate`, the first `gate` requests are only answered once
+    that many are in flight together, so a test can assert concurrency without timing it.
+    """
+
+    def __init__(self, responses, latency=0.0, gate=0):
+        super().__init__(responses)
+        self.latency = latency
+        self.gate = gate
+        self.arrived = 0
+        self.opened = None  # asyncio.Event, created on the running loop
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, **kwargs):
+        if self.arrived < self.gate:
+            if self.opened is None:
+                self.opened = asyncio.Event()
+            self.arrived += 1
+            if self.arrived == self.gate:
+                self.opened.set()
+            await asyncio.wait_for(self.opened.wait(), timeout=10)
+        await asyncio.sleep(self.latency)
+        response = self.create(**kwargs)
+        if kwargs.get('stream'):
+            return self.aiterate(response)
+        return response
+
+    @staticmethod
+    async def aiterate(chunks):
+        for chunk in chunks:
+            yield chunk
+
+
+class SleepTool(BaseTool):
+    def execute(self, input: str) -> str:
+        """
+        Sleep for a moment and echo the input.
+
+        Args:
+            input (str): text to echo
+        """
+        time.sleep(0.2)
+        return input
+
+
+class OverlapTool(BaseTool):
+    """
+    Echoes the input once `parties` calls are running at the same time (raising after a timeout
+    otherwise), and records the most calls it saw running at once in max_active.
+    """
+
+    def __init__(self, manager, parties=1):
+        super().__init__(manager)
+        self.barrier = threading.Barrier(parties)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def execute(self, input: str) -> str:
+        """
+        Wait for the other calls and echo the input.
+
+        Args:
+            input (str): text to echo
+        """
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            self.barrier.wait(timeout=10)
+            time.sleep(0.05)  # Room for an unserialized call to overlap
+            return input
+        finally:
+            with self.lock:
+                self.active -= 1
@@ -0,0 +1,67 @@
+from utils.tool_manager import ToolManager
+from utils.approval import ApprovalPolicy
+from tests.fakes import AsyncFakeClient, completion
+from batch import completed_ids, load_jobs, run_batch
+import asyncio
+import pytest
+import json
+
+
+def test_approval_policy_specs():
+    assert ApprovalPolicy.from_spec('always')('ExecTool', '{}')
+    assert not ApprovalPolicy.from_spec('never')('ShellTool', '{}')
+    allow = ApprovalPolicy.from_spec('allow:ShellTool, GptTool')
+    assert allow('GptTool', '{}') and not allow('ExecTool', '{}')
+    deny = ApprovalPolicy.from_spec('deny:ExecTool')
+    assert deny('ShellTool', '{}') and not deny('ExecTool', '{}')
+    with pytest.raises(ValueError):
+        ApprovalPolicy.from_spec('sometimes')
+
+def test_policy_replaces_prompt(monkeypatch):
+    def no_input(prompt):
+        raise AssertionError('input() must not be called')
+    monkeypatch.setattr('builtins.input', no_input)
+    tm = ToolManager(approval=ApprovalPolicy.from_spec('allow:ShellTool'), echo_tool_output=False)
+    tool_calls = [
+        ('call_0', 'ShellTool', json.dumps({"input": '{"command": "echo", "args": ["hi"]}'})),
+        ('call_1', 'ExecTool', json.dumps({"input": "print('no')"}))
+    ]
+    tm.llm.async_client = AsyncFakeClient([completion(tool_calls=tool_calls), completion(content='done')])
+    messages = [{"role": "user", "content": "run"}]
+    asyncio.run(tm.aget_response(messages))
+    assert [m['content'] for m in messages if isinstance(m, dict) and m['role'] == 'tool'] == ['hi', 'User rejected tool usage!']
+
+def test_batch_runs_concurrently_and_resumes(tmp_path):
+    input_path, output_path = tmp_path / 'prompts.jsonl', tmp_path / 'results.jsonl'
+    input_path.write_text(''.join(json.dumps({"prompt": f"question {i}"}) + '\n' for i in range(20)))
+    output_path.write_text(json.dumps({"id": "1", "response": "from an earlier run"}) + '\n')
+
+    tm = ToolManager(approval=ApprovalPolicy.from_spec('never'), echo_tool_output=False)
+    tm.llm.async_client = AsyncFakeClient([completion(content='answer')] * 19, latency=0.01, gate=8)
+
+    skip = completed_ids(str(output_path))
+    # The first requests only complete once eight (the client's limit) are in flight together
+    done = asyncio.run(run_batch(tm, load_jobs(str(input_path), skip), str(output_path), concurrency=10))
+
+    results = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert done == 19
+    assert sorted(int(r['id']) for r in results) == list(range(1, 21))
+    assert all(r['response'] == 'answer' for r in results[1:])
+    # Every conversation got its own messages
+    prompts = [request['messages'][1]['content'] for request in tm.llm.async_client.requests]
+    assert sorted(prompts) == sorted(f"question {i}" for i in range(20) if i != 0)
+
+def test_bad_lines_become_error_records(tmp_path):
+    input_path, output_path = tmp_path / 'prompts.jsonl', tmp_path / 'results.jsonl'
+    input_path.write_text('{"prompt": "first"}\n{"prompt": "torn\n{"id": "x", "text": "no prompt"}\n[1, 2]\n{"prompt": "last"}\n')
+
+    tm = ToolManager(approval=ApprovalPolicy.from_spec('never'), echo_tool_output=False)
+    tm.llm.async_client = AsyncFakeClient([completion(content='answer')] * 2)
+    done = asyncio.run(run_batch(tm, load_jobs(str(input_path)), str(output_path), concurrency=2))
+
+    results = {r['id']: r for r in map(json.loads, output_path.read_text().splitlines())}
+    assert done == 5 and sorted(results) == ['1', '2', '4', '5', 'x']
+    assert results['1']['response'] == results['5']['response'] == 'answer'
+    assert results['2']['error'].startswith('Invalid job: ')
+    assert results['x']['error'] == "KeyError: 'prompt'"
+    assert results['4']['error'] == 'Invalid job: expected a JSON object, got list'
@@ -0,0 +1,46 @@
+from utils.channel import Channel
+import threading
+import pytest
+import time
+
+
+def test_channel_applies_backpressure():
+    channel = Channel(max_chars=10)
+    produced = []
+
+    def produce():
+        for i in range(10):
+            channel.put('x' * 5)
+            produced.append(i)
+        channel.close()
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    time.sleep(0.1)
+    assert len(produced) == 2  # Blocked until the consumer makes room
+    assert ''.join(channel) == 'x' * 50
+    thread.join()
+
+def test_channel_reraises_producer_error_and_cancels_on_early_exit():
+    def failing():
+        yield 'partial'
+        raise RuntimeError('boom')
+
+    chunks = iter(Channel.from_iterable(failing()))
+    assert next(chunks) == 'partial'
+    with pytest.raises(RuntimeError, match='boom'):
+        next(chunks)
+
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                yield 'y' * 100
+        finally:
+            closed.set()
+
+    channel = Channel.from_iterable(endless(), max_chars=1000)
+    for _ in channel:
+        break
+    assert closed.wait(1.0)
@@ -0,0 +1,14 @@
+from tools.code_tool import CodeTool
+
+
+def test_tests_passed_requires_a_passing_pytest_summary():
+    assert CodeTool.tests_passed("....\n4 passed in 0.12s\n")
+    assert CodeTool.tests_passed("..\n===== 2 passed, 1 warning in 1.02s =====\n\n[stderr]\nDeprecationWarning\n")
+    assert CodeTool.tests_passed("..\n2 passed in 65.30s (0:01:05)\n")
+
+    assert not CodeTool.tests_passed(".F\n1 failed, 1 passed in 0.10s\n\n[exit status 1]\n")
+    assert not CodeTool.tests_passed("1 passed, 1 error in 0.10s\n")
+    assert not CodeTool.tests_passed("no tests ran in 0.01s\n\n[exit status 5]\n")
+    assert not CodeTool.tests_passed("....\n[timed out after 300s; process group killed]\n")
+    assert not CodeTool.tests_passed("An unexpected error occurred: session died\n")
+    assert not CodeTool.tests_passed("")
@@ -0,0 +1,63 @@
+from utils.context_window import ContextWindow, message_field
+from tests.fakes import completion
+
+
+def make_conversation(exchanges, output_size):
+    messages = [{"role": "system", "content": "system prompt"}]
+    for i in range(exchanges):
+        messages.append({"role": "user", "content": f"question {i}"})
+        assistant = completion(tool_calls=[(f'call_{i}', 'SnapTool', '{}')]).choices[0].message
+        messages.append(assistant)
+        messages.append({"tool_call_id": f'call_{i}', "role": "tool", "name": "SnapTool", "content": 'x' * output_size})
+    return messages
+
+def assert_pairs_intact(messages):
+    for i, message in enumerate(messages):
+        if message_field(message, 'role') == 'tool':
+            j = i
+            while message_field(messages[j], 'role') == 'tool':
+                j -= 1
+            call_ids = [tc.id for tc in messages[j].tool_calls]
+            assert message['tool_call_id'] in call_ids
+
+def test_within_budget_is_untouched():
+    messages = make_conversation(2, 100)
+    window = ContextWindow(token_budget=10_000)
+    before = list(messages)
+    window.fit(messages)
+    assert messages == before
+
+def test_old_tool_outputs_are_truncated_first():
+    messages = make_conversation(3, 20_000)
+    window = ContextWindow(token_budget=6_000)
+    total = window.fit(messages)
+    assert total <= 6_000
+    assert len(messages) == 10  # nothing evicted
+    assert 'truncated' in messages[3]['content']
+    assert messages[-1]['content'] == 'x' * 20_000  # the latest exchange is protected
+    assert_pairs_intact(messages)
+
+def test_old_exchanges_are_evicted_without_splitting_pairs():
+    messages = make_conversation(20, 1_000)
+    window = ContextWindow(token_budget=1_000, keep_recent=2)
+    total = window.fit(messages)
+    assert total <= 1_000
+    assert messages[0]['role'] == 'system'
+    assert messages[-1]['tool_call_id'] == 'call_19'
+    assert_pairs_intact(messages)
+
+def test_summarizer_replaces_truncation():
+    messages = make_conversation(2, 20_000)
+    window = ContextWindow(token_budget=6_000, summarizer=lambda text: f"{len(text)} x's")
+    window.fit(messages)
+    assert messages[3]['content'].endswith("20000 x's")
+
+def test_counts_are_cached_per_message():
+    messages = make_conversation(2, 1_000)
+    window = ContextWindow(token_budget=100_000)
+    first = window.count_messages(messages)
+    calls = []
+    original = window.counter.count_text
+    window.counter.count_text = lambda text: calls.append(text) or original(text)
+    assert window.count_messages(messages) == first
+    assert calls == []
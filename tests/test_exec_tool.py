@@ -1,3 +1,5 @@
+from tools.exec_tool import compile_source
+from utils.exec_pool import ExecPool
 import pytest
 
 
@@ -13,3 +15,60 @@ def test_exec_tool_with_syntax_error(tool_manager):
     code_with_error = 'x = 1 + '
     response = exec_tool.execute(input=code_with_error)
     assert "SyntaxError" in response or "Got error executing" in response
+
+def test_exec_tool_sessions_keep_state(tool_manager):
+    exec_tool = tool_manager.tools['ExecTool']
+    exec_tool.execute(input='import math\ndata = [1, 2, 3]\ndef total():\n    return sum(data)', session='explore')
+    assert exec_tool.execute(input='print(total(), math.pi > 3)', session='explore').strip() == '6 True'
+    assert 'NameError' in exec_tool.execute(input='print(data)')  # Sessionless calls start from scratch
+
+    assert 'NameError' in exec_tool.execute(input='print(data)', session='explore', action='reset')
+    exec_tool.execute(input='data = 1', session='explore')
+    assert exec_tool.execute(input='', session='explore', action='drop') == "Dropped session 'explore'"
+    assert 'NameError' in exec_tool.execute(input='print(data)', session='explore')
+    exec_tool.drop_session('explore')
+
+def test_exec_tool_evicts_least_recently_used_session(tool_manager):
+    exec_tool = tool_manager.tools['ExecTool']
+    exec_tool.max_sessions = 2
+    try:
+        for name in ('a', 'b', 'a', 'c'):
+            exec_tool.execute(input='x = 1', session=name)
+        assert list(exec_tool.sessions) == ['a', 'c']
+        assert compile_source.cache_info().hits > 0  # The repeated snippet was compiled once
+    finally:
+        del exec_tool.max_sessions
+        exec_tool.sessions.clear()
+
+def test_exec_tool_isolated_runs_in_worker_processes(tool_manager):
+    exec_tool = tool_manager.tools['ExecTool']
+    exec_tool.pool = ExecPool(size=2)
+    try:
+        assert exec_tool.allows_parallel(input='', isolated='true') and not exec_tool.allows_parallel(input='')
+        code = 'import os, sys\nprint(os.getpid())\nprint("careful", file=sys.stderr)'
+        pid, stderr = exec_tool.execute(input=code, isolated='true').split('\n[stderr]\n')
+        assert int(pid) != __import__('os').getpid() and stderr == 'careful\n'
+        assert 'NameError' in exec_tool.execute(input='print(manager)', isolated='true')
+
+        exec_tool.isolated_timeout = 0.3
+        assert exec_tool.execute(input='while True: pass', isolated='true') == '[timed out after 0.3s; worker killed]'
+        exec_tool.isolated_memory_bytes = 256 * 1024 ** 2
+        assert 'MemoryError' in exec_tool.execute(input='x = bytearray(1 << 30)', isolated='true')
+        # Killed workers are replaced
+        assert exec_tool.execute(input='print(1 + 1)', isolated='true') == '2\n'
+        assert len(exec_tool.pool.workers) == 2
+    finally:
+        del exec_tool.isolated_timeout, exec_tool.isolated_memory_bytes
+        exec_tool.pool.close()
+        exec_tool.pool = None
+
+def test_isolated_runs_do_not_share_worker_state():
+    pool = ExecPool(size=1)
+    try:
+        first = pool.run('import json, os\njson.leaked = True\nprint(os.getpid())')
+        second = pool.run('import json, os\nprint(hasattr(json, "leaked"))\nprint(os.getpid())')
+        leaked, pid = second.split()
+        assert leaked == 'False' and pid != first.strip()
+        assert len(pool.workers) == 1
+    finally:
+        pool.close()
@@ -1,6 +1,10 @@
+from tools.file_tool import NEW_FILE_MODE, umask
+from utils.line_index import LineIndexCache, PieceTable
 import pytest
 import json
 import os
+import random
+import difflib
 
 
 def test_create_and_remove_file(tool_manager):
@@ -147,4 +151,148 @@ def test_non_existing_line_operations(tool_manager, temp_file):
     )
     result = tool_manager.execute_tool('FileTool', input=input_str)
     error = result.split('\n')[-1]
-    assert error == ' Line number out of range'
\ No newline at end of file
+    assert error == ' Line number out of range'
+
+def test_batch_is_applied_in_one_pass_or_not_at_all(tool_manager, temp_file, tmp_path):
+    other = tmp_path / 'other.txt'
+    ops = [{"action": "insert", "path": temp_file, "line_number": n, "content": f"new {n}"} for n in range(1, 51)]
+    ops += [
+        {"action": "create", "path": str(other), "content": "other"},
+        {"action": "update", "path": temp_file, "line_number": 99, "content": "out of range"},
+    ]
+    result = tool_manager.execute_tool('FileTool', input=json.dumps(ops))
+    assert result.endswith('Line number out of range')
+    # The failing operation came last, but no file was touched
+    assert open(temp_file).read() == "Line 1\nLine 2\nLine 3\n" and not other.exists()
+
+    tool_manager.execute_tool('FileTool', input=json.dumps(ops[:-1]))
+    lines = open(temp_file).read().splitlines()
+    assert lines[:50] == [f"new {n}" for n in range(1, 51)] and lines[50:] == ["Line 1", "Line 2", "Line 3"]
+    assert other.read_text() == "other\n"
+    assert sorted(os.listdir(tmp_path)) == ['other.txt', 'test.txt']  # No temp files left behind
+
+def test_atomic_writes_keep_modes_and_symlinks(tool_manager, tmp_path):
+    created = tmp_path / 'created.txt'
+    tool_manager.execute_tool('FileTool', input=json.dumps([{"action": "create", "path": str(created), "content": "x"}]))
+    assert os.stat(created).st_mode & 0o777 == NEW_FILE_MODE == 0o666 & ~umask()
+
+    target = tmp_path / 'target.txt'
+    target.write_text("Line 1\n")
+    target.chmod(0o640)
+    link = tmp_path / 'link.txt'
+    link.symlink_to(target)
+    tool_manager.execute_tool('FileTool', input=json.dumps([{"action": "update", "path": str(link), "line_number": 1, "content": "Line one"}]))
+    assert link.is_symlink() and os.readlink(link) == str(target)
+    assert target.read_text() == "Line one\n" and os.stat(target).st_mode & 0o777 == 0o640
+
+def test_spellings_of_one_path_share_pending_edits(tool_manager, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'a.txt').write_text("Line 1\n")
+    (tmp_path / 'link.txt').symlink_to(tmp_path / 'a.txt')
+    ops = [
+        {"action": "insert", "path": "a.txt", "line_number": 1, "content": "Line 0"},
+        {"action": "update", "path": "./a.txt", "line_number": 2, "content": "Line one"},  # Sees the insert
+        {"action": "delete", "path": "link.txt", "line_number": 1},
+        {"action": "read", "path": str(tmp_path / 'a.txt')},
+    ]
+    result = tool_manager.execute_tool('FileTool', input=json.dumps(ops))
+    assert result.splitlines()[1] == "Line one"
+    assert (tmp_path / 'a.txt').read_text() == "Line one\n" and (tmp_path / 'link.txt').is_symlink()
+
+def test_large_files_are_edited_through_a_line_index(tool_manager, tmp_path):
+    path = tmp_path / 'big.log'
+    path.write_text(''.join(f"entry {n}\n" for n in range(1, 10001)) + "no newline")
+
+    # Random edits through the piece table match the same edits on a list of lines
+    expected = path.read_text().splitlines(keepends=True)
+    table = PieceTable(str(path), LineIndexCache())
+    rng = random.Random(0)
+    for step in range(300):
+        line = rng.randrange(len(expected))
+        choice = rng.choice(['insert', 'update', 'delete', 'splice'])
+        if choice == 'splice':
+            stop = line + rng.randrange(3)
+            expected[line:stop] = table[line:stop] = [f"spliced {step}\n"] * rng.randrange(3)
+        elif choice == 'insert':
+            expected.insert(line, f"new {step}\n"), table.insert(line, f"new {step}\n")
+        elif choice == 'update':
+            expected[line] = table[line] = f"updated {step}\n"
+        else:
+            assert table.pop(line) == expected.pop(line)
+    assert len(table) == len(expected) and table.read(0, len(table)) == ''.join(expected)
+    table.close()
+
+    file_tool = tool_manager.tools['FileTool']
+    file_tool.large_file_bytes = 1024
+    try:
+        ops = [
+            {"action": "update", "path": str(path), "line_number": 5000, "content": "changed"},
+            {"action": "insert", "path": str(path), "line_number": 1, "content": "header"},
+            {"action": "read", "path": str(path), "start_line": 5000, "end_line": 5002},
+        ]
+        result = tool_manager.execute_tool('FileTool', input=json.dumps(ops))
+        assert result == f"[{path}, from line 5000]\nentry 4999\nchanged\nentry 5001\nFile operations executed successfully."
+        lines = path.read_text().split('\n')
+        assert lines[0] == 'header' and lines[5000] == 'changed' and lines[-1] == 'no newline' and len(lines) == 10002
+
+        read = {"action": "read", "path": str(path), "start_line": 10001}
+        assert tool_manager.execute_tool('FileTool', input=json.dumps(read)) == f"[{path}, from line 10001]\nentry 10000\nno newline"
+        index = file_tool.line_indexes.entries[str(path)]
+        tool_manager.execute_tool('FileTool', input=json.dumps(read))
+        assert file_tool.line_indexes.entries[str(path)] is index  # Unchanged file: the index is reused
+    finally:
+        del file_tool.large_file_bytes
+
+def test_range_search_and_patch_edits(tool_manager, tmp_path):
+    path = tmp_path / 'app.py'
+    path.write_text(''.join(f"line {n}\n" for n in range(1, 21)))
+    patch = (
+        "--- a/app.py\n+++ b/app.py\n"
+        "@@ -4,3 +4,3 @@\n line 4\n-line 5\n+five\n line 6\n"
+        # Wrong line number and one context line that no longer matches: found by search and fuzz
+        "@@ -10,4 +10,4 @@\n line 13\n line 14\n-line 15\n+fifteen\n stale context\n"
+    )
+    ops = [
+        {"action": "replace_range", "path": str(path), "start_line": 1, "end_line": 2, "content": "one and two"},
+        {"action": "search_replace", "path": str(path), "search": "line 20\n", "replace": "twenty\n"},
+        {"action": "apply_patch", "path": str(path), "patch": patch},
+    ]
+    tool_manager.execute_tool('FileTool', input=json.dumps(ops))
+    lines = path.read_text().splitlines()
+    assert lines[:5] == ["one and two", "line 3", "line 4", "five", "line 6"]
+    assert lines[12:15] == ["line 14", "fifteen", "line 16"] and lines[-1] == "twenty"
+
+    # Ambiguous or missing search text and hunks that do not apply fail the whole batch
+    before = path.read_text()
+    for op, error in [
+        ({"action": "search_replace", "search": "line 1", "replace": "x"}, "occurs 9 times"),
+        ({"action": "search_replace", "search": "absent", "replace": "x"}, "not found"),
+        ({"action": "apply_patch", "patch": "@@ -1,2 +1,2 @@\n nope\n-nothing\n+x\n"}, "Hunk 1 of the patch does not apply"),
+        ({"action": "replace_range", "start_line": 5, "end_line": 99, "content": ""}, "out of range"),
+    ]:
+        result = tool_manager.execute_tool('FileTool', input=json.dumps([
+            {"action": "insert", "path": str(path), "line_number": 1, "content": "first"}, dict(op, path=str(path))
+        ]))
+        assert error in result and path.read_text() == before
+
+    tool_manager.execute_tool('FileTool', input=json.dumps(
+        {"action": "search_replace", "path": str(path), "search": "line 1", "replace": "L1", "all": True}))
+    assert path.read_text().count("L1") == 9
+
+def test_zero_context_patches_round_trip(tool_manager, tmp_path):
+    original = [f"line {n}\n" for n in range(1, 21)]
+    edited = list(original)
+    # Pure insertions ("-N,0") have no lines to find again, so each relies on the offset left by the ones before
+    edited[2:2] = ["added a\n", "added b\n"]
+    edited[8:8] = ["added c\n"]
+    edited[12] = "changed\n"
+    edited[15:15] = ["added d\n"]
+    del edited[18]
+    edited.append("added at end\n")
+    patch = ''.join(difflib.unified_diff(original, edited, 'a', 'b', n=0))
+    assert patch.count('@@ -') == 6 and patch.count(',0 +') == 4
+
+    target = tmp_path / 'numbers.txt'
+    target.write_text(''.join(original))
+    tool_manager.execute_tool('FileTool', input=json.dumps([{"action": "apply_patch", "path": str(target), "patch": patch}]))
+    assert target.read_text() == ''.join(edited)
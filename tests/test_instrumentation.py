@@ -0,0 +1,75 @@
+from utils.instrumentation import Tracer
+from tests.fakes import AsyncFakeClient, SleepTool, completion
+import asyncio
+import json
+
+
+def traced_manager(make_manager, workers, stream=False):
+    tool_calls = [(f'call_{i}', 'SleepTool', '{"input": "x"}') for i in range(2)]
+    responses = [completion(tool_calls=tool_calls, usage=(100, 20)), completion(content='done', usage=(150, 5))]
+    return make_manager(responses, tools=[SleepTool], max_tool_workers=workers, stream=stream, on_delta=lambda text: None)
+
+def test_turn_spans_nest_across_tool_threads(make_manager):
+    tm = traced_manager(make_manager, workers=2)
+    tm.get_response([{"role": "user", "content": "sleep twice"}])
+
+    spans = list(tm.tracer.spans)
+    turn = next(s for s in spans if s.kind == 'turn')
+    completions = [s for s in spans if s.kind == 'completion']
+    tool_calls = [s for s in spans if s.kind == 'tool_call']
+    assert len(completions) == 2 and len(tool_calls) == 2
+    # Tool calls ran on pool threads but still hang off the turn
+    assert all(s.parent_id == turn.id and s.trace_id == turn.id for s in completions + tool_calls)
+    assert all(s.name == 'SleepTool' and s.wall >= 0.2 for s in tool_calls)
+    assert [s.attributes['prompt_tokens'] for s in completions] == [100, 150]
+    assert turn.wall >= max(s.wall for s in tool_calls)
+
+def test_streamed_turns_record_token_usage(make_manager):
+    tm = traced_manager(make_manager, workers=1, stream=True)
+    tm.get_response([{"role": "user", "content": "sleep twice"}])
+
+    completions = [s for s in tm.tracer.spans if s.kind == 'completion']
+    assert all(s.attributes['stream'] for s in completions)
+    assert [s.attributes['prompt_tokens'] for s in completions] == [100, 150]
+    assert [s.attributes['completion_tokens'] for s in completions] == [20, 5]
+
+def test_async_spans_measure_cpu_on_their_own_thread(make_manager):
+    tm = traced_manager(make_manager, workers=2)
+    tm.llm.async_client = AsyncFakeClient(tm.llm.client.responses)
+    asyncio.run(tm.aget_response([{"role": "user", "content": "sleep twice"}]))
+
+    spans = list(tm.tracer.spans)
+    tool_calls = [s for s in spans if s.kind == 'tool_call']
+    # Tool calls ran on worker threads, where their CPU time is their own; the turn and completions
+    # ran on the event loop, whose CPU time is shared with every other task
+    assert len(tool_calls) == 2 and all(s.cpu is not None and s.cpu < s.wall for s in tool_calls)
+    assert all(s.cpu is None for s in spans if s.kind in ('turn', 'completion'))
+
+def test_pipeline_steps_nest_under_tool_call(tool_manager):
+    tracer = tool_manager.tracer = Tracer()
+    pipeline = [{"id": "a", "tool": "ShellTool", "parameters": {"input": '{"command": "echo", "args": ["hi"]}'}}]
+    tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline))
+
+    step = next(s for s in tracer.spans if s.kind == 'pipeline_step')
+    shell = next(s for s in tracer.spans if s.name == 'ShellTool')
+    pipeline_call = next(s for s in tracer.spans if s.name == 'PipelineTool')
+    assert step.name == 'a' and step.parent_id == pipeline_call.id
+    assert shell.parent_id == step.id
+
+def test_exports(make_manager, tmp_path):
+    tm = traced_manager(make_manager, workers=1)
+    tm.get_response([{"role": "user", "content": "sleep twice"}])
+
+    trace_path = tmp_path / 'trace.jsonl'
+    tm.tracer.export_jsonl(str(trace_path))
+    tm.tracer.export_jsonl(str(trace_path))  # Nothing new, nothing appended
+    records = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert len(records) == 5
+    assert {r['kind'] for r in records} == {'turn', 'completion', 'tool_call'}
+
+    metrics_path = tmp_path / 'metrics.prom'
+    tm.tracer.export_prometheus(str(metrics_path))
+    metrics = metrics_path.read_text()
+    assert '# TYPE pyline_spans_total counter' in metrics
+    assert 'pyline_spans_total{kind="tool_call",name="SleepTool"} 2' in metrics
+    assert 'pyline_prompt_tokens_total{model="gpt-4-1106-preview"} 250' in metrics
@@ -0,0 +1,111 @@
+from utils.llm_client import LLMClient, TokenBucket
+from tests.fakes import AsyncFakeClient, FakeClient, completion
+from concurrent.futures import ThreadPoolExecutor
+from utils.tool_manager import ToolManager
+import threading
+import asyncio
+import openai
+import httpx
+import pytest
+import time
+
+
+def status_error(status, headers=None):
+    request = httpx.Request('POST', 'http://stub/v1/chat/completions')
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    error_cls = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_cls(f"status {status}", response=response, body=None)
+
+
+class FlakyClient(FakeClient):
+    def __init__(self, errors, responses):
+        super().__init__(responses)
+        self.errors = list(errors)
+        self.attempts = []
+
+    def create(self, **kwargs):
+        self.attempts.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().create(**kwargs)
+
+
+def test_retries_honor_retry_after():
+    client = FlakyClient([status_error(429, {'retry-after': '0.2'})], [completion(content='ok')])
+    llm = LLMClient(client=client, backoff_base=0.01)
+    response = llm.create(model='m', messages=[{"role": "user", "content": "hi"}])
+    assert response.choices[0].message.content == 'ok'
+    assert len(client.attempts) == 2
+    assert client.attempts[1] - client.attempts[0] >= 0.2
+
+def test_retries_give_up_after_max_retries():
+    client = FlakyClient([status_error(500)] * 3, [])
+    llm = LLMClient(client=client, max_retries=2, backoff_base=0.01)
+    with pytest.raises(openai.InternalServerError):
+        llm.create(model='m', messages=[])
+    assert len(client.attempts) == 3
+
+def test_non_retryable_errors_raise_immediately():
+    client = FlakyClient([ValueError('bad request')], [])
+    with pytest.raises(ValueError):
+        LLMClient(client=client).create(model='m', messages=[])
+    assert len(client.attempts) == 1
+
+def test_concurrency_is_capped():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    class SlowClient(FakeClient):
+        def create(self, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return completion(content='ok')
+
+    llm = LLMClient(client=SlowClient([]), max_concurrency=2)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(lambda _: llm.create(model='m', messages=[]), range(6)))
+    assert peak[0] == 2
+
+def test_token_bucket_paces_reservations():
+    bucket = TokenBucket(per_minute=600, burst_seconds=0.1)  # 10/s, burst of 1
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.02)
+
+def test_gpt_tool_shares_the_manager_client():
+    client = FakeClient([completion(content='4')])
+    tm = ToolManager(llm=LLMClient(client=client))
+    assert tm.execute_tool('GptTool', input='[{"role": "user", "content": "2+2?"}]') == '4'
+    assert client.requests[0]['model'] == tm.tools['GptTool'].model
+
+def test_streams_hold_their_slot_until_drained():
+    stream_params = dict(model='m', messages=[], stream=True, extra_body={'stream_options': {'include_usage': True}})
+    total_tokens = lambda usage: usage['total_tokens'] if isinstance(usage, dict) else usage.total_tokens
+    llm = LLMClient(client=FakeClient([completion(content='one two', usage=(10, 5))] * 2), max_concurrency=1)
+    settled = []
+    llm.limiter.settle = lambda estimated, usage: settled.append(usage)
+
+    stream = llm.create(**stream_params)
+    assert not llm.limiter.semaphore.acquire(blocking=False)  # Held while the stream is read
+    assert ''.join(c.choices[0].delta.content or '' for c in stream if c.choices) == 'one two '
+    assert llm.limiter.semaphore.acquire(blocking=False)
+    llm.limiter.semaphore.release()
+    assert [total_tokens(usage) for usage in settled] == [15]
+
+    llm.create(**stream_params).close()  # Abandoned before the usage chunk
+    assert llm.limiter.semaphore.acquire(blocking=False)
+    llm.limiter.semaphore.release()
+    assert settled[1] is None
+
+    async def stream_async():
+        llm.async_client = AsyncFakeClient([completion(content='one', usage=(10, 5))])
+        stream = await llm.acreate(**stream_params)
+        assert llm.limiter.loop_semaphore().locked()
+        chunks = [chunk async for chunk in stream]
+        assert not llm.limiter.loop_semaphore().locked()
+        return chunks
+    assert len(asyncio.run(stream_async())) == 4
+    assert total_tokens(settled[2]) == 15
@@ -1,5 +1,10 @@
 from tools.pipeline_tool import PipelineTool
+from utils.tool_manager import ToolManager
+from tests.fakes import OverlapTool, SleepTool
+from utils.templates import compile_template
 import json
+import os
+import threading
 
 
 def test_simple_pipeline(tool_manager):
@@ -43,3 +48,121 @@ def test_substitution_pipeline(tool_manager):
     
     result = tool_manager.execute_tool('PipelineTool', input=input_str)
     assert json.loads(result).get('echoResult') == "hello world"
+
+def test_independent_steps_run_in_parallel():
+    tm = ToolManager()
+    tm.tools['OverlapTool'] = OverlapTool(tm, parties=4)  # Only finishes once all four steps run together
+    tm.tools['SleepTool'] = SleepTool(tm)
+    pipeline = [{"id": f"s{i}", "tool": "OverlapTool", "parameters": {"input": f"out{i}"}} for i in range(4)]
+    pipeline.append({"id": "joined", "tool": "SleepTool", "parameters": {"input": "${s0}+${s3}"}})
+    pipeline.append({"id": "last", "tool": "ExecTool", "parameters": {"input": "print('after')"}, "depends_on": ["joined"]})
+
+    result = json.loads(tm.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert list(result) == ['s0', 's1', 's2', 's3', 'joined', 'last']
+    assert result['joined'] == 'out0+out3'
+    assert result['last'] == 'after\n'
+
+def test_placeholders_bind_to_latest_earlier_step(tool_manager):
+    pipeline = [
+        {"id": "x", "tool": "ExecTool", "parameters": {"input": "print('first', end='')"}},
+        {"id": "y", "tool": "ExecTool", "parameters": {"input": "print('${x}', end='')"}},
+        {"id": "x", "tool": "ExecTool", "parameters": {"input": "print('second', end='')"}},
+        {"id": "z", "tool": "ExecTool", "parameters": {"input": "print('${x} ${later}', end='')"}},
+    ]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert result == {"x": "second", "y": "first", "z": "second ${later}"}
+
+def test_dependency_cycle_is_rejected(tool_manager):
+    pipeline = [
+        {"id": "a", "tool": "ShellTool", "parameters": {"input": {"command": "touch", "args": ["never"]}}, "depends_on": ["b"]},
+        {"id": "b", "tool": "ShellTool", "parameters": {"input": {"command": "echo", "args": ["${a}"]}}},
+    ]
+    result = tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline))
+    assert 'dependency cycle between steps: a, b' in result
+    assert not os.path.exists('never')
+
+def test_streaming_step_consumes_output_while_produced(tool_manager, tmp_path):
+    source = tmp_path / 'numbers.txt'
+    source.write_text(''.join(f'{i}\n' for i in range(200000)))
+    pipeline = [
+        {"id": "numbers", "tool": "ShellTool", "parameters": {"input": {"command": "cat", "args": [str(source)]}}},
+        {"id": "matches", "tool": "ShellTool", "parameters": {"input": {"command": "grep", "args": ["-c", "99"]}}, "stream_from": "numbers"},
+        {"id": "count", "tool": "ShellTool", "parameters": {"input": {"command": "wc", "args": ["-c"]}}, "stream_from": "matches"},
+        {"id": "after", "tool": "ShellTool", "parameters": {"input": {"command": "echo", "args": ["done"]}}, "depends_on": ["numbers"]},
+    ]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    expected = sum('99' in str(i) for i in range(200000))
+    assert result['count'].strip() == str(len(f'{expected}\n\n'))
+    assert result['numbers'] == f"[streamed {source.stat().st_size + 1} characters to step 'matches']"
+    assert result['after'] == 'done'
+
+def test_streamed_output_is_buffered_for_non_streaming_tool(tool_manager):
+    pipeline = [
+        {"id": "greeting", "tool": "ShellTool", "parameters": {"input": {"command": "echo", "args": ["hi"]}}},
+        {"id": "shout", "tool": "ExecTool", "parameters": {"input": "print('''${greeting}'''.upper(), end='')"}, "stream_from": "greeting"},
+    ]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert result['shout'] == 'HI\n\n'
+
+def test_streamed_output_cannot_be_referenced_elsewhere(tool_manager):
+    pipeline = [
+        {"id": "a", "tool": "ShellTool", "parameters": {"input": {"command": "echo", "args": ["x"]}}},
+        {"id": "b", "tool": "ShellTool", "parameters": {"input": {"command": "cat"}}, "stream_from": "a"},
+        {"id": "c", "tool": "ShellTool", "parameters": {"input": {"command": "echo", "args": ["${a}"]}}},
+    ]
+    result = tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline))
+    assert "cannot use the output of 'a'" in result
+
+def test_substitute_placeholders_recurses_and_keeps_elements():
+    unchanged = {"flag": True, "names": ["a", "b"]}
+    params = {
+        "input": {"command": "echo", "args": ["-n", "${a}-${b}", ["${a}", {"deep": "${b}"}], "${unknown}"]},
+        "options": unchanged
+    }
+    PipelineTool.substitute_placeholders(params, {"a": "1", "b": "${a}"})
+    assert params["input"]["args"] == ["-n", "1-${a}", ["1", {"deep": "${a}"}], "${unknown}"]
+    assert params["options"] is unchanged  # Values without placeholders are not copied
+
+def test_template_refs_and_whole_value_placeholder():
+    output = 'x' * 100000
+    template = compile_template({"input": "${big}", "other": ["${a}", "${big} tail"]})
+    assert template.refs == {"big", "a"}
+    resolved = template.resolve({"big": output})
+    assert resolved["input"] is output
+    assert resolved["other"] == ["${a}", output + " tail"]
+    assert compile_template({"input": ["plain", {"x": 1}]}) is None
+
+def test_tool_can_run_itself_through_a_pipeline(tool_manager):
+    # ExecTool is not parallel-safe; the nested step runs on a pipeline thread while the outer call holds its lock
+    inner = json.dumps([{"id": "a", "tool": "ExecTool", "parameters": {"input": "print(1)"}}])
+    source = f"print(manager.execute_tool('PipelineTool', input={inner!r}))"
+    result = []
+    thread = threading.Thread(target=lambda: result.append(tool_manager.execute_tool('ExecTool', input=source)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "nested call deadlocked on the tool lock"
+    assert json.loads(result[0]) == {"a": "1\n"}
+
+def test_streamed_results_are_bounded(tool_manager, tmp_path):
+    source = tmp_path / 'big.txt'
+    source.write_text('x' * 5_000_000)
+    pipeline = [
+        {"id": "big", "tool": "ShellTool", "parameters": {"input": {"command": "cat", "args": [str(source)]}}},
+        {"id": "copy", "tool": "ShellTool", "parameters": {"input": {"command": "cat"}}, "stream_from": "big"},
+        {"id": "len", "tool": "ExecTool", "parameters": {"input": "print(len('''${copy}'''))"}, "stream_from": "copy"},
+    ]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert int(result['len']) < 70_000  # The consumer's placeholder is capped like non-streamed output
+    assert result['copy'].startswith('[streamed ') and result['big'].startswith('[streamed ')
+
+    pipeline = pipeline[:2]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert len(result['copy']) < 70_000 and 'bytes truncated' in result['copy']
+
+def test_streamed_output_of_unbounded_tools_is_kept_whole(tool_manager):
+    pipeline = [
+        {"id": "big", "tool": "ExecTool", "parameters": {"input": "print('x' * 100_000, end='')"}},
+        {"id": "len", "tool": "ExecTool", "parameters": {"input": "print(len('''${big}'''), end='')"}, "stream_from": "big"},
+    ]
+    result = json.loads(tool_manager.execute_tool('PipelineTool', input=json.dumps(pipeline)))
+    assert result['len'] == '100000'  # As with a plain ${big}: ExecTool does not cap its output
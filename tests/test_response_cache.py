@@ -0,0 +1,99 @@
+from utils.response_cache import ResponseCache, CacheMiss
+from utils.tool_manager import ToolManager
+from tests.fakes import FakeClient, completion
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pytest
+import json
+import time
+import os
+
+
+def test_identical_requests_hit_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    tm = ToolManager(response_cache=cache)
+    tm.llm.client = FakeClient([completion(content='first'), completion(content='second')])
+
+    messages = [{"role": "user", "content": "hello"}]
+    assert tm.get_response(list(messages)).content == 'first'
+    assert tm.get_response(list(messages)).content == 'first'
+    assert len(tm.llm.client.requests) == 1
+
+    assert tm.get_response([{"role": "user", "content": "different"}]).content == 'second'
+    assert len(tm.llm.client.requests) == 2
+
+def test_gpt_tool_uses_the_cache(tmp_path):
+    tm = ToolManager(response_cache=ResponseCache(str(tmp_path)))
+    gpt_tool = tm.tools['GptTool']
+    tm.llm.client = FakeClient([completion(content='4')])
+    prompt = json.dumps([{"role": "user", "content": "What is 2+2?"}])
+    assert gpt_tool.execute(prompt) == '4'
+    assert gpt_tool.execute(prompt) == '4'
+    assert len(tm.llm.client.requests) == 1
+
+def test_replay_mode_never_calls_the_api(tmp_path):
+    recorded = ToolManager(response_cache=ResponseCache(str(tmp_path)))
+    recorded.llm.client = FakeClient([completion(content='recorded')])
+    recorded.get_response([{"role": "user", "content": "hello"}])
+
+    replay = ToolManager(response_cache=ResponseCache(str(tmp_path), mode='replay'))
+    replay.llm.client = FakeClient([])
+    assert replay.get_response([{"role": "user", "content": "hello"}]).content == 'recorded'
+    with pytest.raises(CacheMiss):
+        replay.get_response([{"role": "user", "content": "unrecorded"}])
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    key = cache.key(model='m', messages=[])
+    cache.put(key, completion(content='old'))
+    assert cache.get(key).choices[0].message.content == 'old'
+
+    with open(cache.path(key)) as f:
+        entry = json.load(f)
+    entry['created'] = time.time() - 120
+    with open(cache.path(key), 'w') as f:
+        json.dump(entry, f)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.path(key))
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=3000)
+    keys = [cache.key(model='m', messages=[{"role": "user", "content": str(i)}]) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, completion(content='x' * 1000))
+        os.utime(cache.path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0])  # keys[0] becomes the most recently used
+    cache.put(keys[2], completion(content='x' * 1000))
+
+    assert os.path.exists(cache.path(keys[0]))
+    assert not os.path.exists(cache.path(keys[1]))
+    assert os.path.exists(cache.path(keys[2]))
+    assert cache.size <= 3000
+
+def test_gpt_tool_cache_hits_are_traced(tmp_path):
+    tm = ToolManager(response_cache=ResponseCache(str(tmp_path)))
+    tm.llm.client = FakeClient([completion(content='4', usage=(10, 1))])
+    prompt = json.dumps([{"role": "user", "content": "What is 2+2?"}])
+    tm.tools['GptTool'].execute(prompt)
+    tm.tools['GptTool'].execute(prompt)
+
+    completions = [s for s in tm.tracer.spans if s.kind == 'completion']
+    assert [s.attributes['cached'] for s in completions] == [False, True]
+    assert completions[0].attributes['prompt_tokens'] == 10
+
+def test_concurrent_puts_and_evictions(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=5000)
+    keys = [cache.key(model='m', messages=[{"role": "user", "content": str(i % 4)}]) for i in range(8)]
+    barrier = threading.Barrier(len(keys))
+
+    def store_and_read(key):
+        barrier.wait(timeout=10)
+        for _ in range(20):
+            cache.put(key, completion(content='x' * 1000))
+            hit = cache.get(key)  # None when another thread evicted it in between
+            assert hit is None or hit.choices[0].message.content == 'x' * 1000
+
+    with ThreadPoolExecutor(len(keys)) as pool:
+        list(pool.map(store_and_read, keys))
+    assert cache.size == cache.disk_usage() <= 5000
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith('.tmp')]
@@ -0,0 +1,44 @@
+from utils.tool_manager import ToolManager
+from tools.base_tool import BaseTool
+
+
+def test_tools_json_is_prebuilt(tool_manager):
+    first = tool_manager.get_tools_json()
+    second = tool_manager.get_tools_json()
+    assert first is second
+    assert {t['function']['name'] for t in first} == set(tool_manager.tools)
+
+def test_only_changed_tool_is_rebuilt():
+    tm = ToolManager()
+    before = tm.get_tools_json()
+    version = tm.schema_registry.version
+
+    class ExecTool(BaseTool):
+        def execute(self, input: str, extra: str = '') -> str:
+            """
+            Replacement tool.
+
+            Args:
+                input (str): some input
+                extra (str): something extra
+            """
+            return input
+
+    tm.tools['ExecTool'] = ExecTool(tm)
+    assert tm.schema_registry.sync(tm.tools) == 1
+    assert tm.schema_registry.version == version + 1
+
+    after = tm.get_tools_json()
+    assert after is not before
+    schema = next(t for t in after if t['function']['name'] == 'ExecTool')
+    assert schema['function']['description'] == 'Replacement tool.'
+    assert 'extra' in schema['function']['parameters']['properties']
+    # Entries of untouched tools are reused as-is
+    untouched = [t for t in after if t['function']['name'] != 'ExecTool']
+    assert all(any(t is b for b in before) for t in untouched)
+
+def test_removed_tool_is_dropped():
+    tm = ToolManager()
+    del tm.tools['ShellTool']
+    names = {t['function']['name'] for t in tm.get_tools_json()}
+    assert 'ShellTool' not in names
@@ -1,5 +1,9 @@
 from tools.shell_tool import ShellTool
+from utils.shell_session import ShellSessions
+from utils.tool_manager import ToolManager
 import json
+import asyncio
+import time
 
 
 def test_echo(tool_manager):
@@ -11,3 +15,107 @@ def test_echo(tool_manager):
     )
     result = tool_manager.execute_tool('ShellTool', input=input_str)
     assert result == 'greetings'
+
+def test_echo_async(tool_manager):
+    input_str = json.dumps(
+        [
+            {"command": "echo", "args": ["first"]},
+            {"command": "echo", "args": ["second"]}
+        ]
+    )
+    result = asyncio.run(tool_manager.aexecute_tool('ShellTool', input=input_str))
+    assert result == 'first\n\nsecond'
+
+def test_session_keeps_state_and_splits_streams(tool_manager, tmp_path):
+    commands = [
+        {"command": "cd", "args": [str(tmp_path)], "session": "test"},
+        {"command": "export", "args": ["GREETING=hello there"], "session": "test"},
+    ]
+    tool_manager.execute_tool('ShellTool', input=json.dumps(commands))
+
+    result = tool_manager.execute_tool('ShellTool', input=json.dumps([
+        {"command": "pwd", "session": "test"},
+        {"command": "printenv", "args": ["GREETING"], "session": "test"},
+        {"command": "ls", "args": ["missing-file"], "session": "test"}
+    ]))
+    lines = result.split('\n')
+    assert lines[0] == str(tmp_path)
+    assert 'hello there' in lines
+    assert '[stderr]' in lines and lines[-1].startswith('[exit status')
+    assert any('missing-file' in line for line in lines[lines.index('[stderr]'):])
+
+    # The session is independent of sessionless commands and of other sessions
+    assert tool_manager.execute_tool('ShellTool', input=json.dumps({"command": "pwd", "session": "other"})) != str(tmp_path)
+    closed = tool_manager.execute_tool('ShellTool', input=json.dumps({"command": "exit", "session": "test"}))
+    assert closed == "Closed session 'test'"
+
+def test_idle_sessions_are_evicted():
+
+    sessions = ShellSessions(idle_timeout=0.05, max_sessions=2)
+    first = sessions.get('a')
+    assert first.run('echo hi') == ('hi\n', '', [0])
+    sessions.get('b')
+    sessions.get('c')  # Over the limit: the least recently used session is closed
+    assert not first.alive() and set(sessions.sessions) == {'b', 'c'}
+    time.sleep(0.1)
+    sessions.get('d')
+    assert set(sessions.sessions) == {'d'}
+    sessions.close_all()
+
+def test_long_output_keeps_head_and_tail(tool_manager):
+    result = tool_manager.execute_tool('ShellTool', input=json.dumps({"command": "seq", "args": ["1", "200000"]}))
+    assert result.startswith('1\n2\n3\n')
+    assert result.endswith('199999\n200000')
+    assert 'bytes truncated ...]' in result
+    assert len(result) < 70 * 1024
+
+def test_timeout_kills_process_group_and_reports_stderr(tool_manager):
+    commands = [
+        {"command": "sh", "args": ["-c", "echo started; echo warning >&2; sleep 30 & wait"], "timeout": 0.3},
+        {"command": "echo", "args": ["next"]}
+    ]
+    for run in (lambda: tool_manager.execute_tool('ShellTool', input=json.dumps(commands)),
+                lambda: asyncio.run(tool_manager.aexecute_tool('ShellTool', input=json.dumps(commands)))):
+        start = time.perf_counter()
+        result = run()
+        assert time.perf_counter() - start < 15  # Not the 30s of the orphaned sleep
+        assert result.startswith('started\n')
+        assert '[stderr]\nwarning' in result
+        assert '[timed out after 0.3s; process group killed]' in result
+        assert result.endswith('next')
+
+def test_total_timeout_skips_remaining_commands():
+    tm = ToolManager()
+    tm.tools['ShellTool'].total_timeout = 0.3
+    commands = [{"command": "sleep", "args": ["30"]}, {"command": "echo", "args": ["never"]}]
+    result = tm.execute_tool('ShellTool', input=json.dumps(commands))
+    assert '[timed out after 0.3s' in result
+    assert result.endswith('[skipped echo: total timeout of 0.3s exceeded]')
+
+def test_pipes_and_redirects(tool_manager, tmp_path):
+    names = tmp_path / 'names.txt'
+    names.write_text('bob\nalice\nbob\n')
+    counts = tmp_path / 'counts.txt'
+    commands = [
+        {"command": "sort", "args": ["<", str(names), "|", "uniq", "-c", "|", "sort", "-rn", ">", str(counts)]},
+        {"command": "echo", "args": ["carol", ">>", str(counts)]},
+        {"command": "sh", "args": ["-c", "echo oops >&2", "2>&1", "|", "tr", "a-z", "A-Z"]},
+    ]
+    for run in (lambda: tool_manager.execute_tool('ShellTool', input=json.dumps(commands)),
+                lambda: asyncio.run(tool_manager.aexecute_tool('ShellTool', input=json.dumps(commands))),
+                lambda: ''.join(tool_manager.execute_tool_stream('ShellTool', input=json.dumps(commands)))):
+        counts.unlink(missing_ok=True)
+        result = run()
+        assert f'REDIRECTED_TO_FILE: {counts}' in result
+        assert result.strip().endswith('OOPS') and '[stderr]' not in result
+        assert [line.split() for line in counts.read_text().splitlines()] == [['2', 'bob'], ['1', 'alice'], ['carol']]
+
+def test_pipeline_reports_every_stage_status(tool_manager):
+    command = {"command": "seq", "args": ["3", "|", "grep", "7", "|", "sort"]}
+    assert tool_manager.execute_tool('ShellTool', input=json.dumps(command)) == '[exit status seq=0 | grep=1 | sort=0]'
+    command["session"] = "pipes"
+    assert tool_manager.execute_tool('ShellTool', input=json.dumps(command)) == '[exit status seq=0 | grep=1 | sort=0]'
+    tool_manager.execute_tool('ShellTool', input=json.dumps({"command": "exit", "session": "pipes"}))
+
+    bad = tool_manager.execute_tool('ShellTool', input=json.dumps({"command": "ls", "args": ["|"]}))
+    assert bad == "An unexpected error occurred: '|' must be followed by a command"
@@ -1,6 +1,10 @@
-import pytest
 from tools.snap_tool import SnapTool
+from utils.file_listing import git_files, walk_files, project_files
+from utils.symbol_index import SymbolIndex, plan_snapshot
+import pytest
 import json
+import os
+import subprocess
 
 def test_snap_tool_includes_py_files():
     # Instantiate SnapTool
@@ -19,3 +23,129 @@ def test_snap_tool_excludes_infra_files():
     result_full = snap_tool.execute('{"infra": true}')
 
     assert len(result_full) > len(result_min)
+
+def test_snap_tool_reuses_unchanged_files_and_reports_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'a.py').write_text('a = 1\n')
+    (tmp_path / 'b.py').write_text('b = 2\n')
+    snap_tool = SnapTool(None)
+    rendered = []
+    render = snap_tool.render
+    snap_tool.render = lambda path, line_numbers: rendered.append(path) or render(path, line_numbers)
+
+    first = snap_tool.execute('{"infra": false}')
+    assert sorted(rendered) == ['./a.py', './b.py'] and open('state.txt').read() == first
+    state_mtime = os.stat('state.txt').st_mtime_ns
+    cache_mtime = os.stat(snap_tool.cache_path).st_mtime_ns
+
+    # Nothing changed: no file is re-read and neither state.txt nor the cache is rewritten
+    rendered.clear()
+    assert snap_tool.execute('{"infra": false, "changes": true}') == "No files changed since the previous snapshot."
+    assert rendered == [] and os.stat('state.txt').st_mtime_ns == state_mtime
+    assert os.stat(snap_tool.cache_path).st_mtime_ns == cache_mtime
+
+    (tmp_path / 'a.py').write_text('a = 10\n')
+    os.remove(tmp_path / 'b.py')
+    (tmp_path / 'c.py').write_text('c = 3\n')
+    report = snap_tool.execute('{"infra": false, "changes": true}')
+    assert report.splitlines() == ["Changed since the previous snapshot: 1 modified, 1 added, 1 removed",
+                                   "M ./a.py", "A ./c.py", "D ./b.py"]
+    assert sorted(rendered) == ['./a.py', './c.py']
+    assert 'a = 10' in open('state.txt').read() and 'b = 2' not in open('state.txt').read()
+
+    # The cache persists across instances
+    fresh = SnapTool(None)
+    fresh.render = None  # Would fail if any file had to be rendered again
+    assert fresh.execute('{"infra": false, "changes": true}') == "No files changed since the previous snapshot."
+
+def test_abandoned_snapshot_keeps_previous_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'a.py').write_text('a = 1\n')
+    (tmp_path / 'b.py').write_text('b = 2\n')
+    snap_tool = SnapTool(None)
+    first = snap_tool.execute('{"infra": false}')
+
+    (tmp_path / 'a.py').write_text('a = 10\n')
+    stream = snap_tool.execute_stream(input='{"infra": false}')
+    assert 'a = 10' in next(stream)
+    assert open('state.txt').read() == first  # Not truncated while the new snapshot is rendered
+    stream.close()
+    assert open('state.txt').read() == first
+    assert sorted(os.listdir(tmp_path)) == ['.pyline_cache', 'a.py', 'b.py', 'state.txt']
+
+def test_file_listing_honours_gitignore_with_and_without_git(tmp_path):
+    files = ['main.py', 'build/out.py', 'pkg/mod.py', 'pkg/schema.gen.py', 'pkg/keep.gen.py', 'pkg/data/big.py',
+             'node_modules/lib/index.py', '.git/hooks/hook.py']
+    for name in files:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text('x = 1\n')
+    (tmp_path / '.gitignore').write_text('# generated\nbuild/\nnode_modules\n*.gen.py\n!keep.gen.py\n')
+    (tmp_path / 'pkg' / '.gitignore').write_text('/data/\n')
+    expected = ['.gitignore', 'main.py', 'pkg/.gitignore', 'pkg/keep.gen.py', 'pkg/mod.py']
+
+    assert git_files(str(tmp_path)) is None
+    assert walk_files(str(tmp_path)) == expected
+
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    (tmp_path / '.git' / 'hooks' / 'hook.py').write_text('x = 1\n')
+    subprocess.run(['git', 'add', 'main.py'], cwd=tmp_path, check=True)
+    assert git_files(str(tmp_path)) == expected == project_files(str(tmp_path))
+
+def test_symbol_index_parses_and_updates_incrementally(tmp_path):
+    source = tmp_path / 'mod.py'
+    source.write_text('"""Billing helpers."""\nimport json\n\nclass Invoice:\n    """An invoice."""\n    def total(self, tax: float = 0.0) -> float:\n        return round(self.amount * (1 + tax))\n')
+    index = SymbolIndex(str(tmp_path / 'symbols.json'))
+    signature = lambda: [os.stat(source).st_mtime_ns, os.stat(source).st_size, os.stat(source).st_ino]
+
+    entry = index.update({str(source): signature()})[str(source)]
+    assert entry['doc'] == 'Billing helpers.' and entry['imports'] == ['json']
+    assert [(d['kind'], d['qualname'], d['start'], d['end']) for d in entry['definitions']] == [
+        ('class', 'Invoice', 4, 7), ('method', 'Invoice.total', 6, 7)]
+    assert entry['definitions'][1]['signature'] == 'def total(self, tax: float=0.0) -> float:'
+    assert entry['definitions'][1]['calls'] == ['round']
+
+    # Unchanged files are not parsed again, even by a fresh index loaded from disk
+    fresh = SymbolIndex(str(tmp_path / 'symbols.json'))
+    fresh.parse = None
+    assert fresh.update({str(source): signature()})[str(source)] == entry
+
+    # A changed file is parsed again; one that no longer parses keeps an entry with the error
+    fresh = SymbolIndex(str(tmp_path / 'symbols.json'))
+    source.write_text('def broken(:\n')
+    assert fresh.update({str(source): signature()})[str(source)]['error'].endswith('(line 1)')
+
+def test_budgeted_snapshot_prefers_relevant_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'billing.py').write_text(
+        '"""Invoices."""\n\ndef compute_invoice_total(items):\n    """Sum an invoice."""\n    return sum(items)\n')
+    for n in range(6):
+        body = ''.join(f'def helper_{n}_{i}(value):\n    """Unrelated helper."""\n    return value + {i}\n\n' for i in range(20))
+        (tmp_path / f'other_{n}.py').write_text(body)
+    snap_tool = SnapTool(None)
+    full = snap_tool.execute('{"infra": false}')
+    budget = snap_tool.counter.count_text(full) // 3
+
+    result = snap_tool.execute(json.dumps({'infra': False, 'query': 'invoice total', 'budget': budget}))
+    assert snap_tool.counter.count_text(result) <= budget
+    assert '--- BEGIN ./billing.py ---' in result and 'return sum(items)' in result
+    assert '(signatures only) ---' in result and 'less relevant files omitted: ./other_' in result
+    assert open('state.txt').read() == result
+    assert os.path.exists('.pyline_cache/symbols.json')
+
+def test_budget_covers_the_omitted_files_listing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = []
+    for n in range(8):
+        path = f'./module_{n}.py'
+        (tmp_path / path).write_text(f'def function_{n}(value):\n    """Helper {n}."""\n    return value\n')
+        paths.append(path)
+    index = SymbolIndex(str(tmp_path / 'symbols.json'))
+    entries = index.update({path: [n] for n, path in enumerate(paths)})
+    blocks = {path: open(path).read() for path in paths}
+
+    omitted_some = False
+    for budget in range(100, 700, 7):
+        texts = plan_snapshot(paths, blocks, entries, index, 'function', budget, len, line_numbers=False)
+        omitted_some |= 'less relevant files omitted' in texts[-1]
+        assert len(''.join(texts)) <= budget
+    assert omitted_some
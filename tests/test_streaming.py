@@ -0,0 +1,67 @@
+from tests.fakes import AsyncFakeClient, completion
+from tools.base_tool import BaseTool
+import asyncio
+
+
+class RecordTool(BaseTool):
+    def execute(self, input: str) -> str:
+        """
+        Record the call and echo the input.
+
+        Args:
+            input (str): text to echo
+        """
+        self.manager.llm.client.events.append(f'tool {input}')
+        return input
+
+
+def test_streamed_content_is_delivered_incrementally(make_manager):
+    deltas = []
+    tm = make_manager([completion(content='one two three')], tools=[RecordTool], stream=True, on_delta=deltas.append)
+
+    response = tm.get_response([{"role": "user", "content": "count"}])
+    assert deltas == ['one ', 'two ', 'three ']
+    assert response.content == 'one two three '
+
+def test_streamed_tool_calls_dispatch_before_stream_ends(make_manager):
+    deltas = []
+    tool_calls = [('call_a', 'RecordTool', '{"input": "a"}'), ('call_b', 'RecordTool', '{"input": "b"}')]
+    responses = [completion(content='working', tool_calls=tool_calls), completion(content='done')]
+    tm = make_manager(responses, tools=[RecordTool], stream=True, on_delta=deltas.append)
+    messages = [{"role": "user", "content": "record"}]
+
+    response = tm.get_response(messages)
+    assert response.content == 'done '
+
+    events = tm.llm.client.events
+    # The first call runs as soon as the second one starts streaming, not after the final chunk
+    assert events.index('tool a') < events.index('tool b')
+    assert 'chunk' in events[events.index('tool a') + 1:events.index('tool b')]
+
+    assistant = messages[1]
+    assert [tc.function.arguments for tc in assistant.tool_calls] == ['{"input": "a"}', '{"input": "b"}']
+    assert [m['content'] for m in messages[2:4]] == ['a', 'b']
+
+def test_async_streaming(make_manager):
+    deltas = []
+    tm = make_manager(tools=[RecordTool], stream=True, on_delta=deltas.append)  # RecordTool logs into tm.llm.client.events
+    tm.llm.async_client = AsyncFakeClient([
+        completion(tool_calls=[('call_a', 'RecordTool', '{"input": "a"}')]),
+        completion(content='all done')
+    ])
+
+    response = asyncio.run(tm.aget_response([{"role": "user", "content": "record"}]))
+    assert response.content == 'all done '
+    assert deltas == ['all ', 'done ']
+    assert tm.llm.client.events == ['tool a']
+
+def test_gpt_tool_deltas_stay_out_of_the_assistant_stream(make_manager):
+    deltas, tool_deltas = [], []
+    tm = make_manager([completion(content='inner answer'), completion(content='inner again')], stream=True,
+                      on_delta=deltas.append)
+    assert tm.execute_tool('GptTool', input='[{"role": "user", "content": "hi"}]') == 'inner answer'
+    assert deltas == [] and 'stream' not in tm.llm.client.requests[0]
+
+    tm.on_tool_delta = lambda tool, text: tool_deltas.append((tool, text))
+    assert tm.execute_tool('GptTool', input='[{"role": "user", "content": "hi"}]') == 'inner again '
+    assert deltas == [] and tool_deltas == [('GptTool', 'inner '), ('GptTool', 'again ')]
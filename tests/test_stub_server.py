@@ -0,0 +1,36 @@
+from benchmarks.stub_server import StubServer
+from utils.tool_manager import ToolManager
+from utils.llm_client import LLMClient
+import pytest
+import json
+
+SCRIPT = {
+    "say hi": {
+        "tool_calls": [{"name": "ShellTool", "arguments": {"input": json.dumps({"command": "echo", "args": ["hi"]})}}],
+        "content": "I said hi."
+    }
+}
+
+
+@pytest.fixture
+def stub():
+    with StubServer(SCRIPT, latency=0.0) as server:
+        yield server
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_get_response_against_stub(stub, monkeypatch, stream):
+    monkeypatch.setattr('builtins.input', lambda prompt: 'y')
+    deltas = []
+    tm = ToolManager(stream=stream, on_delta=deltas.append, llm=LLMClient(base_url=stub.base_url, api_key='stub'))
+
+    messages = [{"role": "user", "content": "say hi"}]
+    response = tm.get_response(messages)
+
+    assert response.content == 'I said hi.'
+    assert messages[-1]['role'] == 'tool' and messages[-1]['content'] == 'hi'
+    assert len(stub.served) == 2
+    # Streamed responses end with a usage chunk, so tokens are recorded either way
+    completions = [s for s in tm.tracer.spans if s.kind == 'completion']
+    assert len(completions) == 2 and all(s.attributes['prompt_tokens'] > 0 for s in completions)
+    if stream:
+        assert ''.join(deltas) == 'I said hi.'
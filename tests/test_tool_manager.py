@@ -1,3 +1,6 @@
+from tests.fakes import AsyncFakeClient, OverlapTool, SleepTool, completion
+import threading
+import asyncio
 import pytest
 
 
@@ -11,3 +14,62 @@ def test_tool_manager_discovery(tool_manager):
 def test_tool_manager_execute(tool_manager):
     response = tool_manager.execute_tool('ExecTool', input='print("Hello World!")')
     assert response == "Hello World!\n"
+
+def overlap_manager(make_manager, max_tool_workers, tool_calls, parties, parallel_safe=True):
+    tm = make_manager([completion(tool_calls=tool_calls), completion(content='done')], max_tool_workers=max_tool_workers)
+    tm.tools['OverlapTool'] = OverlapTool(tm, parties)
+    tm.tools['OverlapTool'].parallel_safe = parallel_safe
+    return tm
+
+def test_concurrent_tool_calls_keep_order(make_manager):
+    # Each call only returns once all three are running
+    tool_calls = [(f'call_{i}', 'OverlapTool', f'{{"input": "result {i}"}}') for i in range(3)]
+    tm = overlap_manager(make_manager, 3, tool_calls, parties=3)
+    messages = [{"role": "user", "content": "run three at once"}]
+
+    response = tm.get_response(messages)
+    assert response.content == 'done'
+    tool_messages = [m for m in messages if isinstance(m, dict) and m['role'] == 'tool']
+    assert [m['tool_call_id'] for m in tool_messages] == ['call_0', 'call_1', 'call_2']
+    assert [m['content'] for m in tool_messages] == ['result 0', 'result 1', 'result 2']
+
+def test_parallel_unsafe_tool_calls_are_serialized(make_manager):
+    tool_calls = [(f'call_{i}', 'OverlapTool', '{"input": "x"}') for i in range(2)]
+    tm = overlap_manager(make_manager, 2, tool_calls, parties=1, parallel_safe=False)
+
+    tm.get_response([{"role": "user", "content": "run twice"}])
+    assert tm.tools['OverlapTool'].max_active == 1
+
+def test_aget_response_drives_concurrent_conversations(make_manager):
+    tm = make_manager(tools=[SleepTool])
+    sessions = 10
+    script = []
+    for i in range(sessions):
+        script.append(completion(tool_calls=[(f'call_{i}', 'SleepTool', f'{{"input": "r{i}"}}')]))
+    script += [completion(content='done')] * sessions
+    # The first five completions are only answered once five conversations are waiting on one together
+    tm.llm.async_client = AsyncFakeClient(script, latency=0.05, gate=5)
+
+    async def run_all():
+        conversations = [[{"role": "user", "content": f"conversation {i}"}] for i in range(sessions)]
+        responses = await asyncio.gather(*(tm.aget_response(messages) for messages in conversations))
+        return conversations, responses
+
+    conversations, responses = asyncio.run(run_all())
+    assert all(response.content == 'done' for response in responses)
+    # Every scripted tool call ran in exactly one conversation
+    assert sorted(messages[-1]['content'] for messages in conversations) == sorted(f'r{i}' for i in range(sessions))
+
+def test_exec_tool_captures_only_its_own_output(make_manager):
+    tool_calls = [('call_shell', 'ShellTool', '{"input": "{\\"command\\": \\"echo\\", \\"args\\": [\\"fast\\"]}"}'),
+                  ('call_exec', 'ExecTool', '{"input": "manager.echoed.wait(5); print(\'exec done\')"}')]
+    tm = make_manager([completion(tool_calls=tool_calls), completion(content='done')], max_tool_workers=2)
+    tm.echoed = threading.Event()
+    echo = tm.echo
+    tm.echo = lambda text: (echo(text), tm.echoed.set() if text.strip() == 'fast' else None)  # ShellTool's echo while ExecTool runs
+
+    messages = [{"role": "user", "content": "run both"}]
+    tm.get_response(messages)
+    assert tm.echoed.is_set()
+    shell, exec_result = [m['content'] for m in messages if isinstance(m, dict) and m['role'] == 'tool']
+    assert shell.strip() == 'fast' and exec_result == 'exec done\n'
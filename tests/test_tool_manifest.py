@@ -0,0 +1,87 @@
+from utils.tool_manager import ToolManager
+from utils.tool_manifest import LazyTool
+import pytest
+import json
+import subprocess
+import sys
+import os
+
+TOOL_SOURCE = '''
+from tools.base_tool import BaseTool
+
+
+class EchoTool(BaseTool):
+    def execute(self, input: str) -> str:
+        """
+        {description}
+
+        Args:
+            input (str): text to echo back
+        """
+        return input
+
+
+class LoudTool(BaseTool):
+    dependencies = ['EchoTool']
+
+    def execute(self, input: str) -> str:
+        """
+        Echo loudly.
+
+        Args:
+            input (str): text to shout
+        """
+        return self.manager.execute_tool('EchoTool', input=input).upper()
+'''
+
+
+@pytest.fixture
+def lazy_package(tmp_path, monkeypatch):
+    package_dir = tmp_path / 'lazy_tools_pkg'
+    package_dir.mkdir()
+    (package_dir / '__init__.py').write_text('')
+    (package_dir / 'echo_tool.py').write_text(TOOL_SOURCE.format(description='Echo the input.'))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package_dir
+    for name in [name for name in sys.modules if name.startswith('lazy_tools_pkg')]:
+        del sys.modules[name]
+
+
+def test_lazy_manager_defers_imports(lazy_package):
+    manifest_path = str(lazy_package / 'manifest.json')
+    ToolManager(package='lazy_tools_pkg', lazy=True, manifest_path=manifest_path)
+    manifest = json.load(open(manifest_path))
+    entry = manifest['modules']['lazy_tools_pkg.echo_tool']
+    assert entry['tools']['LoudTool']['dependencies'] == ['EchoTool']
+
+    # A fresh manager with a valid manifest must not import the tool module
+    del sys.modules['lazy_tools_pkg.echo_tool']
+    tm = ToolManager(package='lazy_tools_pkg', lazy=True, manifest_path=manifest_path)
+    assert 'lazy_tools_pkg.echo_tool' not in sys.modules
+    assert isinstance(tm.tools['EchoTool'], LazyTool)
+    names = {t['function']['name'] for t in tm.get_tools_json()}
+    assert names == {'EchoTool', 'LoudTool'}
+
+    assert tm.execute_tool('LoudTool', input='hi') == 'HI'
+    assert 'lazy_tools_pkg.echo_tool' in sys.modules
+    assert not isinstance(tm.tools['EchoTool'], LazyTool)
+
+def test_lazy_manager_does_not_import_openai():
+    # In a fresh interpreter: the rest of the suite has long imported openai into this one
+    code = "import sys; from utils.tool_manager import ToolManager; ToolManager(lazy=True); print('openai' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+def test_manifest_rebuilds_changed_module(lazy_package):
+    manifest_path = str(lazy_package / 'manifest.json')
+    ToolManager(package='lazy_tools_pkg', lazy=True, manifest_path=manifest_path)
+
+    module_path = lazy_package / 'echo_tool.py'
+    module_path.write_text(TOOL_SOURCE.format(description='Echo the input, but changed.'))
+    stat = os.stat(module_path)
+    os.utime(module_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    del sys.modules['lazy_tools_pkg.echo_tool']
+
+    tm = ToolManager(package='lazy_tools_pkg', lazy=True, manifest_path=manifest_path)
+    schema = next(t for t in tm.get_tools_json() if t['function']['name'] == 'EchoTool')
+    assert schema['function']['description'] == 'Echo the input, but changed.'
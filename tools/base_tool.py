@@ -1,11 +1,26 @@
 from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, Optional
+import asyncio
 
 
 class BaseTool(ABC):
     dependencies = []
+    # Tools with side effects on shared state (files, process-wide stdout, ...) set this to False
+    # so the manager never runs two of their calls at the same time
+    parallel_safe = True
+    # Tools whose execute_stream consumes `chunks` incrementally set this to True; for the others
+    # an upstream stream is buffered and substituted for its ${id} placeholder
+    streams_input = False
+    # Tools that cap the size of their own result (keeping its head and tail) set this to True, so a
+    # stream of their output substituted for a placeholder is capped the same way
+    bounded_output = False
     
     def __init__(self, manager):
         self.manager = manager
+
+    def allows_parallel(self, **kwargs) -> bool:
+        """Whether this particular call may overlap with other calls to the same tool."""
+        return self.parallel_safe
     
     @abstractmethod
     def execute(self, **kwargs) -> str:
@@ -14,3 +29,18 @@ class BaseTool(ABC):
         This should have an appropriate docstring that describes its functionality and parameters.
         """
         pass
+
+    async def aexecute(self, **kwargs) -> str:
+        """
+        Async counterpart of execute. Tools with a native async implementation override this;
+        by default the synchronous execute runs on a worker thread (in a copy of the current context).
+        """
+        return await asyncio.to_thread(self.execute, **kwargs)
+
+    def execute_stream(self, chunks: Optional[Iterable[str]] = None, **kwargs) -> Iterator[str]:
+        """
+        Streaming counterpart of execute used by PipelineTool's stream_from, yielding the output in
+        chunks. `chunks` is the upstream step's output when streams_input is set. By default the
+        whole result of execute is produced at once.
+        """
+        yield self.execute(**kwargs)
@@ -3,6 +3,7 @@ import random
 import string
 from enum import Enum
 import json
+import re
 
 class CodeToolState(Enum):
     DONE=0,
@@ -11,6 +12,25 @@ class CodeToolState(Enum):
 
 class CodeTool(BaseTool):
     dependencies = ['GptTool', 'ShellTool', 'FileTool', 'SnapTool']
+    parallel_safe = False # Switches git branches and rewrites files in the working tree
+    snapshot_budget = 8000  # Tokens of the source snapshot pasted into each prompt
+
+    @staticmethod
+    def tests_passed(test_result: str) -> bool:
+        """
+        Whether ShellTool's output of a pytest run shows it passed: pytest's stdout must end with a
+        summary of passed tests and no failures or errors, and ShellTool must not report an exit
+        status, a timeout or an error after it. Any other output counts as a failure.
+        """
+        stdout = test_result.partition('\n[stderr]\n')[0]
+        if any(line.startswith(('[exit status', '[timed out')) for line in test_result.splitlines()):
+            return False
+        lines = stdout.strip().splitlines()
+        summary = re.fullmatch(r'=*\s*((?:\d+ \w+, )*\d+ \w+) in [\d.]+s(?: \([^)]*\))?\s*=*', lines[-1]) if lines else None
+        if summary is None:
+            return False
+        outcomes = {outcome.split(' ')[1] for outcome in summary.group(1).split(', ')}
+        return 'passed' in outcomes and not outcomes & {'failed', 'error', 'errors'}
 
     # def tests_pass(self) -> bool:
     #     result = self.manager.execute_tool('ShellTool', input='{"command": "pytest", "args": []}')
@@ -29,12 +49,15 @@ class CodeTool(BaseTool):
         branch_name = ''.join(random.choices(string.ascii_lowercase + string.ascii_uppercase + string.digits, k=8))
         branch_command_str = json.dumps({
             "command": "git",
-            "args": ["checkout", "-b", f"{branch_name}"]
+            "args": ["checkout", "-b", f"{branch_name}"],
+            "session": "CodeTool"
         })
         self.manager.execute_tool("ShellTool", input=branch_command_str)
 
         # Now, generate a fresh snapshot and use GptTool to generate a new test
-        self.manager.execute_tool("SnapTool", input=json.dumps({'infra': False, 'line_numbers': False}))
+        self.manager.execute_tool("SnapTool", input=json.dumps({
+            'infra': False, 'line_numbers': False, 'query': input, 'budget': self.snapshot_budget
+        }))
 
         #  Now build the system prompt using the fresh snapshot
         system_prompt = (
@@ -71,14 +94,16 @@ class CodeTool(BaseTool):
         # Try to see if the tests pass, in which case we are more or less done
         tests_pass = False
         while not tests_pass:
-            test_result = self.manager.execute_tool('ShellTool', input='{"command": "pytest", "args": []}')
-            last_line = test_result.split('\n')[-1]
-            if 'failed' not in last_line:
+            # The persistent session saves a shell start-up per git/pytest invocation
+            test_result = self.manager.execute_tool('ShellTool', input='{"command": "pytest", "args": [], "session": "CodeTool"}')
+            if self.tests_passed(test_result):
                 tests_pass = True
             else:
                 # If the tests fail, then try to get a FileTool JSON call from GPT to apply
                 # Generate a fresh snap including the possibly new tests or modifications
-                self.manager.execute_tool("SnapTool", input=json.dumps({'infra': False, 'line_numbers': False}))
+                self.manager.execute_tool("SnapTool", input=json.dumps({
+                    'infra': False, 'line_numbers': False, 'query': f"{input}\n{test_result}", 'budget': self.snapshot_budget
+                }))
 
                 system_prompt = (
                     f"You are a backend developer. You want to make the tests pass."
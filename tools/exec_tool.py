@@ -1,25 +1,101 @@
 from tools.base_tool import BaseTool
-from contextlib import redirect_stdout
+from utils.exec_pool import ExecPool
+from utils.stdout_capture import capture_stdout
+from collections import OrderedDict
+from typing import Optional
+import functools
+import threading
 import traceback
 import io
 
 
+@functools.lru_cache(maxsize=256)
+def compile_source(source: str):
+    # Keyed by the source string, whose hash Python caches, so repeated snippets skip the compiler
+    return compile(source, '<string>', 'exec')
+
+
 class ExecTool(BaseTool):
-    def execute(self, input: str) -> str:
+    parallel_safe = False # Snippets share sessions and this module's globals
+    max_sessions = 16  # Named namespaces kept alive; the least recently used is dropped beyond this
+    # Limits for each isolated run
+    isolated_timeout = 60.0  # Wall-clock seconds
+    isolated_cpu_seconds = 60.0
+    isolated_memory_bytes = 2 * 1024 ** 3  # Address space of the worker
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.sessions: OrderedDict[str, dict] = OrderedDict()
+        self.pool: Optional[ExecPool] = None  # Started on the first isolated run
+        self.pool_lock = threading.Lock()
+
+    @staticmethod
+    def is_isolated(isolated) -> bool:
+        # Parameters arrive as strings from the model but may be real booleans from PipelineTool
+        return isolated is True or str(isolated).lower() in ('true', '1', 'yes')
+
+    def allows_parallel(self, isolated=None, **kwargs) -> bool:
+        # Isolated runs happen in worker processes and never touch this process's state
+        return self.is_isolated(isolated) or self.parallel_safe
+
+    def run_isolated(self, source: str) -> str:
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ExecPool()
+        return self.pool.run(source, self.isolated_timeout, self.isolated_cpu_seconds, self.isolated_memory_bytes)
+
+    def new_namespace(self) -> dict:
+        namespace = dict(globals())
+        namespace['manager'] = self.manager
+        return namespace
+
+    def session_namespace(self, name: str) -> dict:
+        namespace = self.sessions.get(name)
+        if namespace is None:
+            namespace = self.sessions[name] = self.new_namespace()
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(name)
+        return namespace
+
+    def reset_session(self, name: str):
+        """Start the named session over with a fresh namespace."""
+        self.sessions[name] = self.new_namespace()
+        self.sessions.move_to_end(name)
+
+    def drop_session(self, name: str) -> bool:
+        return self.sessions.pop(name, None) is not None
+
+    def execute(self, input: str, session: Optional[str] = None, action: Optional[str] = None,
+                isolated: Optional[str] = None) -> str:
         """
         Execute the given source in the context of the ToolManager instance. The source must be a string representing one or more Python statements.
 
         Args:
             input (str): source code to execute in the context of the ToolManager instance.
+            session (str): optional session name. Variables, imports and functions defined in a session stay available to later calls with the same session name, so data loaded once does not have to be loaded again. Without a session every call starts from scratch.
+            action (str): optional, with a session: "reset" clears the session's variables before running the input; "drop" discards the session and ignores the input.
+            isolated (str): optional, "true" to run the code in a separate worker process with its own stdout and stderr, in parallel with other isolated runs and with time and memory limits. Use it for CPU-heavy or risky code. An isolated run starts from scratch: it has no session and no access to manager.
         """
+        if self.is_isolated(isolated):
+            return self.run_isolated(input)
+        if session is not None and action == 'drop':
+            return f"Dropped session '{session}'" if self.drop_session(session) else f"No session '{session}'"
+        if session is not None and action == 'reset':
+            self.reset_session(session)
+
         output = io.StringIO() # Create a StringIO object to capture output
-        with redirect_stdout(output):
-            local_vars = {'manager': self.manager}
+        # Only this thread's prints are captured, not those of tool calls running alongside
+        with capture_stdout(output):
+            if session is None:
+                namespace, local_vars = globals(), {'manager': self.manager}
+            else:
+                # One dict for globals and locals, so functions defined in the session see its variables
+                namespace = local_vars = self.session_namespace(session)
             try:
                 # Pass 'manager' to the exec so it has access to the ToolManager instance
-                exec(input, globals(), local_vars)
+                exec(compile_source(input), namespace, local_vars)
             except Exception as e:
                 return f"Got error executing {input}: {traceback.format_exc()} {e}"
-        
+
         return output.getvalue()
-    
\ No newline at end of file
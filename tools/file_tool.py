@@ -1,16 +1,37 @@
 from tools.base_tool import BaseTool
+from utils.line_index import LineIndexCache, PieceTable, read_range
+import tempfile
+import re
+import shutil
 import json
 import os
 
 
+def umask() -> int:
+    # Reading the umask means setting it, so this is done once at import rather than per write
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+NEW_FILE_MODE = 0o666 & ~umask()  # What open(path, 'w') would give a new file
+
+
 class FileTool(BaseTool):
-    @staticmethod
-    def perform_operation(path, content=None, line_number=None, action=None):
-        with open(path, 'r') as file:
-            lines = file.readlines()
+    parallel_safe = False # Concurrent edits to one path would clobber each other
+    large_file_bytes = 8 * 1024 * 1024  # Files from this size on are edited through a memory map
+    actions = ('create', 'insert', 'update', 'delete', 'remove', 'read', 'replace_range', 'search_replace', 'apply_patch')
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        # Line offsets of large files, reused while their mtime and size are unchanged
+        self.line_indexes = LineIndexCache()
 
+    @staticmethod
+    def perform_operation(lines, content=None, line_number=None, action=None):
+        """Apply one operation to a file's lines in memory; later line numbers see the result."""
         if action == 'create':
-            lines = [content + '\n']
+            lines[:] = [content + '\n']
 
         # Note: Line-numbers are not zero-indexed, but list elements are, hence the -1
         elif action == 'insert' and line_number is not None:
@@ -30,8 +51,171 @@ class FileTool(BaseTool):
                 raise IndexError("Line number out of range")
             lines.pop(line_number - 1)
 
-        with open(path, 'w') as file:
-            file.writelines(lines)
+    @staticmethod
+    def content_lines(content):
+        """Split content into lines that each end with a newline."""
+        if not content:
+            return []
+        lines = content.splitlines(keepends=True)
+        if not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        return lines
+
+    @classmethod
+    def replace_range(cls, lines, start_line, end_line, content):
+        if start_line is None or end_line is None:
+            raise ValueError("start_line and end_line are required for replace_range")
+        if start_line < 1 or end_line < start_line - 1 or end_line > len(lines):
+            raise IndexError(f"Line range {start_line}-{end_line} out of range")
+        # end_line == start_line - 1 replaces nothing, i.e. inserts before start_line
+        lines[start_line - 1:end_line] = cls.content_lines(content)
+
+    @staticmethod
+    def search_replace(lines, path, search, replace, replace_all=False):
+        if not search:
+            raise ValueError("search is required for search_replace")
+        text = ''.join(lines[:])
+        count = text.count(search)
+        if count == 0:
+            raise ValueError(f"search text not found in {path}")
+        if count > 1 and not replace_all:
+            raise ValueError(f"search text occurs {count} times in {path}; include more context or set \"all\": true")
+        lines[:] = text.replace(search, replace or '').splitlines(keepends=True)
+
+    hunk_header = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+    max_fuzz = 2  # Context lines that may be dropped from each end of a hunk that does not match as is
+
+    @classmethod
+    def parse_patch(cls, patch):
+        """Return the hunks of a unified diff as (old start line, old lines, new lines)."""
+        hunks = []
+        current = None
+        tag = None
+        for line in patch.splitlines():
+            header = cls.hunk_header.match(line)
+            if header:
+                current = (int(header.group(1)), [], [])
+                hunks.append(current)
+                tag = None
+            elif current is None or line.startswith(('--- ', '+++ ')):
+                continue  # File headers and anything before the first hunk
+            elif line.startswith('\\'):
+                # "\ No newline at end of file" applies to the line before it
+                if tag in (' ', '-'):
+                    current[1][-1] = current[1][-1].removesuffix('\n')
+                if tag in (' ', '+'):
+                    current[2][-1] = current[2][-1].removesuffix('\n')
+            else:
+                tag, text = line[:1] or ' ', line[1:] + '\n'
+                if tag in (' ', '-'):
+                    current[1].append(text)
+                if tag in (' ', '+'):
+                    current[2].append(text)
+        if not hunks:
+            raise ValueError("Patch contains no hunks")
+        return hunks
+
+    @staticmethod
+    def find_block(lines, block, expected, lowest):
+        """Index of `block` in lines at or after `lowest`, the nearest match to `expected`, or None."""
+        highest = len(lines) - len(block)
+        expected = max(lowest, min(expected, highest))
+        if not block:
+            return expected if expected >= lowest else None
+        wanted = [line.rstrip('\r\n') for line in block]
+        # Search outwards from the expected position
+        for distance in range(max(expected - lowest, highest - expected) + 1):
+            for position in ((expected - distance, expected + distance) if distance else (expected,)):
+                if lowest <= position <= highest and lines[position].rstrip('\r\n') == wanted[0] and \
+                        [line.rstrip('\r\n') for line in lines[position:position + len(block)]] == wanted:
+                    return position
+        return None
+
+    @staticmethod
+    def context_length(old, new, from_end=False):
+        count = 0
+        pairs = zip(reversed(old), reversed(new)) if from_end else zip(old, new)
+        for a, b in pairs:
+            if a != b:
+                break
+            count += 1
+        return count
+
+    @classmethod
+    def apply_patch(cls, lines, path, patch):
+        """
+        Apply a unified diff. Each hunk is matched at its line number (shifted by earlier hunks) or at
+        the nearest place its context and removed lines occur; failing that, up to max_fuzz lines of
+        context are dropped from each end, as patch(1) does.
+        """
+        if not patch:
+            raise ValueError("patch is required for apply_patch")
+        offset = 0
+        lowest = 0
+        for number, (start, old, new) in enumerate(cls.parse_patch(patch), start=1):
+            # A hunk that only adds lines ("-N,0") goes after line N; any other starts at line N
+            old_start = start - 1 if old else start
+            expected = max(0, old_start + offset)
+            for fuzz in range(cls.max_fuzz + 1):
+                lead = min(fuzz, cls.context_length(old, new))
+                trail = min(fuzz, cls.context_length(old, new, from_end=True))
+                old_block = old[lead:len(old) - trail]
+                position = cls.find_block(lines, old_block, expected + lead, lowest)
+                if position is not None:
+                    break
+            else:
+                raise ValueError(f"Hunk {number} of the patch does not apply to {path}")
+            new_block = new[lead:len(new) - trail]
+            lines[position:position + len(old_block)] = new_block
+            offset = position + len(new_block) + trail - (old_start + len(old))
+            lowest = position + len(new_block)
+
+    def is_large(self, path) -> bool:
+        return os.path.exists(path) and os.path.getsize(path) >= self.large_file_bytes
+
+    def read_lines(self, path):
+        if not os.path.exists(path):
+            return []  # Edits to a missing file start from an empty one
+        if self.is_large(path):
+            return PieceTable(path, self.line_indexes)
+        with open(path, 'r') as file:
+            return file.readlines()
+
+    def read_range(self, path, lines, start_line=None, end_line=None) -> str:
+        """Lines start_line..end_line (1-based, inclusive) from pending edits, or else from the file."""
+        start = max(1, start_line or 1) - 1
+        stop = end_line
+        if lines is not None:
+            return ''.join(lines[start:stop])
+        if self.is_large(path):
+            return read_range(path, start, stop, self.line_indexes)
+        with open(path, 'r') as file:
+            return ''.join(file.readlines()[start:stop])
+
+    @staticmethod
+    def write_atomic(path, lines):
+        """
+        Write through a temp file in the same directory and rename it over the target. A symlink is
+        followed, so its target is replaced rather than the link itself.
+        """
+        path = os.path.realpath(path)
+        directory = os.path.dirname(path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+        try:
+            if isinstance(lines, PieceTable):
+                with os.fdopen(fd, 'wb') as file:
+                    lines.write_to(file)
+            else:
+                with os.fdopen(fd, 'w') as file:
+                    file.writelines(lines)
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+            else:
+                os.chmod(temp_path, NEW_FILE_MODE)  # mkstemp creates files as 0600
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
 
     def execute(self, input: str) -> str:
         """
@@ -67,8 +251,34 @@ class FileTool(BaseTool):
                     {
                         "action": "remove",
                         "path": "old_file.txt"
+                    },
+                    {
+                        "action": "read",
+                        "path": "big_file.log",
+                        "start_line": 1000,
+                        "end_line": 1050
+                    },
+                    {
+                        "action": "replace_range",
+                        "path": "existing_file.txt",
+                        "start_line": 10,
+                        "end_line": 14,
+                        "content": "First new line.\nSecond new line."
+                    },
+                    {
+                        "action": "search_replace",
+                        "path": "app.py",
+                        "search": "def old_name(",
+                        "replace": "def new_name("
+                    },
+                    {
+                        "action": "apply_patch",
+                        "path": "app.py",
+                        "patch": "@@ -3,3 +3,3 @@\n import os\n-DEBUG = True\n+DEBUG = False\n import sys\n"
                     }
                 ]
+
+                Operations run in order and line numbers refer to the file as changed by the operations before them. "read" returns the lines from start_line to end_line (inclusive; both optional) and works on files of any size without loading them whole. "replace_range" replaces lines start_line to end_line (inclusive) with the lines of content; an empty content deletes them. "search_replace" replaces text that must occur exactly once, unless "all": true is given. "apply_patch" applies a unified diff; hunks are located by their context, so slightly wrong line numbers are tolerated. Prefer these over many single-line operations for larger changes. If any operation fails, no file is changed.
         """
         try:
             operations = json.loads(input) if isinstance(input, str) else input
@@ -77,22 +287,73 @@ class FileTool(BaseTool):
         except json.JSONDecodeError:
             raise ValueError(f"Invalid JSON input: {input}")
         
-        for op in operations:
-            action = op['action']
-            path = op['path']
-            content = op.get('content')
-            line_number = op.get('line_number')
-
-            if action in ['insert', 'update', 'delete'] and line_number is None:
-                raise ValueError(f"Line number is required for {action}")
-            
-            if action == 'remove':
-                os.remove(path)
-            else:
-                if action == 'create' or not os.path.exists(path):
-                    with open(path, 'w'): pass # Create empty file if none exists
-                
-                self.perform_operation(path, content, line_number, action)
-            
-        
+        # Operations are applied in memory, per path and in order, so line numbers account for earlier
+        # edits; nothing is written until every operation has succeeded, then each file is written once
+        files = {}  # Real path -> lines, or None once removed
+        changed = []  # Real paths to write or remove, in order of their first change
+        names = {}  # Real path -> the path as first given, for removal
+        reads = []
+
+        def replace(path, lines):
+            if isinstance(files.get(path), PieceTable):
+                files[path].close()
+            files[path] = lines
+
+        try:
+            for op in operations:
+                action = op['action']
+                path = op['path']
+                # Keyed by real path, so "a.txt", "./a.txt" and a symlink to it are edited as one file
+                key = os.path.realpath(path)
+                names.setdefault(key, path)
+                content = op.get('content')
+                line_number = op.get('line_number')
+
+                if action in ['insert', 'update', 'delete'] and line_number is None:
+                    raise ValueError(f"Line number is required for {action}")
+                if action not in self.actions:
+                    raise ValueError(f"Unknown action {action!r}, expected one of {', '.join(self.actions)}")
+
+                if action == 'read':
+                    if files.get(key, ()) is None or (key not in files and not os.path.exists(key)):
+                        raise FileNotFoundError(f"No such file: '{path}'")
+                    text = self.read_range(key, files.get(key), op.get('start_line'), op.get('end_line'))
+                    text = text.removesuffix('\n')
+                    reads.append(f"[{path}, from line {max(1, op.get('start_line') or 1)}]\n{text}")
+                    continue
+
+                if action == 'remove':
+                    if files.get(key, ()) is None or (key not in files and not os.path.exists(key)):
+                        raise FileNotFoundError(f"No such file: '{path}'")
+                    replace(key, None)
+                else:
+                    if files.get(key) is None:
+                        replace(key, [] if action == 'create' or key in files else self.read_lines(key))
+                    lines = files[key]
+                    if action == 'replace_range':
+                        self.replace_range(lines, op.get('start_line'), op.get('end_line'), content)
+                    elif action == 'search_replace':
+                        self.search_replace(lines, path, op.get('search'), op.get('replace'), op.get('all', False))
+                    elif action == 'apply_patch':
+                        self.apply_patch(lines, path, op.get('patch'))
+                    else:
+                        self.perform_operation(lines, content, line_number, action)
+                if key not in changed:
+                    changed.append(key)
+
+            for key in changed:
+                lines = files[key]
+                if lines is None:
+                    if os.path.lexists(names[key]):
+                        os.remove(names[key])
+                else:
+                    self.write_atomic(key, lines)
+                self.line_indexes.discard(key)
+        finally:
+            for lines in files.values():
+                if isinstance(lines, PieceTable):
+                    lines.close()
+
+        if reads:
+            return '\n'.join(reads) + ("\nFile operations executed successfully." if changed else '')
         return "File operations executed successfully."
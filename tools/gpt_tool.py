@@ -1,5 +1,4 @@
 from tools.base_tool import BaseTool
-from openai import OpenAI
 import json
 
 
@@ -7,7 +6,23 @@ class GptTool(BaseTool):
     def __init__(self, manager, model='gpt-4-1106-preview'):
         super().__init__(manager)
         self.model = model
-        self.client = None
+
+    @staticmethod
+    def parse_messages(input):
+        try:
+            messages = json.loads(input) if isinstance(input, str) else input
+            if not isinstance(messages, list):
+                messages = [messages]
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON input: {input}")
+        return messages
+
+    def delta_sink(self):
+        # Nested output is labelled and kept apart from the assistant's own deltas
+        on_tool_delta = self.manager.on_tool_delta
+        if not self.manager.stream or on_tool_delta is None:
+            return None
+        return lambda text: on_tool_delta(type(self).__name__, text)
 
     def execute(self, input: str) -> str:
         """
@@ -24,19 +39,11 @@ class GptTool(BaseTool):
                     }
                 ]
         """
-        if self.client is None:
-            self.client = OpenAI()
-            
-        try:
-            messages = json.loads(input) if isinstance(input, str) else input
-            if not isinstance(messages, list):
-                messages = [messages]
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON input: {input}")
-        
-        self.manager.logger.debug(f"Creating GPT ChatCompletion with messages: {messages}")
-        response = self.client.chat.completions.create(
-            messages=messages,
-            model=self.model,
-        )
+        messages = self.parse_messages(input)
+        response = self.manager.complete({'messages': messages, 'model': self.model}, self.delta_sink())
+        return response.choices[0].message.content
+
+    async def aexecute(self, input: str) -> str:
+        messages = self.parse_messages(input)
+        response = await self.manager.acomplete({'messages': messages, 'model': self.model}, self.delta_sink())
         return response.choices[0].message.content
@@ -1,36 +1,227 @@
 from tools.base_tool import BaseTool
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.templates import compile_template, resolve_template
+from utils.channel import Channel
+from utils.bounded_buffer import HeadTailBuffer
+from typing import Dict, Iterable, Iterator, List, Set
+import contextvars
 import json
 
+
 class PipelineTool(BaseTool):
+    max_workers = 8  # Steps of one pipeline that may run at the same time
+    stream_buffer_chars = 1 << 20  # Output a streaming step may run ahead of its consumer
+    head_bytes = 32 * 1024  # A streamed step of a bounded_output tool keeps this much of the start of its output ...
+    tail_bytes = 32 * 1024  # ... and of its end, as the tool itself would when not streamed
+
     @staticmethod
     def substitute_placeholders(params, outputs):
-        for key, value in params.items():
-            if isinstance(value, str):
-                # Substitute placeholders in strings
-                for output_key, output_value in outputs.items():
-                    placeholder = f"${{{output_key}}}"
-                    if placeholder in value:
-                        value = value.replace(placeholder, output_value)
-                params[key] = value
-            elif isinstance(value, dict):
-                # Recursively handle dictionaries
-                PipelineTool.substitute_placeholders(value, outputs)
-            elif isinstance(value, list):
-                # Handle lists: iterate through elements and substitute placeholders in strings
-                params[key] = [
-                    v.replace(f"${{{output_key}}}", outputs[output_key]) 
-                    if isinstance(v, str) else v 
-                    for v in value for output_key in outputs 
-                    if f"${{{output_key}}}" in str(v)
-                ]
+        """Substitute ${id} placeholders in params, in place."""
+        template = compile_template(params)
+        if template is not None:
+            params.update(template.resolve(outputs))
+
+    def build_graph(self, pipeline: List[dict]):
+        """
+        Return, per step, its compiled parameter template, the earlier steps whose output it
+        substitutes ({id: index}) and the full set of steps it must wait for, plus the
+        {consumer: producer} stream edges. A placeholder
+        refers to the most recent earlier step with that id, as in sequential execution; ids that
+        are not defined earlier are left as-is.
+        """
+        # Parameters are parsed once; resolving a template later is a single pass over its parts
+        templates = [compile_template(step.get("parameters") or {}) for step in pipeline]
+        sources: List[Dict[str, int]] = []
+        dependencies: List[Set[int]] = []
+        streams: Dict[int, int] = {}
+        latest: Dict[str, int] = {}
+        by_id: Dict[str, List[int]] = {}
+        last_unsafe: Dict[str, int] = {}
+        for index, step in enumerate(pipeline):
+            if step.get("id"):
+                by_id.setdefault(step["id"], []).append(index)
+
+        for index, step in enumerate(pipeline):
+            placeholders = templates[index].refs if templates[index] is not None else ()
+            refs = {ref: latest[ref] for ref in placeholders if ref in latest}
+            deps = set(refs.values())
+            for ref in step.get("depends_on", []):
+                if ref not in by_id:
+                    raise ValueError(f"Step {step.get('id') or index} depends on unknown step '{ref}'")
+                deps.update(by_id[ref])
+            deps.discard(index)
+
+            # Calls to a tool with side effects on shared state keep their relative order
+            tool_name = step.get("tool")
+            tool = self.manager.tools.get(tool_name)
+            if tool is not None and not tool.allows_parallel(**(step.get("parameters") or {})):
+                if tool_name in last_unsafe:
+                    deps.add(last_unsafe[tool_name])
+                last_unsafe[tool_name] = index
+
+            if step.get("stream_from") is not None:
+                producer = latest.get(step["stream_from"])
+                if producer is None:
+                    raise ValueError(f"Step {step.get('id') or index} streams from unknown earlier step '{step['stream_from']}'")
+                if producer in streams.values():
+                    raise ValueError(f"Step '{step['stream_from']}' can only stream to one step")
+                streams[index] = producer
+
+            sources.append(refs)
+            dependencies.append(deps)
+            if step.get("id"):
+                latest[step["id"]] = index
+
+        self.fold_streams(pipeline, sources, dependencies, streams)
+        return templates, sources, dependencies, streams
+
+    @staticmethod
+    def fold_streams(pipeline: List[dict], sources: List[Dict[str, int]], dependencies: List[Set[int]], streams: Dict[int, int]):
+        """
+        A streamed producer runs alongside its consumer instead of as a step of its own: the
+        consumer inherits the producer's dependencies, and steps that depend on the producer wait
+        for the end of the stream chain instead. No other step may use the producer's output.
+        """
+        consumer_of = {producer: consumer for consumer, producer in streams.items()}
+
+        def owner(index):
+            while index in consumer_of:
+                index = consumer_of[index]
+            return index
+
+        for consumer, producer in sorted(streams.items()):
+            for index, refs in enumerate(sources):
+                if producer in refs.values() and index != consumer:
+                    raise ValueError(f"Step {pipeline[index].get('id') or index} cannot use the output of "
+                                     f"'{pipeline[producer]['id']}', which is streamed to another step")
+            sources[consumer] = {ref: source for ref, source in sources[consumer].items() if source != producer}
+            dependencies[consumer] |= dependencies[producer]
+            dependencies[producer] = set()
+        for index, deps in enumerate(dependencies):
+            dependencies[index] = {owner(dep) for dep in deps} - {index}
+
+    @staticmethod
+    def check_acyclic(pipeline: List[dict], dependencies: List[Set[int]]):
+        """Kahn's algorithm; raises ValueError naming the steps left on a cycle."""
+        remaining = [len(deps) for deps in dependencies]
+        dependents = [[] for _ in dependencies]
+        for index, deps in enumerate(dependencies):
+            for dep in deps:
+                dependents[dep].append(index)
+        ready = [index for index, count in enumerate(remaining) if count == 0]
+        visited = 0
+        while ready:
+            index = ready.pop()
+            visited += 1
+            for dependent in dependents[index]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if visited < len(dependencies):
+            cycle = [pipeline[i].get("id") or str(i) for i, count in enumerate(remaining) if count]
+            raise ValueError(f"Pipeline has a dependency cycle between steps: {', '.join(cycle)}")
+
+    def run_step(self, step: dict, template, outputs: Dict[str, str]) -> str:
+        tool_name = step.get("tool")
+        parameters = resolve_template(template, step.get("parameters") or {}, outputs)
 
+        # Execute the tool with resolved parameters
+        with self.manager.tracer.span('pipeline_step', step.get("id") or tool_name, tool=tool_name):
+            return self.manager.execute_tool(tool_name, **parameters)
+
+    def bounded_join(self, chunks: Iterable[str], tool_name: str) -> str:
+        """
+        Drain a step's streamed output into its result. For a tool that bounds its own output the
+        middle is dropped and counted, as in its non-streamed result; any other output is kept whole.
+        """
+        tool = self.manager.tools.get(tool_name)
+        if tool is None or not tool.bounded_output:
+            return ''.join(chunks)
+        buffer = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+        for chunk in chunks:
+            buffer.write(chunk.encode())
+        return buffer.text()
+
+    def stream_step(self, pipeline: List[dict], templates: list, index: int, streams: Dict[int, int], outputs_for,
+                    channels: Dict[int, Channel]) -> Iterator[str]:
+        """Yield a step's output while it runs, with its stream_from producer running on its own thread."""
+        step = pipeline[index]
+        tool_name = step.get("tool")
+        outputs = outputs_for(index)
+
+        chunks = None
+        if index in streams:
+            producer = streams[index]
+            upstream = self.stream_step(pipeline, templates, producer, streams, outputs_for, channels)
+            chunks = channels[producer] = Channel.from_iterable(upstream, self.stream_buffer_chars)
+            tool = self.manager.tools.get(tool_name)
+            if tool is not None and not tool.streams_input:
+                # The tool cannot consume a stream, so it gets the buffered output as a placeholder
+                outputs[pipeline[producer]["id"]] = self.bounded_join(chunks, pipeline[producer].get("tool"))
+                chunks = None
+        parameters = resolve_template(templates[index], step.get("parameters") or {}, outputs)
+
+        with self.manager.tracer.span('pipeline_step', step.get("id") or tool_name, tool=tool_name, stream=True):
+            yield from self.manager.execute_tool_stream(tool_name, chunks, **parameters)
+
+    def run_graph(self, pipeline: List[dict], templates: list, sources: List[Dict[str, int]],
+                  dependencies: List[Set[int]], streams: Dict[int, int]) -> List[str]:
+        """Run each step as soon as the steps it depends on have finished."""
+        results = [None] * len(pipeline)
+        channels: Dict[int, Channel] = {}
+
+        def outputs_for(index):
+            return {ref: results[source] for ref, source in sources[index].items()}
+
+        def run_stream(index):
+            chunks = self.stream_step(pipeline, templates, index, streams, outputs_for, channels)
+            return self.bounded_join(chunks, pipeline[index].get("tool"))
+
+        remaining = [len(deps) for deps in dependencies]
+        dependents = [[] for _ in pipeline]
+        for index, deps in enumerate(dependencies):
+            for dep in deps:
+                dependents[dep].append(index)
+
+        workers = min(self.max_workers, len(pipeline))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline') as pool:
+            running = {}
+
+            def submit(index):
+                # A copied context keeps the step's span nested under this PipelineTool call
+                if index in streams:
+                    future = pool.submit(contextvars.copy_context().run, run_stream, index)
+                else:
+                    future = pool.submit(contextvars.copy_context().run, self.run_step, pipeline[index], templates[index],
+                                         outputs_for(index))
+                running[future] = index
+
+            streamed = set(streams.values())  # Started by their consumers
+            for index, count in enumerate(remaining):
+                if count == 0 and index not in streamed:
+                    submit(index)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=running.get):
+                    index = running.pop(future)
+                    results[index] = future.result()
+                    for dependent in dependents[index]:
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            submit(dependent)
+
+        for consumer, producer in streams.items():
+            if producer in channels:
+                consumer_name = pipeline[consumer].get("id") or str(consumer)
+                results[producer] = f"[streamed {channels[producer].total} characters to step '{consumer_name}']"
+        return results
 
     def execute(self, input: str) -> str:
         """
         Execute the given sequence of tool calls using a JSON string representing tool calls and arguments.
 
         Args:
-            input (str): JSON string representing the sequence of tool calls to make. Note that we can use $ together with identifiers to pass along output from one tool to another later tool. Do NOT include 'functions.' in the tool name -- simply use GptTool, ShellTool, etc. Notice that each object in the JSON list here has a "parameters" key -- NOT an "args" key.
+            input (str): JSON string representing the sequence of tool calls to make. Note that we can use $ together with identifiers to pass along output from one tool to another later tool. Do NOT include 'functions.' in the tool name -- simply use GptTool, ShellTool, etc. Notice that each object in the JSON list here has a "parameters" key -- NOT an "args" key. Steps that do not use each other's output run in parallel; add "depends_on": ["someId"] to a step that must run after another step it does not reference (e.g. reading a file an earlier step wrote). A step with "stream_from": "someId" consumes that earlier step's output while it is being produced (e.g. piped into a ShellTool command's stdin) instead of waiting for all of it; the streamed step's own result is then only a size summary.
 
                 Example:
                 [
@@ -62,21 +253,14 @@ class PipelineTool(BaseTool):
         except json.JSONDecodeError:
             raise ValueError(f"Invalid JSON input: {input}")
 
-        context = {}
-
-        for step in pipeline:
-            # Extract tool name, parameters, and result storage id
-            tool_name = step.get("tool")
-            parameters = step.get("parameters")
-            step_id = step.get("id")
-
-            self.substitute_placeholders(parameters, context)
+        templates, sources, dependencies, streams = self.build_graph(pipeline)
+        self.check_acyclic(pipeline, dependencies)
+        results = self.run_graph(pipeline, templates, sources, dependencies, streams)
 
-            # Execute the tool with resolved parameters
-            execution_result = self.manager.execute_tool(tool_name, **parameters)
-
-            # Store the result in context with identifier
-            if step_id:
-                context[step_id] = execution_result
+        # Assemble the context in pipeline order so a repeated id keeps its last value, as before
+        context = {}
+        for step, result in zip(pipeline, results):
+            if step.get("id"):
+                context[step["id"]] = result
 
         return json.dumps(context)
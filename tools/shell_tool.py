@@ -1,8 +1,431 @@
 from tools.base_tool import BaseTool
+from utils.shell_session import ShellSessions, SessionDied
+from utils.bounded_buffer import HeadTailBuffer
+from typing import Iterable, Iterator, List, Optional, Sequence
 import subprocess
+import selectors
+import contextlib
+import threading
+import tempfile
+import asyncio
+import codecs
+import signal
+import shlex
 import json
+import time
+import os
 
 class ShellTool(BaseTool):
+    streams_input = True  # An upstream pipeline stream is piped into the first command's stdin
+    bounded_output = True  # See head_bytes and tail_bytes
+    read_size = 64 * 1024
+    head_bytes = 32 * 1024  # Output kept from the start of each stream of a command ...
+    tail_bytes = 32 * 1024  # ... and from its end; the middle is dropped and counted
+    timeout = 300.0  # Default seconds per command; a command's "timeout" key overrides it
+    total_timeout = 900.0  # Seconds for all commands of one call
+    operators = ('|', '<', '>', '>>', '2>&1')
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        # Named long-lived shells for commands with a "session" key
+        self.sessions = ShellSessions()
+
+    @staticmethod
+    def parse_commands(input):
+        try:
+            # Ensure 'commands' is a list of dictionaries
+            commands = json.loads(input) if isinstance(input, str) else input
+            if not isinstance(commands, list):
+                commands = [commands]
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON input: {input}")
+        return commands
+
+    @staticmethod
+    def new_stage(command) -> dict:
+        return {'argv': [str(command)], 'stdin': None, 'stdout': None, 'append': False, 'stderr_to_stdout': False}
+
+    @classmethod
+    def parse_pipeline(cls, command_json) -> List[dict]:
+        """
+        Split a command's args at the operators |, <, >, >> and 2>&1 into stages, each a dict with
+        its argv, the files its stdin and stdout are redirected to, and whether stderr goes wherever
+        its stdout goes. Operators must be separate args to be recognised.
+        """
+        stage = cls.new_stage(command_json['command'])
+        stages = [stage]
+        tokens = iter(command_json.get('args', []))
+        for token in tokens:
+            if token == '|':
+                command = next(tokens, None)
+                if command is None or command in cls.operators:
+                    raise ValueError("'|' must be followed by a command")
+                stage = cls.new_stage(command)
+                stages.append(stage)
+            elif token in ('<', '>', '>>'):
+                target = next(tokens, None)
+                if target is None or target in cls.operators:
+                    raise ValueError(f"'{token}' must be followed by a file name")
+                if token == '<':
+                    stage['stdin'] = str(target)
+                else:
+                    stage['stdout'] = str(target)
+                    stage['append'] = token == '>>'
+            elif token == '2>&1':
+                stage['stderr_to_stdout'] = True
+            else:
+                stage['argv'].append(str(token))
+        return stages
+
+    @staticmethod
+    def shell_line(stages: List[dict]) -> str:
+        """The stages as a bash command line, for sessions."""
+        parts = []
+        for stage in stages:
+            line = shlex.join(stage['argv'])
+            if stage['stdin']:
+                line += f" < {shlex.quote(stage['stdin'])}"
+            if stage['stdout']:
+                line += f" {'>>' if stage['append'] else '>'} {shlex.quote(stage['stdout'])}"
+            if stage['stderr_to_stdout']:
+                line += " 2>&1"
+            parts.append(line)
+        return ' | '.join(parts)
+
+    def planned_commands(self, input):
+        """Yield each command with the seconds it may run, which is <= 0 once the call's deadline has passed."""
+        deadline = time.monotonic() + self.total_timeout
+        for command_json in self.parse_commands(input):
+            yield command_json, self.command_timeout(command_json, deadline)
+
+    def skipped(self, command_json) -> str:
+        return f"[skipped {command_json['command']}: total timeout of {self.total_timeout:g}s exceeded]\n"
+
+    def command_timeout(self, command_json, deadline: float) -> float:
+        """Seconds the command may run: its own "timeout" (or the default), capped by the call's deadline."""
+        return min(float(command_json.get('timeout', self.timeout)), deadline - time.monotonic())
+
+    @staticmethod
+    def kill_group(process):
+        # Commands start in their own session, so this also reaches any children they spawned
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    def format_result(stdout: str, stderr: str = '', statuses: Sequence[Optional[int]] = (0,),
+                      names: Sequence[str] = (), timeout: Optional[float] = None) -> str:
+        msg = stdout
+        if stderr:
+            msg += f"\n[stderr]\n{stderr}"
+        if timeout is not None:
+            msg += f"\n[timed out after {timeout:.3g}s; process group killed]"
+        elif len(statuses) > 1 and any(statuses):
+            # Name every stage so a failure in the middle of a pipeline is not masked by the last one
+            msg += f"\n[exit status {' | '.join(f'{name}={status}' for name, status in zip(names, statuses))}]"
+        elif statuses and statuses[0]:
+            msg += f"\n[exit status {statuses[0]}]"
+        return msg + '\n'
+
+    @staticmethod
+    def output_message(stages: List[dict], stdout: str) -> str:
+        return f"REDIRECTED_TO_FILE: {stages[-1]['stdout']}" if stages[-1]['stdout'] else stdout
+
+    @staticmethod
+    def close_fd(item):
+        if isinstance(item, int):
+            os.close(item)
+        else:
+            item.close()
+
+    def wire_stages(self, stages: List[dict], stdin, stdout, stderr):
+        """
+        Yield (stage, stdin, stdout, stderr) to start each stage with. Consecutive stages are joined
+        by an OS pipe, so data between them never passes through Python, and redirects open their
+        files. The parent's copies are closed once the caller has started the stage and asks for
+        the next one.
+        """
+        upstream = None  # Read end of the pipe from the previous stage
+        try:
+            for index, stage in enumerate(stages):
+                opened = []
+                if upstream is not None:
+                    opened.append(upstream)
+                if stage['stdin']:
+                    stage_in = open(stage['stdin'], 'rb')
+                    opened.append(stage_in)
+                elif index == 0:
+                    stage_in = stdin
+                else:
+                    # The previous stage's output went to a file, so there is nothing to read
+                    stage_in = upstream if upstream is not None else subprocess.DEVNULL
+                upstream = None
+
+                if stage['stdout']:
+                    stage_out = open(stage['stdout'], 'ab' if stage['append'] else 'wb')
+                    opened.append(stage_out)
+                elif index == len(stages) - 1:
+                    stage_out = stdout
+                else:
+                    upstream, stage_out = os.pipe()
+                    opened.append(stage_out)
+
+                try:
+                    yield stage, stage_in, stage_out, subprocess.STDOUT if stage['stderr_to_stdout'] else stderr
+                finally:
+                    for item in opened:
+                        self.close_fd(item)
+        finally:
+            if upstream is not None:
+                os.close(upstream)
+
+    def start_stages(self, stages: List[dict], stdin, stderr) -> List[subprocess.Popen]:
+        """Start every stage in its own session; the last stage's stdout is a pipe unless redirected."""
+        processes = []
+        try:
+            with contextlib.closing(self.wire_stages(stages, stdin, subprocess.PIPE, stderr)) as wiring:
+                for stage, stage_in, stage_out, stage_err in wiring:
+                    processes.append(subprocess.Popen(stage['argv'], stdin=stage_in, stdout=stage_out,
+                                                      stderr=stage_err, start_new_session=True))
+        except BaseException:
+            for process in processes:
+                self.kill_group(process)
+                process.wait()
+            raise
+        return processes
+
+    def run_command(self, command_json, timeout: float) -> str:
+        try:
+            stages = self.parse_pipeline(command_json)
+            stdout = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+            stderr = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+            # All stages share one stderr pipe, read here alongside the last stage's stdout
+            err_read, err_write = os.pipe()
+            try:
+                processes = self.start_stages(stages, subprocess.DEVNULL, err_write)
+            except BaseException:
+                os.close(err_read)
+                raise
+            finally:
+                os.close(err_write)
+
+            # Read both streams incrementally into bounded buffers until EOF or the deadline
+            deadline = time.monotonic() + timeout
+            timed_out = False
+            buffers = {err_read: stderr}
+            if processes[-1].stdout is not None:
+                buffers[processes[-1].stdout.fileno()] = stdout
+            with selectors.DefaultSelector() as selector:
+                for fd in buffers:
+                    selector.register(fd, selectors.EVENT_READ)
+                while selector.get_map():
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        timed_out = True
+                        break
+                    for key, _ in selector.select(wait):
+                        data = os.read(key.fd, self.read_size)
+                        if data:
+                            buffers[key.fd].write(data)
+                        else:
+                            selector.unregister(key.fd)
+            for process in processes:
+                if not timed_out:
+                    try:
+                        process.wait(max(0.0, deadline - time.monotonic()))
+                        continue
+                    except subprocess.TimeoutExpired:
+                        # Both pipes closed but a stage lingers, e.g. it detached its output
+                        timed_out = True
+                for other in processes:
+                    self.kill_group(other)
+                process.wait()
+            os.close(err_read)
+            if processes[-1].stdout is not None:
+                processes[-1].stdout.close()
+
+            return self.format_result(self.output_message(stages, stdout.text()), stderr.text(),
+                                      [p.returncode for p in processes], [s['argv'][0] for s in stages],
+                                      timeout if timed_out else None)
+
+        except Exception as e:
+            return f"An unexpected error occurred: {e}\n"
+
+    async def arun_command(self, command_json, timeout: float) -> str:
+        try:
+            stages = self.parse_pipeline(command_json)
+            stdout = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+            stderr = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+            processes = []
+            try:
+                wiring = self.wire_stages(stages, asyncio.subprocess.DEVNULL, asyncio.subprocess.PIPE,
+                                          asyncio.subprocess.PIPE)
+                with contextlib.closing(wiring):
+                    for stage, stage_in, stage_out, stage_err in wiring:
+                        processes.append(await asyncio.create_subprocess_exec(
+                            *stage['argv'], stdin=stage_in, stdout=stage_out, stderr=stage_err,
+                            start_new_session=True
+                        ))
+            except BaseException:
+                for process in processes:
+                    self.kill_group(process)
+                    await process.wait()
+                raise
+
+            async def pump(stream, buffer):
+                while True:
+                    data = await stream.read(self.read_size)
+                    if not data:
+                        return
+                    buffer.write(data)
+
+            pumps = [pump(process.stderr, stderr) for process in processes if process.stderr is not None]
+            if processes[-1].stdout is not None:
+                pumps.append(pump(processes[-1].stdout, stdout))
+            timed_out = False
+            try:
+                await asyncio.wait_for(asyncio.gather(*pumps, *(p.wait() for p in processes)), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                for process in processes:
+                    self.kill_group(process)
+                for process in processes:
+                    await process.wait()
+
+            return self.format_result(self.output_message(stages, stdout.text()), stderr.text(),
+                                      [p.returncode for p in processes], [s['argv'][0] for s in stages],
+                                      timeout if timed_out else None)
+
+        except Exception as e:
+            return f"An unexpected error occurred: {e}\n"
+
+    def run_in_session(self, command_json, timeout: float, stdin_path: Optional[str] = None) -> str:
+        name = command_json['session']
+        if command_json['command'] == 'exit':
+            closed = self.sessions.close(name)
+            return f"Closed session '{name}'\n" if closed else f"No session '{name}'\n"
+
+        try:
+            stages = self.parse_pipeline(command_json)
+            stdout, stderr, statuses = self.sessions.get(name).run(self.shell_line(stages), stdin_path, timeout)
+        except ValueError as e:
+            return f"An unexpected error occurred: {e}\n"
+        except SessionDied as e:
+            self.sessions.close(name)
+            return f"{e}\n"
+
+        msg = self.output_message(stages, stdout)
+        if statuses is None:
+            # The session was killed along with the command; the next command starts a fresh one
+            self.sessions.close(name)
+            return self.format_result(msg, stderr, timeout=timeout)
+        return self.format_result(msg, stderr, statuses, [stage['argv'][0] for stage in stages])
+
+    def stream_in_session(self, command_json, timeout: float, chunks: Optional[Iterable[str]]) -> Iterator[str]:
+        if chunks is None:
+            yield self.run_in_session(command_json, timeout)
+            return
+        # The session's stdin carries the command framing, so upstream input goes through a file
+        with tempfile.NamedTemporaryFile('w', suffix='.stdin', delete=False) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        try:
+            yield self.run_in_session(command_json, timeout, f.name)
+        finally:
+            os.unlink(f.name)
+
+    @staticmethod
+    def feed_stdin(stdin, chunks: Iterable[str], errors: list):
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                stdin.write(chunk.encode())
+        except (BrokenPipeError, OSError):
+            pass  # The command stopped reading, e.g. `head`
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def stream_command(self, command_json, timeout: float, chunks: Optional[Iterable[str]] = None) -> Iterator[str]:
+        stdin = subprocess.PIPE if chunks is not None else subprocess.DEVNULL
+        err_read, err_write = os.pipe()
+        try:
+            stages = self.parse_pipeline(command_json)
+            processes = self.start_stages(stages, stdin, err_write)
+        except Exception as e:
+            os.close(err_read)
+            yield f"An unexpected error occurred: {e}\n"
+            return
+        finally:
+            os.close(err_write)
+
+        # The last stage's stdout is streamed to the consumer; stderr is drained on the side into a bounded buffer
+        stderr = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+        drain = threading.Thread(target=self.drain, args=(open(err_read, 'rb'), stderr), daemon=True)
+        drain.start()
+        errors = []
+        writer = None
+        if processes[0].stdin is not None:
+            writer = threading.Thread(target=self.feed_stdin, args=(processes[0].stdin, chunks, errors), daemon=True)
+            writer.start()
+        elif chunks is not None and hasattr(chunks, 'cancel'):
+            chunks.cancel()  # The first stage reads a file instead, so stop the producer
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            for process in processes:
+                self.kill_group(process)
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+        stdout = processes[-1].stdout
+        try:
+            if stdout is not None:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                while True:
+                    data = stdout.read1(self.read_size)
+                    if not data:
+                        break
+                    text = decoder.decode(data)
+                    if text:
+                        yield text
+                tail = decoder.decode(b'', final=True)
+                if tail:
+                    yield tail
+            for process in processes:
+                process.wait()
+            drain.join()
+            if writer is not None:
+                writer.join()
+            yield self.format_result(self.output_message(stages, ''), stderr.text(),
+                                     [p.returncode for p in processes], [s['argv'][0] for s in stages],
+                                     timeout if timed_out.is_set() else None)
+            if errors:
+                yield f"Upstream step failed: {errors[0]}\n"
+        finally:
+            timer.cancel()
+            for process in processes:
+                if process.poll() is None:  # The consumer stopped early
+                    self.kill_group(process)
+                    process.wait()
+            if stdout is not None:
+                stdout.close()
+
+    def drain(self, stream, buffer: HeadTailBuffer):
+        try:
+            for data in iter(lambda: stream.read1(self.read_size), b''):
+                buffer.write(data)
+        finally:
+            stream.close()
+
     def execute(self, input: str) -> str:
         """
         Execute a list of Linux commands in the shell and returns their concatenated output.
@@ -10,6 +433,8 @@ class ShellTool(BaseTool):
         Args:
             input (str): JSON representation of the list of commands to execute and optional arguments to pass.
 
+                The args may contain the shell operators "|", "<", ">", ">>" and "2>&1", each as a separate arg: "|" pipes into the next command (e.g. "args": ["-rn", "TODO", ".", "|", "wc", "-l"]), "<" and ">"/">>" read from / write or append to a file, and "2>&1" merges stderr into stdout. The exit status of every command of a pipeline is reported if any of them fails. Commands with a "session" name run in a persistent shell of that name, so the working directory and environment (cd, export) carry over between calls. The command "exit" closes the session. Each command may set a "timeout" in seconds (default 300). Stderr, a non-zero exit status and timeouts are reported after the output, and very long output is cut down to its head and tail.
+
                 Example:
                 [
                     {
@@ -19,46 +444,49 @@ class ShellTool(BaseTool):
                     {
                         "command": "echo",
                         "args": ["foo", ">", "foo.txt"]
+                    },
+                    {
+                        "command": "sort",
+                        "args": ["<", "names.txt", "|", "uniq", "-c", ">>", "counts.txt"]
+                    },
+                    {
+                        "command": "cd",
+                        "args": ["src"],
+                        "session": "main"
                     }
                 ]
         """
-        try:
-            # Ensure 'commands' is a list of dictionaries
-            commands = json.loads(input) if isinstance(input, str) else input
-            if not isinstance(commands, list):
-                commands = [commands]
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON input: {input}")
         result_str = ''
-        
-        for command_json in commands:
-            command = command_json['command']
-            args = command_json.get('args', [])
-            redirect_out = None
-            
-            if '>' in args:  # detect redirection
-                redirect_index = args.index('>')
-                redirect_out = args[redirect_index + 1]  # get the output file 
-                args = args[:redirect_index]  # remove '> and filename' from args
-            
-            try:
-                # Run the command and handle output redirection
-                if redirect_out:
-                    with open(redirect_out, 'w') as fp:
-                        subprocess.run([command] + args, stdout=fp, stderr=subprocess.PIPE, check=False)
-                    msg = f'REDIRECTED_TO_FILE: {redirect_out}\n' 
-                else:
-                    # Execute command and capture stdout and stderr
-                    completed_process = subprocess.run([command] + args, text=True, capture_output=True, check=False)
-                    msg = completed_process.stdout
-                
-                result_str += msg + '\n'
-
-            except subprocess.CalledProcessError as e:
-                # Capture stderr from the exception if the command fails
-                self.manager.logger.warning(f"CalledProcessError: {e}")
-                result_str += e.stderr + e.stdout + '\n'
-            except Exception as e:
-                result_str += f"An unexpected error occurred: {e}\n"
+        for command_json, timeout in self.planned_commands(input):
+            if timeout <= 0:
+                result_str += self.skipped(command_json)
+            elif command_json.get('session'):
+                result_str += self.run_in_session(command_json, timeout)
+            else:
+                result_str += self.run_command(command_json, timeout)
 
         return result_str.strip()
+
+    async def aexecute(self, input: str) -> str:
+        # Native asyncio path: commands run via create_subprocess_exec without tying up a thread
+        result_str = ''
+        for command_json, timeout in self.planned_commands(input):
+            if timeout <= 0:
+                result_str += self.skipped(command_json)
+            elif command_json.get('session'):
+                result_str += await asyncio.to_thread(self.run_in_session, command_json, timeout)
+            else:
+                result_str += await self.arun_command(command_json, timeout)
+
+        return result_str.strip()
+
+    def execute_stream(self, chunks: Optional[Iterable[str]] = None, input: str = None) -> Iterator[str]:
+        # Output is yielded as the commands produce it (unstripped); chunks feed the first command's stdin
+        for command_json, timeout in self.planned_commands(input):
+            if timeout <= 0:
+                yield self.skipped(command_json)
+            elif command_json.get('session'):
+                yield from self.stream_in_session(command_json, timeout, chunks)
+            else:
+                yield from self.stream_command(command_json, timeout, chunks)
+            chunks = None
@@ -1,59 +1,165 @@
 from tools.base_tool import BaseTool
+from tools.file_tool import NEW_FILE_MODE
+from utils.snapshot_cache import SnapshotCache
+from utils.file_listing import project_files
+from utils.symbol_index import SymbolIndex, plan_snapshot
+from utils.context_window import TokenCounter
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
 import json
 import os
 
 
 class SnapTool(BaseTool):
+    parallel_safe = False # Every call rewrites state.txt
+    state_path = 'state.txt'
+    cache_path = '.pyline_cache/snapshot.json'
+    read_workers = 8  # Threads reading and rendering changed files
+    symbols_path = '.pyline_cache/symbols.json'
+    default_budget = 8000  # Tokens of a snapshot with a query but no budget
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        # Rendered blocks of unchanged files are reused across calls (and runs)
+        self.cache = SnapshotCache(self.cache_path)
+        self.symbols = SymbolIndex(self.symbols_path)
+        self.counter = TokenCounter()
+        self.changes = None  # {'added': [...], 'modified': [...], 'removed': [...]} of the last snapshot
+
     @staticmethod
     def add_line_numbers(code):
         lines = code.split('\n')
         numbered_lines = [f"{idx + 1: >4}: {line}" for idx, line in enumerate(lines)]
         return '\n'.join(numbered_lines)
 
+    @staticmethod
+    def list_files(all_files):
+        # The git index (tracked and untracked-but-not-ignored files) or, outside git, a walk that
+        # honours .gitignore; either way in sorted order, so snapshots are stable
+        for path in project_files('.'):
+            if any(path.rsplit('/', 1)[-1].endswith(ext) for ext in all_files):
+                yield f"./{path}"
+
+    def render(self, file_path, line_numbers):
+        # Read the content of the file
+        with open(file_path, 'r') as f:
+            content = f.read()
+            if line_numbers:
+                content = self.add_line_numbers(content)
+
+        # Wrap in file path header and footer
+        return f'--- BEGIN {file_path} ---\n{content}\n--- END {file_path} ---\n\n'
+
+    def describe_changes(self) -> str:
+        changes = self.changes or {}
+        if not any(changes.values()):
+            return "No files changed since the previous snapshot."
+        lines = [f"Changed since the previous snapshot: {len(changes['modified'])} modified, "
+                 f"{len(changes['added'])} added, {len(changes['removed'])} removed"]
+        for kind, tag in (('modified', 'M'), ('added', 'A'), ('removed', 'D')):
+            lines.extend(f"{tag} {path}" for path in changes[kind])
+        return '\n'.join(lines)
+
     def execute(self, input: str) -> str:
         """
         Return the formatted source code of the current project. If 'infra' field is True,
         include Dockerfile, docker-compose.yml, and requirements.txt, but exclude __pycache__ directories.
 
         Args:
-            input (str): JSON string with an 'infra' field to indicate infrastructure inclusion, and optional 'line_numbers' field to include line numbers in source code output (defaults to True).
+            input (str): JSON string with an 'infra' field to indicate infrastructure inclusion, and optional 'line_numbers' field to include line numbers in source code output (defaults to True). With 'changes' set to true, only the list of files modified, added or removed since the previous snapshot is returned (state.txt is still updated). With a 'query' (what you are working on) and/or a 'budget' (in tokens, default 8000), the snapshot is cut down to fit the budget: the files and definitions most relevant to the query appear in full and the rest as signatures only.
         """
+        snapshot = ''.join(self.execute_stream(input=input))
+        if json.loads(input).get('changes'):
+            return self.describe_changes()
+        return snapshot
+
+    def execute_stream(self, chunks=None, input: str = None):
+        # Yields one file at a time, so a pipeline can consume the snapshot without holding all of it
+
         # Parse the JSON input
         params = json.loads(input)
         include_infra = params.get('infra', False)
         line_numbers = params.get('line_numbers', True)
 
-        # Initialize the formatted source code string
-        formatted_code = ''
-
         # List of project-related file extensions
         py_files = ['.py']
         infra_files = ['Dockerfile', 'docker-compose.yml', 'requirements.txt']
         all_files = py_files + infra_files if include_infra else py_files
 
-        # Traverse the project directory
-        for root, dirs, files in os.walk('.'):
-            # Skipping __pycache__ directories
-            dirs[:] = [d for d in dirs if d != '__pycache__' and d != 'venv']
-            
-            for file in files:
-                if any(file.endswith(ext) for ext in all_files):
-                    file_path = os.path.join(root, file)
-                    # Add file path header
-                    formatted_code += f'--- BEGIN {file_path} ---\n'
-
-                    # Read the content of the file
-                    with open(file_path, 'r') as f:
-                        content = f.read()
-                        if line_numbers:
-                            content = self.add_line_numbers(content)
-                        formatted_code += content
-
-                    # Add file path footer
-                    formatted_code += f'\n--- END {file_path} ---\n\n'
-        
-        # Write to state.txt
-        with open('state.txt', 'w') as f:
-            f.write(formatted_code)
-
-        return formatted_code
+        # Stat every file first: only files whose signature changed are read and rendered again
+        options = f"infra={bool(include_infra)},line_numbers={bool(line_numbers)}"
+        previous = self.cache.files(options)
+        signatures = {}
+        for file_path in self.list_files(all_files):
+            try:
+                signatures[file_path] = self.cache.signature(os.stat(file_path))
+            except OSError:
+                continue  # Removed while listing
+        self.changes = {
+            'modified': [path for path, sig in signatures.items() if path in previous and previous[path][0] != sig],
+            'added': [path for path in signatures if path not in previous],
+            'removed': [path for path in previous if path not in signatures],
+        }
+
+        # A budgeted snapshot also depends on its query and budget
+        query = params.get('query')
+        budget = params.get('budget')
+        budgeted = query is not None or budget is not None
+        state_key = f"{options},query={query!r},budget={budget}" if budgeted else options
+
+        # An unchanged snapshot leaves state.txt alone, as long as nothing else has touched it
+        rewrite = any(self.changes.values()) or not self.cache.state_is_current(state_key, self.state_path)
+        files = {}
+        state = tmp_path = None
+        if rewrite:
+            # Written next to state.txt and renamed over it once complete, so a failed or abandoned
+            # snapshot leaves the previous one in place
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.state_path)),
+                                            prefix='.state.', suffix='.tmp')
+            state = os.fdopen(fd, 'w')
+        try:
+            blocks = self.render_all(options, signatures, line_numbers, files)
+            if budgeted:
+                blocks = self.plan(signatures, dict(zip(signatures, blocks)), query or '',
+                                   int(budget or self.default_budget), line_numbers)
+            for block in blocks:
+                if state is not None:
+                    state.write(block)
+                yield block
+            if state is not None:
+                state.close()
+                os.chmod(tmp_path, NEW_FILE_MODE)  # mkstemp creates files as 0600
+                os.replace(tmp_path, self.state_path)
+                tmp_path = None
+        finally:
+            if state is not None:
+                state.close()
+            if tmp_path is not None:
+                os.unlink(tmp_path)
+        self.cache.save(options, files, self.state_path if rewrite else None, state_key)
+
+    def render_all(self, options, signatures, line_numbers, files):
+        """Yield every file's block in order, recording [signature, block] in `files`."""
+        with ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix='snap') as pool:
+            # Files that need rendering are read in parallel; blocks are still produced in order
+            pending = {
+                file_path: pool.submit(self.render, file_path, line_numbers)
+                for file_path, signature in signatures.items()
+                if self.cache.block(options, file_path, signature) is None
+            }
+            try:
+                for file_path, signature in signatures.items():
+                    future = pending.get(file_path)
+                    block = future.result() if future else self.cache.block(options, file_path, signature)
+                    files[file_path] = [signature, block]
+                    yield block
+            finally:
+                for future in pending.values():
+                    future.cancel()  # The consumer stopped early
+
+    def plan(self, signatures, blocks, query, budget, line_numbers):
+        """The most relevant files in full and stubs for the rest, within `budget` tokens."""
+        python_files = {path: signature for path, signature in signatures.items() if path.endswith('.py')}
+        entries = self.symbols.update(python_files)
+        return plan_snapshot(list(signatures), blocks, entries, self.symbols, query, budget,
+                             self.counter.count_text, line_numbers)
@@ -0,0 +1,37 @@
+from typing import Iterable
+
+
+class ApprovalPolicy:
+    """
+    Decides unattended whether a tool call may run, in place of the interactive y/n prompt.
+
+    Built from a spec string:
+        always                      approve every call
+        never                       reject every call
+        allow:ShellTool,GptTool     approve only the listed tools
+        deny:ExecTool,FileTool      approve everything except the listed tools
+    """
+
+    def __init__(self, default: bool, exceptions: Iterable[str] = ()):
+        self.default = default
+        self.exceptions = frozenset(exceptions)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'ApprovalPolicy':
+        kind, _, tools = spec.partition(':')
+        names = [name.strip() for name in tools.split(',') if name.strip()]
+        if kind == 'always' and not names:
+            return cls(True)
+        if kind == 'never' and not names:
+            return cls(False)
+        if kind == 'allow':
+            return cls(False, names)
+        if kind == 'deny':
+            return cls(True, names)
+        raise ValueError(f"Invalid approval policy {spec!r}; expected always, never, allow:<tools> or deny:<tools>")
+
+    def __call__(self, tool_name: str, function_args: str) -> bool:
+        return self.default != (tool_name in self.exceptions)
+
+    def __repr__(self):
+        return f"ApprovalPolicy(default={self.default}, exceptions={sorted(self.exceptions)})"
@@ -0,0 +1,48 @@
+class HeadTailBuffer:
+    """
+    Captures a byte stream in bounded memory: the first head_bytes and the last tail_bytes are
+    kept and everything in between is only counted. text() marks the gap with the number of
+    bytes dropped.
+    """
+
+    def __init__(self, head_bytes: int = 32 * 1024, tail_bytes: int = 32 * 1024):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            # Trim lazily so the tail costs amortised O(1) per byte
+            if len(self.tail) > 2 * self.tail_bytes:
+                del self.tail[:-self.tail_bytes]
+
+    def drop_last(self, count: int):
+        """Forget the last `count` bytes written (e.g. framing that followed the real output)."""
+        count = min(count, self.total)
+        self.total -= count
+        from_tail = min(count, len(self.tail))
+        del self.tail[len(self.tail) - from_tail:]
+        if count > from_tail:
+            del self.head[len(self.head) - (count - from_tail):]
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - min(len(self.tail), self.tail_bytes)
+
+    def text(self) -> str:
+        tail = self.tail[-self.tail_bytes:] if self.tail_bytes else b''
+        if not self.dropped:
+            return (self.head + tail).decode(errors='replace')
+        return (
+            f"{self.head.decode(errors='replace')}\n"
+            f"[... {self.dropped} of {self.total} bytes truncated ...]\n"
+            f"{tail.decode(errors='replace')}"
+        )
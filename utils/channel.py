@@ -0,0 +1,93 @@
+from collections import deque
+from typing import Iterable, Iterator, Optional
+import contextvars
+import threading
+
+
+class Channel:
+    """
+    Bounded, thread-safe queue of text chunks between one producer and one consumer.
+
+    put() blocks while more than max_chars are buffered, so a fast producer is held back by a
+    slow consumer (backpressure). A single chunk larger than the bound is still admitted when the
+    buffer is empty. Iterating yields chunks until the producer closes the channel, re-raising the
+    producer's error if it failed; a consumer that stops early cancels the producer.
+    """
+
+    def __init__(self, max_chars: int = 1 << 20):
+        self.max_chars = max_chars
+        self.chunks = deque()
+        self.buffered = 0
+        self.total = 0  # Characters put over the channel's lifetime
+        self.closed = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.condition = threading.Condition()
+
+    def put(self, chunk: str) -> bool:
+        """Queue a chunk, waiting for room; returns False if the consumer has gone away."""
+        with self.condition:
+            while self.buffered and self.buffered + len(chunk) > self.max_chars and not self.cancelled:
+                self.condition.wait()
+            if self.cancelled:
+                return False
+            self.chunks.append(chunk)
+            self.buffered += len(chunk)
+            self.total += len(chunk)
+            self.condition.notify_all()
+            return True
+
+    def close(self, error: Optional[BaseException] = None):
+        with self.condition:
+            self.closed = True
+            self.error = error
+            self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.chunks.clear()
+            self.buffered = 0
+            self.condition.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            while True:
+                with self.condition:
+                    while not self.chunks and not self.closed:
+                        self.condition.wait()
+                    if not self.chunks:
+                        if self.error is not None:
+                            raise self.error
+                        return
+                    chunk = self.chunks.popleft()
+                    self.buffered -= len(chunk)
+                    self.condition.notify_all()
+                yield chunk
+        finally:
+            if not self.closed:
+                self.cancel()
+
+    @classmethod
+    def from_iterable(cls, chunks: Iterable[str], max_chars: int = 1 << 20) -> 'Channel':
+        """Drain `chunks` into a new channel on a producer thread that runs in a copy of the current context."""
+        channel = cls(max_chars)
+
+        def produce():
+            iterator = iter(chunks)
+            try:
+                for chunk in iterator:
+                    if chunk and not channel.put(chunk):
+                        break
+            except BaseException as e:
+                channel.close(e)
+                return
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()  # Let a generator release its resources (e.g. a subprocess) right away
+            channel.close()
+
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True, name='channel')
+        thread.start()
+        return channel
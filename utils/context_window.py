@@ -0,0 +1,151 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it is installed, otherwise estimates ~4 characters per token."""
+    MESSAGE_OVERHEAD = 4  # role, separators and name fields per message
+
+    def __init__(self, model: Optional[str] = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+            except KeyError:
+                self.encoding = tiktoken.get_encoding('cl100k_base')
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+
+def message_field(message, field: str, default=None):
+    # Conversations mix plain dicts with the ChatCompletionMessage objects returned by the API
+    if isinstance(message, dict):
+        return message.get(field, default)
+    return getattr(message, field, default)
+
+
+class ContextWindow:
+    """
+    Keeps a conversation's `messages` list within a token budget.
+
+    Token counts are cached per message so the running total costs one lookup per message.
+    When the budget is exceeded, old tool outputs are summarized or truncated first, then the oldest
+    exchanges are evicted. An assistant message with `tool_calls` and its `tool` responses are always
+    kept or dropped together, and the system prompt and the most recent exchanges are never evicted.
+    """
+
+    def __init__(self, token_budget: int, model: Optional[str] = None, keep_recent: int = 2,
+                 truncate_threshold: int = 256, summarizer: Optional[Callable[[str], str]] = None):
+        self.token_budget = token_budget
+        self.counter = TokenCounter(model)
+        self.keep_recent = keep_recent
+        self.truncate_threshold = truncate_threshold
+        self.summarizer = summarizer
+        self.logger = logging.getLogger(__name__)
+        self.cache: Dict[int, Tuple[object, object, int]] = {}  # id(message) -> (message, content, tokens)
+        self.total = 0
+
+    @staticmethod
+    def message_text(message) -> str:
+        parts = [message_field(message, 'content') or '', message_field(message, 'name') or '']
+        for tool_call in message_field(message, 'tool_calls') or []:
+            function = message_field(tool_call, 'function')
+            parts.append(message_field(function, 'name') or '')
+            parts.append(message_field(function, 'arguments') or '')
+        return '\n'.join(parts)
+
+    def count(self, message) -> int:
+        content = message_field(message, 'content')
+        cached = self.cache.get(id(message))
+        # Strings are immutable, so an identical content object means an unchanged count
+        if cached is not None and cached[0] is message and cached[1] is content:
+            return cached[2]
+        tokens = self.counter.count_text(self.message_text(message)) + TokenCounter.MESSAGE_OVERHEAD
+        self.cache[id(message)] = (message, content, tokens)
+        return tokens
+
+    def count_messages(self, messages: List) -> int:
+        self.total = sum(self.count(message) for message in messages)
+        # Forget messages that have left the conversation
+        if len(self.cache) > 2 * len(messages):
+            live = {id(message) for message in messages}
+            self.cache = {key: value for key, value in self.cache.items() if key in live}
+        return self.total
+
+    @staticmethod
+    def units(messages: List) -> List[Tuple[int, int]]:
+        """Group messages into [start, end) units so tool_calls and their tool responses stay together."""
+        units = []
+        i = 0
+        while i < len(messages):
+            end = i + 1
+            if message_field(messages[i], 'tool_calls'):
+                while end < len(messages) and message_field(messages[end], 'role') == 'tool':
+                    end += 1
+            units.append((i, end))
+            i = end
+        return units
+
+    def shrink_tool_output(self, message) -> int:
+        """Summarize or truncate one tool message in place, returning the tokens saved."""
+        before = self.count(message)
+        content = message['content']
+        if self.summarizer is not None:
+            shortened = f"[Summary of earlier tool output]\n{self.summarizer(content)}"
+        else:
+            keep_chars = self.truncate_threshold * 2  # roughly half the threshold, in characters
+            shortened = f"{content[:keep_chars]}\n[... truncated ~{before - self.truncate_threshold // 2} tokens of tool output ...]"
+        if len(shortened) >= len(content):
+            return 0
+        message['content'] = shortened
+        return before - self.count(message)
+
+    def fit(self, messages: List) -> int:
+        """Shrink `messages` in place until it fits the budget (or nothing more can go). Returns the new total."""
+        total = self.count_messages(messages)
+        if total <= self.token_budget:
+            return total
+
+        units = self.units(messages)
+        first = 1 if units and message_field(messages[0], 'role') == 'system' else 0
+        evictable = units[first:max(first, len(units) - self.keep_recent)]
+
+        # 1. Summarize or truncate old tool outputs, oldest first
+        for start, end in evictable:
+            for message in messages[start:end]:
+                if total <= self.token_budget:
+                    break
+                if message_field(message, 'role') == 'tool' and self.count(message) > self.truncate_threshold:
+                    total -= self.shrink_tool_output(message)
+
+        # 2. Evict whole exchanges, oldest first
+        evicted = []
+        for start, end in evictable:
+            if total <= self.token_budget:
+                break
+            total -= sum(self.count(message) for message in messages[start:end])
+            evicted.append((start, end))
+        for start, end in reversed(evicted):
+            del messages[start:end]
+
+        # 3. Last resort: shrink tool outputs of the protected recent exchanges as well
+        if total > self.token_budget:
+            for message in messages:
+                if total <= self.token_budget:
+                    break
+                if message_field(message, 'role') == 'tool' and self.count(message) > self.truncate_threshold:
+                    total -= self.shrink_tool_output(message)
+
+        self.logger.debug(f"Context window fitted to {total}/{self.token_budget} tokens, evicted {len(evicted)} exchanges")
+        self.total = total
+        return total
@@ -0,0 +1,139 @@
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Optional
+import multiprocessing
+import threading
+import traceback
+import resource
+import logging
+import signal
+import queue
+import math
+import io
+import os
+
+
+def set_soft_limit(kind: int, soft: int):
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(kind, (soft, hard))
+
+
+def run_snippet(source: str, cpu_seconds: Optional[float], memory_bytes: Optional[int]):
+    """Run one snippet in a fresh namespace under the given limits and return (stdout, stderr, error)."""
+    cpu_limit, memory_limit = resource.getrlimit(resource.RLIMIT_CPU), resource.getrlimit(resource.RLIMIT_AS)
+    stdout, stderr = io.StringIO(), io.StringIO()
+    try:
+        if cpu_seconds is not None:
+            # RLIMIT_CPU counts the worker's whole lifetime, so the limit is set relative to what it has used
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            set_soft_limit(resource.RLIMIT_CPU, math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds))
+        if memory_bytes is not None:
+            set_soft_limit(resource.RLIMIT_AS, memory_bytes)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                exec(compile(source, '<string>', 'exec'), {'__name__': '__main__'})
+            except BaseException as e:
+                return stdout.getvalue(), stderr.getvalue(), f"Got error executing {source}: {traceback.format_exc()} {e}"
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, cpu_limit)
+        resource.setrlimit(resource.RLIMIT_AS, memory_limit)
+    return stdout.getvalue(), stderr.getvalue(), None
+
+
+def worker_main(connection):
+    # The parent kills a worker that overruns its wall-clock limit; SIGXCPU (CPU limit) ends it as well
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            source, cpu_seconds, memory_bytes = connection.recv()
+        except EOFError:
+            return
+        connection.send(run_snippet(source, cpu_seconds, memory_bytes))
+
+
+class Worker:
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class ExecPool:
+    """
+    A pool of pre-started worker interpreters for running Python snippets in isolation.
+
+    Workers come from a forkserver that has already imported this module, so starting (or
+    replacing) one is cheap. Each snippet runs in a fresh namespace in one worker with a soft CPU
+    time limit (RLIMIT_CPU) and an address-space limit (RLIMIT_AS, the portable stand-in for RSS).
+    A worker runs a single snippet and is then replaced, so nothing a snippet imports, patches or
+    leaves running carries over to the next one; a worker that exceeds the wall-clock timeout, or
+    dies, is killed and replaced the same way, so the host process is never affected. Snippets run
+    in parallel up to the number of workers.
+    """
+
+    def __init__(self, size: Optional[int] = None, start_method: str = 'forkserver'):
+        self.size = size or min(os.cpu_count() or 1, 8)
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self.context.set_forkserver_preload([__name__])
+        self.idle: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.logger = logging.getLogger(__name__)
+        for _ in range(self.size):
+            self.add_worker()
+
+    def add_worker(self):
+        worker = Worker(self.context)
+        with self.lock:
+            self.workers.append(worker)
+        self.idle.put(worker)
+
+    def replace(self, worker: Worker):
+        worker.kill()
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+            closed = self.size == 0
+        if not closed:
+            self.add_worker()
+
+    def run(self, source: str, timeout: Optional[float] = None, cpu_seconds: Optional[float] = None,
+            memory_bytes: Optional[int] = None) -> str:
+        """Run a snippet on the next idle worker and return its output, stderr and any error as text."""
+        worker = self.idle.get()
+        try:
+            worker.connection.send((source, cpu_seconds, memory_bytes))
+            if not worker.connection.poll(timeout):
+                self.logger.warning("Isolated snippet timed out after %ss; replacing worker %s", timeout, worker.process.pid)
+                self.replace(worker)
+                return f"[timed out after {timeout:.3g}s; worker killed]"
+            stdout, stderr, error = worker.connection.recv()
+        except (EOFError, OSError):
+            # The worker died mid-snippet, e.g. killed by SIGXCPU at its CPU limit
+            worker.process.join()
+            exitcode = worker.process.exitcode
+            self.replace(worker)
+            if exitcode == -signal.SIGXCPU:
+                return f"[CPU time limit of {cpu_seconds:g}s exceeded; worker killed]"
+            return f"[worker exited with status {exitcode}]"
+        except BaseException:
+            self.replace(worker)
+            raise
+        self.replace(worker)  # Retired after one snippet, so every run starts from a clean interpreter
+        if error is not None:
+            return stdout + error
+        return stdout + (f"\n[stderr]\n{stderr}" if stderr else '')
+
+    def close(self):
+        with self.lock:
+            workers, self.workers, self.size = self.workers, [], 0
+        for worker in workers:
+            worker.kill()
@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional
+import subprocess
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+ALWAYS_SKIPPED = {'.git', '__pycache__', 'venv'}
+
+
+class IgnoreRule:
+    """One .gitignore pattern, matched against paths relative to the directory of its file."""
+
+    __slots__ = ('regex', 'negate', 'dir_only')
+
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            pattern = pattern[1:]  # \# and \! stand for a literal first character
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # A slash at the start or in the middle anchors the pattern to its directory
+        anchored = '/' in pattern
+        body = self.translate(pattern.lstrip('/'))
+        self.regex = re.compile(('^' if anchored else '^(?:.*/)?') + body + '$')
+
+    @staticmethod
+    def translate(pattern: str) -> str:
+        out = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                out.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                out.append('[^/]')
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+                end = pattern.index(']', i + 2)
+                members = pattern[i + 1:end]
+                out.append('[' + ('^' + members[1:] if members.startswith('!') else members) + ']')
+                i = end + 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        return ''.join(out)
+
+    @classmethod
+    def parse(cls, text: str) -> List['IgnoreRule']:
+        rules = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if line and not line.startswith('#'):
+                rules.append(cls(line))
+        return rules
+
+
+def ignored(rules, path: str, is_dir: bool) -> bool:
+    """Whether a path is ignored by (base directory, rule) pairs, where the last matching rule wins."""
+    result = False
+    for base, rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if path.startswith(base) and rule.regex.match(path[len(base):]):
+            result = not rule.negate
+    return result
+
+
+def git_files(root: str = '.') -> Optional[List[str]]:
+    """Tracked plus untracked-but-not-ignored files from git, or None when git cannot answer."""
+    try:
+        completed = subprocess.run(
+            ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+            cwd=root, capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"git ls-files unavailable: {e}")
+        return None
+    if completed.returncode != 0:
+        return None  # Not a git checkout
+    paths = completed.stdout.decode(errors='surrogateescape').split('\0')
+    return sorted({path for path in paths if path})
+
+
+def walk_files(root: str = '.') -> List[str]:
+    """Walk the tree, honouring every .gitignore on the way down."""
+    rules_for: Dict[str, list] = {}
+    files = []
+    for directory, dirs, names in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        prefix = '' if relative == '.' else relative.replace(os.sep, '/') + '/'
+        rules = rules_for.pop(directory, [])
+        try:
+            with open(os.path.join(directory, '.gitignore'), 'r') as f:
+                rules = rules + [(prefix, rule) for rule in IgnoreRule.parse(f.read())]
+        except OSError:
+            pass
+
+        dirs[:] = sorted(d for d in dirs if d not in ALWAYS_SKIPPED and not ignored(rules, prefix + d, True))
+        for d in dirs:
+            rules_for[os.path.join(directory, d)] = rules
+        files.extend(prefix + name for name in names if not ignored(rules, prefix + name, False))
+    return sorted(files)
+
+
+def project_files(root: str = '.') -> List[str]:
+    """Sorted paths (relative to root, '/'-separated) of the files that belong to the project."""
+    files = git_files(root)
+    if files is None:
+        files = walk_files(root)
+    return [path for path in files if not ALWAYS_SKIPPED.intersection(path.split('/')[:-1])]
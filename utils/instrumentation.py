@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from typing import Dict, Optional, Tuple
+import threading
+import logging
+import asyncio
+import json
+import time
+import uuid
+import os
+
+current_span: ContextVar[Optional['Span']] = ContextVar('pyline_current_span', default=None)
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class Span:
+    """One timed unit of work: a turn, a completion, a tool call or a pipeline step."""
+
+    def __init__(self, kind: str, name: str, parent: Optional['Span'], attributes: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.id
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.wall = 0.0
+        self.cpu: Optional[float] = 0.0  # None when it cannot be attributed to the span
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.id,
+            'parent_id': self.parent_id,
+            'kind': self.kind,
+            'name': self.name,
+            'start': self.start,
+            'wall_seconds': self.wall,
+            'cpu_seconds': self.cpu,
+            'attributes': self.attributes,
+        }
+
+
+class Tracer:
+    """
+    Records nested spans with wall-clock and CPU time (of the thread that ran the span) and the
+    token usage of completions. A span opened on an event loop records no CPU time, as the loop's
+    thread runs other tasks at the same time. Spans nest through a ContextVar, so they follow asyncio tasks and
+    any thread started with a copied context. Finished spans can be exported as JSONL and the
+    aggregated counters as a Prometheus text-format file.
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans = deque(maxlen=max_spans)
+        self.flushed = 0  # Spans finished so far that are already in the JSONL export
+        self.finished = 0
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        span = Span(kind, name, current_span.get(), attributes)
+        token = current_span.set(span)
+        wall_start, cpu_start = time.perf_counter(), None if on_event_loop() else time.thread_time()
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.wall = time.perf_counter() - wall_start
+            span.cpu = None if cpu_start is None else time.thread_time() - cpu_start
+            current_span.reset(token)
+            self.finish(span)
+
+    def increment(self, metric: str, amount: float, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def finish(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+            self.finished += 1
+            labels = {'kind': span.kind, 'name': span.name}
+            self.increment('pyline_spans_total', 1, **labels)
+            self.increment('pyline_span_wall_seconds_total', span.wall, **labels)
+            if span.cpu is not None:
+                self.increment('pyline_span_cpu_seconds_total', span.cpu, **labels)
+            if 'error' in span.attributes:
+                self.increment('pyline_span_errors_total', 1, **labels)
+
+    def record_usage(self, usage, model: str):
+        """Attach a completion's token usage to the current span and the token counters."""
+        if usage is None:
+            return
+        span = current_span.get()
+        if span is not None:
+            span.attributes['prompt_tokens'] = usage.prompt_tokens
+            span.attributes['completion_tokens'] = usage.completion_tokens
+        with self.lock:
+            self.increment('pyline_prompt_tokens_total', usage.prompt_tokens, model=model)
+            self.increment('pyline_completion_tokens_total', usage.completion_tokens, model=model)
+
+    def export_jsonl(self, path: str):
+        """Append the spans finished since the last export to `path`, one JSON object per line."""
+        with self.lock:
+            pending = min(self.finished - self.flushed, len(self.spans))
+            spans = list(self.spans)[len(self.spans) - pending:] if pending else []
+            self.flushed = self.finished
+        with open(path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + '\n')
+
+    @staticmethod
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def prometheus_text(self) -> str:
+        with self.lock:
+            counters = sorted(self.counters.items())
+        lines = []
+        typed = set()
+        for (metric, labels), value in counters:
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            label_str = ','.join(f'{key}="{self.escape(val)}"' for key, val in labels)
+            lines.append(f"{metric}{{{label_str}}} {value:g}" if label_str else f"{metric} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path: str):
+        """Rewrite `path` atomically with the current counters, e.g. for node_exporter's textfile collector."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from array import array
+from typing import List, Optional
+import threading
+import mmap
+import os
+
+
+class LineIndex:
+    """Byte offsets of the start of every line of a file, plus its end, as of (mtime, size)."""
+
+    def __init__(self, path: str, mtime_ns: int, size: int, offsets: array):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, path: str, data, mtime_ns: int) -> 'LineIndex':
+        size = len(data)
+        offsets = array('q', [0])
+        # find() runs in C, so this costs one Python iteration per line rather than per byte
+        end = data.find(b'\n')
+        while end != -1:
+            offsets.append(end + 1)
+            end = data.find(b'\n', end + 1)
+        if offsets[-1] != size:
+            offsets.append(size)  # A last line without a newline
+        return cls(path, mtime_ns, size, offsets)
+
+
+class LineIndexCache:
+    """LineIndexes of recently used files, rebuilt whenever a file's mtime or size changes."""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, LineIndex] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, data, stat: os.stat_result) -> LineIndex:
+        key = os.path.abspath(path)
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None and (index.mtime_ns, index.size) == (stat.st_mtime_ns, stat.st_size):
+                self.entries.move_to_end(key)
+                return index
+        index = LineIndex.build(path, data, stat.st_mtime_ns)
+        with self.lock:
+            self.entries[key] = index
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return index
+
+    def discard(self, path: str):
+        with self.lock:
+            self.entries.pop(os.path.abspath(path), None)
+
+
+class PieceTable:
+    """
+    The lines of a large file, editable without loading it.
+
+    The file is memory-mapped and the table is a list of pieces: ranges of original line numbers,
+    looked up through the LineIndex, and lists of added lines. Edits split pieces and never copy
+    the original text; write_to streams the result, copying untouched runs of the original as
+    single slices of the map. Supports the list operations FileTool's edits use, including slice
+    reads and slice assignment.
+    """
+
+    def __init__(self, path: str, cache: LineIndexCache):
+        self.file = open(path, 'rb')
+        try:
+            stat = os.fstat(self.file.fileno())
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index = cache.get(path, self.map, stat)
+        except BaseException:
+            self.file.close()
+            raise
+        self.pieces: List = [range(len(self.index))] if len(self.index) else []
+        self.length = len(self.index)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def original(self, start: int, stop: int) -> bytes:
+        offsets = self.index.offsets
+        return self.map[offsets[start]:offsets[stop]]
+
+    def split(self, line: int) -> int:
+        """Return the index of the piece that starts at `line` (0-based), splitting one if needed."""
+        position = 0
+        for i, piece in enumerate(self.pieces):
+            if line == position:
+                return i
+            if line < position + len(piece):
+                cut = line - position
+                self.pieces[i:i + 1] = [piece[:cut], piece[cut:]]
+                return i + 1
+            position += len(piece)
+        return len(self.pieces)
+
+    def locate(self, line: int):
+        if not 0 <= line < self.length:
+            raise IndexError("Line number out of range")
+        position = 0
+        for piece in self.pieces:
+            if line < position + len(piece):
+                return piece, line - position
+            position += len(piece)
+
+    def __getitem__(self, line):
+        if isinstance(line, slice):
+            return self.slice(*line.indices(self.length)[:2])
+        piece, offset = self.locate(line)
+        if isinstance(piece, range):
+            return self.original(piece[offset], piece[offset] + 1).decode(errors='replace')
+        return piece[offset]
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        lines = []
+        position = 0
+        for piece in self.pieces:
+            lo, hi = max(start, position), min(stop, position + len(piece))
+            if lo < hi:
+                part = piece[lo - position:hi - position]
+                if isinstance(part, range):
+                    lines.extend(self.original(n, n + 1).decode(errors='replace') for n in part)
+                else:
+                    lines.extend(part)
+            position += len(piece)
+            if position >= stop:
+                break
+        return lines
+
+    def insert(self, line: int, text: str):
+        line = max(0, min(line, self.length))
+        self.pieces.insert(self.split(line), [text])
+        self.length += 1
+
+    def pop(self, line: int) -> str:
+        text = self[line]
+        start = self.split(line)
+        self.split(line + 1)
+        del self.pieces[start]
+        self.length -= 1
+        return text
+
+    def __setitem__(self, line, text):
+        if isinstance(line, slice):
+            # Splice: the lines in the slice are replaced by the given list of lines
+            start, stop, _ = line.indices(self.length)
+            stop = max(start, stop)
+            first = self.split(start)
+            last = self.split(stop)
+            self.pieces[first:last] = [list(text)] if text else []
+            self.length += len(text) - (stop - start)
+            return
+        self.pop(line)
+        self.insert(line, text)
+
+    def read(self, start: int, stop: int) -> str:
+        """Lines [start, stop) as text, reading only the parts of the file they come from."""
+        out = []
+        position = 0
+        for piece in self.pieces:
+            lo, hi = max(start, position), min(stop, position + len(piece))
+            if lo < hi:
+                part = piece[lo - position:hi - position]
+                out.append(self.original(part.start, part.stop).decode(errors='replace')
+                           if isinstance(part, range) else ''.join(part))
+            position += len(piece)
+            if position >= stop:
+                break
+        return ''.join(out)
+
+    def write_to(self, file):
+        offsets = self.index.offsets
+        with memoryview(self.map) as view:
+            for piece in self.pieces:
+                if isinstance(piece, range):
+                    # A slice of the view is not a copy, so untouched runs go straight from the map to the file
+                    with view[offsets[piece.start]:offsets[piece.stop]] as run:
+                        file.write(run)
+                else:
+                    file.write(''.join(piece).encode())
+
+
+def read_range(path: str, start: int, stop: Optional[int], cache: LineIndexCache) -> str:
+    """Lines [start, stop) of a file, sliced out of a memory map through its cached line index."""
+    table = PieceTable(path, cache)
+    try:
+        return table.read(start, len(table) if stop is None else stop)
+    finally:
+        table.close()
@@ -0,0 +1,297 @@
+from utils.context_window import ContextWindow, TokenCounter
+from contextlib import AsyncExitStack, ExitStack, contextmanager, asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import threading
+import logging
+import asyncio
+import inspect
+import random
+import time
+
+
+class TokenBucket:
+    """
+    Paces a per-minute budget. Reservations may overdraw the bucket, in which case the caller
+    is told how long to wait, so concurrent callers queue up in arrival order.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` from the bucket and return the seconds to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) tokens once the real usage is known."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Caps in-flight requests and paces requests and tokens per minute."""
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.async_semaphore = None
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def settle(self, estimated: int, usage):
+        if self.tokens is not None and usage is not None:
+            # Usage on a stream's last chunk is a plain dict with the pinned SDK
+            total = usage['total_tokens'] if isinstance(usage, dict) else usage.total_tokens
+            self.tokens.adjust(estimated - total)
+
+    @contextmanager
+    def slot(self, tokens: int):
+        with self.semaphore:
+            time.sleep(self.reserve(tokens))
+            yield
+
+    def loop_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to one event loop, so recreate the semaphore for a new loop
+        loop = asyncio.get_running_loop()
+        if self.async_semaphore is None or self.async_semaphore[0] is not loop:
+            self.async_semaphore = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self.async_semaphore[1]
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int):
+        async with self.loop_semaphore():
+            await asyncio.sleep(self.reserve(tokens))
+            yield
+
+
+class LimitedStream:
+    """
+    A `stream=True` response that holds its RateLimiter slot until the stream is drained or closed,
+    then calls `release` with the usage of its last chunk (None if the server sent none).
+    """
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+        self.usage = None
+        self.released = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                self.usage = getattr(chunk, 'usage', None) or self.usage
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.released:
+            return
+        self.released = True
+        try:
+            close = getattr(self.stream, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.release(self.usage)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class AsyncLimitedStream(LimitedStream):
+    """Async counterpart of LimitedStream; `release` is a coroutine function."""
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.stream:
+                self.usage = getattr(chunk, 'usage', None) or self.usage
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        if self.released:
+            return
+        self.released = True
+        try:
+            close = getattr(self.stream, 'aclose', None) or getattr(self.stream, 'close', None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+        finally:
+            await self.release(self.usage)
+
+
+class LLMClient:
+    """
+    The one set of OpenAI clients owned by a ToolManager and shared by every LLM-calling tool.
+
+    Both clients sit on pooled keep-alive httpx connections. Requests go through a RateLimiter and
+    are retried on 429/5xx/connection errors with jittered exponential backoff that honors Retry-After.
+    Pre-built `client`/`async_client` objects (e.g. pointed at a stub server) may be passed in.
+    """
+
+    def __init__(self, client=None, async_client=None, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 timeout: float = 600.0, max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 max_concurrency: int = 8, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, **client_kwargs):
+        self._client = client
+        self._async_client = async_client
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client_kwargs = client_kwargs
+        self.limiter = RateLimiter(max_concurrency, requests_per_minute, tokens_per_minute)
+        self.counter = TokenCounter()
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections)
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                # Deferred so that startup does not pay for importing openai
+                import httpx
+                from openai import OpenAI
+                http_client = httpx.Client(limits=self.limits(), timeout=self.timeout)
+                self._client = OpenAI(http_client=http_client, max_retries=0, **self.client_kwargs)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def async_client(self):
+        with self.lock:
+            if self._async_client is None:
+                import httpx
+                from openai import AsyncOpenAI
+                http_client = httpx.AsyncClient(limits=self.limits(), timeout=self.timeout)
+                self._async_client = AsyncOpenAI(http_client=http_client, max_retries=0, **self.client_kwargs)
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, async_client):
+        self._async_client = async_client
+
+    def estimate_tokens(self, params: dict) -> int:
+        prompt = sum(self.counter.count_text(ContextWindow.message_text(m)) for m in params.get('messages', []))
+        return prompt + (params.get('max_tokens') or 512)
+
+    @staticmethod
+    def retry_after(error) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        headers = response.headers
+        if headers.get('retry-after-ms'):
+            try:
+                return float(headers['retry-after-ms']) / 1000
+            except ValueError:
+                pass
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    @staticmethod
+    def is_retryable(error) -> bool:
+        import openai
+        if isinstance(error, openai.APIConnectionError):  # Includes timeouts
+            return True
+        return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 409, 429) or error.status_code >= 500)
+
+    def backoff(self, attempt: int, error) -> float:
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max) + random.uniform(0, self.backoff_base / 4)
+        # Full jitter: spread retries of concurrent callers over the whole window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def create(self, **params):
+        """
+        client.chat.completions.create with rate limiting and retries. A stream keeps its slot until
+        it is drained or closed and settles the token estimate with the usage of its last chunk.
+        """
+        estimated = self.estimate_tokens(params)
+        for attempt in range(self.max_retries + 1):
+            try:
+                slot = ExitStack()
+                with slot:
+                    slot.enter_context(self.limiter.slot(estimated))
+                    response = self.client.chat.completions.create(**params)
+                    if params.get('stream'):
+                        held = slot.pop_all()
+
+                        def release(usage):
+                            held.close()
+                            self.limiter.settle(estimated, usage)
+                        return LimitedStream(response, release)
+                self.limiter.settle(estimated, getattr(response, 'usage', None))
+                return response
+            except Exception as e:
+                if attempt == self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, e)
+                self.logger.warning(f"Retrying chat completion in {delay:.2f}s after {type(e).__name__}: {e}")
+                time.sleep(delay)
+
+    async def acreate(self, **params):
+        estimated = self.estimate_tokens(params)
+        for attempt in range(self.max_retries + 1):
+            try:
+                slot = AsyncExitStack()
+                async with slot:
+                    await slot.enter_async_context(self.limiter.aslot(estimated))
+                    response = await self.async_client.chat.completions.create(**params)
+                    if params.get('stream'):
+                        held = slot.pop_all()
+
+                        async def release(usage):
+                            await held.aclose()
+                            self.limiter.settle(estimated, usage)
+                        return AsyncLimitedStream(response, release)
+                self.limiter.settle(estimated, getattr(response, 'usage', None))
+                return response
+            except Exception as e:
+                if attempt == self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, e)
+                self.logger.warning(f"Retrying async chat completion in {delay:.2f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
@@ -0,0 +1,144 @@
+from typing import Optional, Tuple
+import threading
+import tempfile
+import hashlib
+import logging
+import json
+import time
+import os
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of chat completions.
+
+    Responses are keyed by a hash of the full request (model, messages, tools and parameters) and stored
+    one JSON file per key. Entries expire after `ttl` seconds and the least recently used ones are evicted
+    once the cache grows past `max_bytes`.
+
+    Modes:
+        read-write: serve hits, call the API and record on misses (default)
+        replay: serve hits only and raise CacheMiss otherwise, so tests and CI never touch the network
+        refresh: always call the API and overwrite the recorded response
+    """
+    MODES = ('read-write', 'replay', 'refresh')
+
+    def __init__(self, directory: str = '.pyline_cache/responses', mode: str = 'read-write',
+                 max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = 7 * 24 * 3600):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid cache mode {mode!r}, expected one of {self.MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self.size = None  # Total bytes on disk, computed on first write
+        self.lock = threading.RLock()  # Guards size and eviction; concurrent tool calls share the cache
+
+    @staticmethod
+    def jsonable(value):
+        # Messages may be ChatCompletionMessage objects returned by the API
+        if hasattr(value, 'model_dump'):
+            return value.model_dump(exclude_none=True)
+        raise TypeError(f"Cannot serialize {type(value).__name__} for the response cache")
+
+    def key(self, **params) -> str:
+        params.pop('stream', None)  # Streamed and non-streamed requests share their responses
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=self.jsonable)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        if self.mode == 'refresh':
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            if self.mode == 'replay':
+                raise CacheMiss(f"No recorded response for request {key}")
+            return None
+
+        # Recorded fixtures never expire in replay mode
+        if self.mode != 'replay' and self.ttl is not None and time.time() - entry['created'] > self.ttl:
+            self.remove(path)
+            return None
+
+        try:
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except FileNotFoundError:
+            return None  # Evicted by another thread since it was read
+        self.logger.debug(f"Response cache hit {key}")
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(entry['response'])
+
+    def put(self, key: str, response):
+        if self.mode == 'replay':
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'created': time.time(), 'response': response.model_dump(mode='json')})
+
+        # A unique temp file per writer: threads of one process may store the same key at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        with self.lock:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            os.replace(tmp_path, path)
+
+            if self.size is None:
+                self.size = self.disk_usage()
+            else:
+                self.size += len(data) - previous
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def lookup(self, **params) -> Tuple[str, Optional[object]]:
+        key = self.key(**params)
+        return key, self.get(key)
+
+    def entries(self):
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if file.endswith('.json'):
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat
+
+    def disk_usage(self) -> int:
+        return sum(stat.st_size for _, stat in self.entries())
+
+    def remove(self, path: str):
+        with self.lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return  # Already removed by another thread or process
+            if self.size is not None:
+                self.size -= size
+
+    def evict(self):
+        """Delete least recently used entries until the cache is back under max_bytes."""
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[1].st_mtime)
+            self.size = sum(stat.st_size for _, stat in entries)
+            for path, stat in entries:
+                if self.size <= self.max_bytes:
+                    break
+                self.remove(path)
+        self.logger.debug(f"Response cache evicted down to {self.size} bytes")
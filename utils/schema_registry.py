@@ -0,0 +1,62 @@
+from utils.tool_manifest import LazyTool
+from typing import Callable, Dict, List
+import logging
+
+
+class SchemaRegistry:
+    """
+    Cache of the tools JSON sent with every completion request.
+
+    Each entry is keyed by tool name and stamped with a fingerprint of the tool's class
+    and `execute` function, so only tools whose class or source changed are re-introspected.
+    """
+
+    def __init__(self, builder: Callable[[type], dict]):
+        self.builder = builder
+        self.logger = logging.getLogger(__name__)
+        self.entries: Dict[str, tuple] = {}  # name -> (fingerprint, schema)
+        self.version = 0
+        self._payload: List[dict] = []
+        self._payload_version = -1
+
+    @staticmethod
+    def fingerprint(tool) -> tuple:
+        if isinstance(tool, LazyTool):
+            return ('lazy', id(tool.spec))
+        tool_cls = tool.__class__
+        execute = getattr(tool_cls, 'execute', None)
+        code = getattr(execute, '__code__', None)
+        # Identity of the class and function changes on reload or monkeypatching,
+        # the code object and docstring change when the source is edited and re-exec'd
+        return (id(tool_cls), id(execute), id(code), getattr(execute, '__doc__', None))
+
+    def build(self, tool) -> dict:
+        if isinstance(tool, LazyTool):
+            return tool.spec.schema
+        return self.builder(tool.__class__)
+
+    def sync(self, tools: Dict[str, object]) -> int:
+        """Bring the registry in line with `tools`, rebuilding only changed entries. Returns the number rebuilt."""
+        rebuilt = 0
+        for name, tool in tools.items():
+            fingerprint = self.fingerprint(tool)
+            entry = self.entries.get(name)
+            if entry is None or entry[0] != fingerprint:
+                self.entries[name] = (fingerprint, self.build(tool))
+                rebuilt += 1
+
+        stale = [name for name in self.entries if name not in tools]
+        for name in stale:
+            del self.entries[name]
+
+        if rebuilt or stale:
+            self.version += 1
+            self.logger.debug(f"Schema registry v{self.version}: rebuilt {rebuilt}, dropped {stale}")
+        return rebuilt
+
+    def payload(self) -> List[dict]:
+        """Return the prebuilt tools payload, reassembling the list only when an entry changed."""
+        if self._payload_version != self.version:
+            self._payload = [schema for _, schema in self.entries.values()]
+            self._payload_version = self.version
+        return self._payload
@@ -0,0 +1,165 @@
+from utils.bounded_buffer import HeadTailBuffer
+from typing import Dict, List, Optional, Tuple
+import subprocess
+import selectors
+import threading
+import logging
+import signal
+import shlex
+import time
+import uuid
+import os
+import re
+
+
+class SessionDied(Exception):
+    pass
+
+
+class ShellSession:
+    """
+    A long-lived bash process that keeps its working directory and environment between commands.
+
+    Each command is followed by a unique marker on stdout (carrying the exit status) and on stderr,
+    so the two streams and the status of every command can be split apart reliably. Commands read
+    stdin from /dev/null (or a given file) so they can never swallow the framing.
+    """
+
+    read_size = 64 * 1024
+    head_bytes = 32 * 1024  # Bytes of each stream kept from the start of a command's output
+    tail_bytes = 32 * 1024  # ... and from its end
+
+    def __init__(self, name: str, shell: str = 'bash', cwd: Optional[str] = None):
+        self.name = name
+        self.process = subprocess.Popen(
+            [shell, '--noprofile', '--norc'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, cwd=cwd, bufsize=0, start_new_session=True
+        )
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.logger = logging.getLogger(__name__)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, command_line: str, stdin_path: Optional[str] = None,
+            timeout: Optional[float] = None) -> Tuple[str, str, Optional[List[int]]]:
+        """
+        Run one shell command line and return (stdout, stderr, exit statuses), each stream kept to
+        a bounded head and tail; there is one status per stage of a pipeline. On timeout the whole
+        session is killed and the statuses are None.
+        """
+        with self.lock:
+            marker = f"__PYLINE_{uuid.uuid4().hex}__"
+            stdin = shlex.quote(stdin_path) if stdin_path else '/dev/null'
+            # PIPESTATUS holds the status of every stage of a pipeline; if the group never ran (e.g. the
+            # stdin file is missing) the variable stays unset and the group's own status is used
+            script = (
+                f"unset __pyline_status\n"
+                f"{{ {command_line}\n__pyline_status=\"${{PIPESTATUS[*]}}\"\n}} < {stdin}\n"
+                f"printf '\\n%s %s\\n' {marker} \"${{__pyline_status:-$?}}\"\n"
+                f"printf '\\n%s\\n' {marker} >&2\n"
+            )
+            try:
+                self.process.stdin.write(script.encode())
+            except (BrokenPipeError, OSError) as e:
+                raise SessionDied(f"Shell session '{self.name}' has exited") from e
+            result = self.read_until(marker, None if timeout is None else time.monotonic() + timeout)
+            self.last_used = time.monotonic()
+            return result
+
+    def read_until(self, marker: str, deadline: Optional[float]) -> Tuple[str, str, Optional[List[int]]]:
+        # The framing is always the last thing written to each stream, so it is matched at the end
+        # of a short rolling window rather than by rescanning the captured output
+        ends = {
+            self.process.stdout: re.compile(rb'\n' + marker.encode() + rb' (-?\d+(?: -?\d+)*)\n$'),
+            self.process.stderr: re.compile(rb'\n' + marker.encode() + rb'\n$'),
+        }
+        window_size = len(marker) + 256
+        buffers = {stream: HeadTailBuffer(self.head_bytes, self.tail_bytes) for stream in ends}
+        windows = {stream: b'' for stream in ends}
+        statuses = None
+        pending = set(ends)
+
+        with selectors.DefaultSelector() as selector:
+            for stream in ends:
+                selector.register(stream, selectors.EVENT_READ)
+            while pending:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    self.close()
+                    return buffers[self.process.stdout].text(), buffers[self.process.stderr].text(), None
+                for key, _ in selector.select(wait):
+                    stream = key.fileobj
+                    data = os.read(stream.fileno(), self.read_size)
+                    if not data:
+                        raise SessionDied(f"Shell session '{self.name}' has exited")
+                    buffers[stream].write(data)
+                    windows[stream] = (windows[stream] + data)[-window_size:]
+                    match = ends[stream].search(windows[stream])
+                    if match is None:
+                        continue
+                    buffers[stream].drop_last(len(match.group(0)))
+                    if stream is self.process.stdout:
+                        statuses = [int(status) for status in match.group(1).split()]
+                    pending.discard(stream)
+                    selector.unregister(stream)
+
+        return buffers[self.process.stdout].text(), buffers[self.process.stderr].text(), statuses
+
+    def close(self):
+        if self.alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            stream.close()
+
+
+class ShellSessions:
+    """Named ShellSessions, created on first use and closed after idle_timeout seconds unused."""
+
+    def __init__(self, idle_timeout: float = 600.0, max_sessions: int = 8):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions: Dict[str, ShellSession] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> ShellSession:
+        with self.lock:
+            self.evict_idle()
+            session = self.sessions.get(name)
+            if session is None or not session.alive():
+                if session is not None:
+                    self.sessions.pop(name).close()
+                idle = [s for s in self.sessions.values() if s.name != name and not s.lock.locked()]
+                if len(self.sessions) >= self.max_sessions and idle:
+                    # Make room by closing the least recently used session
+                    oldest = min(idle, key=lambda s: s.last_used)
+                    self.sessions.pop(oldest.name).close()
+                session = self.sessions[name] = ShellSession(name)
+            session.last_used = time.monotonic()  # Not evicted between now and its next command
+            return session
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for name, session in list(self.sessions.items()):
+            # A session in the middle of a command holds its lock and is never idle
+            if now - session.last_used > self.idle_timeout and not session.lock.locked():
+                self.sessions.pop(name).close()
+
+    def close(self, name: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(name, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def close_all(self):
+        with self.lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            session.close()
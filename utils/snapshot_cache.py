@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional
+import tempfile
+import logging
+import json
+import os
+
+
+class SnapshotCache:
+    """
+    SnapTool's rendered file blocks, persisted as one JSON file.
+
+    Blocks are grouped by the snapshot's options (which files are included and how they are
+    rendered) and each is valid while its file's (mtime, size, inode) signature is unchanged. The
+    group of the latest snapshot with given options doubles as the record of which files it
+    contained, so the next snapshot can report what changed, and the signature of the state file
+    it wrote tells whether that file is still current.
+    """
+
+    def __init__(self, path: str = '.pyline_cache/snapshot.json'):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.data = None  # Loaded on first use
+
+    @staticmethod
+    def signature(stat: os.stat_result) -> List[int]:
+        return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+    def load(self) -> dict:
+        if self.data is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
+            self.data.setdefault('snapshots', {})
+            self.data.setdefault('state', None)
+        return self.data
+
+    def files(self, options: str) -> Dict[str, list]:
+        """{path: [signature, block]} of the previous snapshot taken with these options."""
+        return self.load()['snapshots'].get(options, {})
+
+    def block(self, options: str, path: str, signature: List[int]) -> Optional[str]:
+        entry = self.files(options).get(path)
+        return entry[1] if entry is not None and entry[0] == signature else None
+
+    def state_is_current(self, state_key: str, state_path: str) -> bool:
+        state = self.load()['state']
+        try:
+            signature = self.signature(os.stat(state_path))
+        except OSError:
+            return False
+        return state is not None and state == [state_key, signature]
+
+    def save(self, options: str, files: Dict[str, list], state_path: Optional[str] = None,
+             state_key: Optional[str] = None):
+        """
+        Record a snapshot's files and, if it was written, the state file's signature under state_key
+        (by default the options). The cache file is only rewritten when either differs from before.
+        """
+        data = self.load()
+        state = data['state']
+        if state_path is not None:
+            state = [state_key or options, self.signature(os.stat(state_path))]
+        if data['snapshots'].get(options) == files and data['state'] == state:
+            return  # An unchanged snapshot leaves the cache file alone
+        data['snapshots'][options] = files
+        data['state'] = state
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+import threading
+import sys
+
+
+class ThreadLocalStdout:
+    """
+    Stands in for sys.stdout: writes from a thread that is capturing go to that thread's buffer,
+    everything else to the stdout that was in place when the proxy was installed.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def target(self):
+        stream = getattr(self.local, 'stream', None)
+        return stream if stream is not None else self.default
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        return self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+
+install_lock = threading.Lock()
+
+
+def thread_local_stdout() -> ThreadLocalStdout:
+    """The installed proxy, installing one over the current sys.stdout if it was replaced since."""
+    with install_lock:
+        if not isinstance(sys.stdout, ThreadLocalStdout):
+            sys.stdout = ThreadLocalStdout(sys.stdout)
+        return sys.stdout
+
+
+@contextmanager
+def capture_stdout(stream):
+    """
+    Like contextlib.redirect_stdout, but only for the current thread, so other threads (the tool
+    pool, the main thread echoing results or streaming deltas) keep printing to the terminal.
+    Threads started inside the block are not captured.
+    """
+    proxy = thread_local_stdout()
+    previous = getattr(proxy.local, 'stream', None)
+    proxy.local.stream = stream
+    try:
+        yield stream
+    finally:
+        proxy.local.stream = previous
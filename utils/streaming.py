@@ -0,0 +1,142 @@
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+import inspect
+import time
+
+if TYPE_CHECKING:
+    # The openai package takes about half a second to import, so it is only loaded once a
+    # response is actually streamed (a lazy ToolManager starts without it)
+    from openai.types.chat import ChatCompletion, ChatCompletionMessageToolCall
+
+
+class ToolCallAssembler:
+    """
+    Accumulates streamed tool-call fragments by index. A call is complete as soon as a fragment
+    for a later index arrives (calls are streamed one after another) or the stream ends.
+    """
+
+    def __init__(self):
+        self.calls: Dict[int, dict] = {}
+        self.current: Optional[int] = None
+
+    @staticmethod
+    def to_tool_call(call: dict) -> 'ChatCompletionMessageToolCall':
+        from openai.types.chat import ChatCompletionMessageToolCall
+        from openai.types.chat.chat_completion_message_tool_call import Function
+        return ChatCompletionMessageToolCall(
+            id=call['id'],
+            type='function',
+            function=Function(name=call['name'], arguments=''.join(call['arguments']))
+        )
+
+    def build(self, index: int) -> 'ChatCompletionMessageToolCall':
+        self.calls[index]['done'] = True
+        return self.to_tool_call(self.calls[index])
+
+    def feed(self, deltas) -> List['ChatCompletionMessageToolCall']:
+        completed = []
+        for delta in deltas:
+            if self.current is not None and delta.index != self.current and not self.calls[self.current]['done']:
+                completed.append(self.build(self.current))
+            self.current = delta.index
+
+            call = self.calls.setdefault(delta.index, {'id': None, 'name': '', 'arguments': [], 'done': False})
+            if delta.id:
+                call['id'] = delta.id
+            if delta.function is not None:
+                call['name'] += delta.function.name or ''
+                call['arguments'].append(delta.function.arguments or '')
+        return completed
+
+    def finish(self) -> List['ChatCompletionMessageToolCall']:
+        return [self.build(index) for index in sorted(self.calls) if not self.calls[index]['done']]
+
+    def tool_calls(self) -> Optional[List['ChatCompletionMessageToolCall']]:
+        return [self.to_tool_call(call) for _, call in sorted(self.calls.items())] or None
+
+
+class StreamState:
+    """Shared chunk handling for the sync and async stream consumers."""
+
+    def __init__(self, on_delta: Optional[Callable[[str], None]]):
+        self.on_delta = on_delta
+        self.content: List[str] = []
+        self.assembler = ToolCallAssembler()
+        self.finish_reason = None
+        self.id = None
+        self.model = None
+        self.created = None
+        self.usage = None
+
+    def feed(self, chunk) -> List['ChatCompletionMessageToolCall']:
+        self.id, self.model, self.created = chunk.id, chunk.model, chunk.created
+        # With include_usage the last chunk carries the usage and no choices; older SDKs leave it a dict
+        usage = getattr(chunk, 'usage', None)
+        if usage:
+            from openai.types.completion_usage import CompletionUsage
+            self.usage = CompletionUsage.model_validate(usage) if isinstance(usage, dict) else usage
+        if not chunk.choices:
+            return []
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        if delta is None:
+            return []
+        if delta.content:
+            self.content.append(delta.content)
+            if self.on_delta is not None:
+                self.on_delta(delta.content)
+        if delta.tool_calls:
+            return self.assembler.feed(delta.tool_calls)
+        return []
+
+    def completion(self) -> 'ChatCompletion':
+        from openai.types.chat import ChatCompletion, ChatCompletionMessage
+        from openai.types.chat.chat_completion import Choice
+        message = ChatCompletionMessage(
+            role='assistant',
+            content=''.join(self.content) or None,
+            tool_calls=self.assembler.tool_calls()
+        )
+        return ChatCompletion(
+            id=self.id or 'stream',
+            choices=[Choice(finish_reason=self.finish_reason or 'stop', index=0, message=message)],
+            created=self.created or int(time.time()),
+            model=self.model or '',
+            object='chat.completion',
+            usage=self.usage
+        )
+
+
+def consume_stream(stream, on_delta=None, on_tool_call=None) -> 'ChatCompletion':
+    """
+    Drain a `stream=True` completion, passing content deltas to on_delta and each tool call to
+    on_tool_call as soon as its arguments are complete. Returns the equivalent ChatCompletion.
+    """
+    state = StreamState(on_delta)
+    for chunk in stream:
+        for tool_call in state.feed(chunk):
+            if on_tool_call is not None:
+                on_tool_call(tool_call)
+    for tool_call in state.assembler.finish():
+        if on_tool_call is not None:
+            on_tool_call(tool_call)
+    return state.completion()
+
+
+async def aconsume_stream(stream, on_delta=None, on_tool_call=None) -> 'ChatCompletion':
+    """Async counterpart of consume_stream; on_tool_call may be a coroutine function."""
+    state = StreamState(on_delta)
+
+    async def dispatch(tool_call):
+        if on_tool_call is not None:
+            result = on_tool_call(tool_call)
+            if inspect.isawaitable(result):
+                await result
+
+    async for chunk in stream:
+        for tool_call in state.feed(chunk):
+            await dispatch(tool_call)
+    for tool_call in state.assembler.finish():
+        await dispatch(tool_call)
+    return state.completion()
@@ -0,0 +1,294 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import tempfile
+import logging
+import json
+import ast
+import os
+import re
+
+STOP_WORDS = {'the', 'and', 'for', 'with', 'that', 'this', 'from', 'into', 'def', 'self', 'none', 'true', 'false'}
+
+
+def terms(text: str) -> Set[str]:
+    """Lower-case words of a text, with snake_case and CamelCase identifiers split into their parts."""
+    words = set()
+    for token in re.findall(r'[A-Za-z][A-Za-z0-9]*', text or ''):
+        parts = re.findall(r'[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+', token)
+        for word in [token] + parts:
+            word = word.lower()
+            if len(word) > 2 and word not in STOP_WORDS:
+                words.add(word)
+    return words
+
+
+class SymbolVisitor(ast.NodeVisitor):
+    """Collects the classes, functions and methods of a module, and the names each of them calls."""
+
+    def __init__(self):
+        self.definitions = []
+        self.imports = []
+        self.scope = []
+
+    def visit_Import(self, node):
+        self.imports.extend(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.imports.append('.' * node.level + node.module)
+
+    def definition(self, node, kind: str, signature: str):
+        qualname = '.'.join(self.scope + [node.name])
+        calls = sorted({
+            call.func.id if isinstance(call.func, ast.Name) else call.func.attr
+            for call in ast.walk(node)
+            if isinstance(call, ast.Call) and isinstance(call.func, (ast.Name, ast.Attribute))
+        })
+        decorators = [f"@{ast.unparse(decorator)}" for decorator in node.decorator_list]
+        self.definitions.append({
+            'kind': kind,
+            'name': node.name,
+            'qualname': qualname,
+            'depth': len(self.scope),
+            'start': min([node.lineno] + [d.lineno for d in node.decorator_list]),
+            'end': node.end_lineno,
+            'signature': '\n'.join(decorators + [signature]),
+            'doc': (ast.get_docstring(node) or '').strip().split('\n')[0],
+            'calls': calls,
+        })
+
+    def visit_ClassDef(self, node):
+        bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(keyword) for keyword in node.keywords]
+        self.definition(node, 'class', f"class {node.name}{'(' + ', '.join(bases) + ')' if bases else ''}:")
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node, prefix: str = ''):
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ''
+        kind = 'method' if self.scope else 'function'
+        self.definition(node, kind, f"{prefix}def {node.name}({ast.unparse(node.args)}){returns}:")
+        # Nested functions are part of their enclosing definition, but imports inside are still seen
+        for child in ast.walk(node):
+            if isinstance(child, (ast.Import, ast.ImportFrom)):
+                self.visit(child)
+
+    def visit_AsyncFunctionDef(self, node):
+        self.visit_FunctionDef(node, 'async ')
+
+
+class SymbolIndex:
+    """
+    An ast-based index of Python files: per module its docstring, imports, classes, functions and
+    methods (signature, docstring, line span) and the names each definition calls.
+
+    The index is persisted as JSON and updated incrementally: a file is parsed again only when its
+    (mtime, size, inode) signature changes. rank() scores files and definitions against a query.
+    """
+
+    version = 1
+
+    def __init__(self, path: str = '.pyline_cache/symbols.json'):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.entries: Optional[Dict[str, dict]] = None  # Loaded on first use
+
+    def load(self) -> Dict[str, dict]:
+        if self.entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self.entries = data['files'] if data.get('version') == self.version else {}
+            except (OSError, ValueError, KeyError):
+                self.entries = {}
+        return self.entries
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.version, 'files': self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def parse(source: str) -> dict:
+        try:
+            tree = ast.parse(source)
+        except SyntaxError as e:
+            return {'error': f"{e.msg} (line {e.lineno})", 'doc': '', 'imports': [], 'definitions': []}
+        visitor = SymbolVisitor()
+        visitor.visit(tree)
+        return {
+            'doc': (ast.get_docstring(tree) or '').strip().split('\n')[0],
+            'imports': visitor.imports,
+            'definitions': visitor.definitions,
+        }
+
+    def update(self, signatures: Dict[str, list]) -> Dict[str, dict]:
+        """
+        Bring the index up to date with the given {path: signature} of Python files, dropping any
+        other files, and return their entries.
+        """
+        entries = self.load()
+        changed = False
+        for path in list(entries):
+            if path not in signatures:
+                del entries[path]
+                changed = True
+        for path, signature in signatures.items():
+            entry = entries.get(path)
+            if entry is not None and entry['signature'] == signature:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    source = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                self.logger.debug(f"Cannot index {path}: {e}")
+                continue
+            entries[path] = dict(self.parse(source), signature=signature)
+            changed = True
+        if changed:
+            self.save()
+        return {path: entries[path] for path in signatures if path in entries}
+
+    @staticmethod
+    def module_name(path: str) -> str:
+        return path.removeprefix('./').removesuffix('.py').removesuffix('/__init__').replace('/', '.')
+
+    def rank(self, entries: Dict[str, dict], paths: Iterable[str], query: str):
+        """
+        Score every path and every definition against the query. Matches in a file's path and in
+        definition names weigh most, then docstrings and called names; a file also gains half the
+        best score among the modules it imports or that import it. Returns
+        ({path: score}, {(path, qualname): score}).
+        """
+        wanted = terms(query)
+        definition_scores = {}
+        base = {}
+        for path in paths:
+            entry = entries.get(path) or {'doc': '', 'imports': [], 'definitions': []}
+            score = 3 * len(wanted & terms(path)) + len(wanted & terms(entry['doc']))
+            score += len(wanted & terms(' '.join(entry['imports'])))
+            for definition in entry['definitions']:
+                value = (3 * len(wanted & terms(definition['name'])) + len(wanted & terms(definition['doc']))
+                         + len(wanted & terms(' '.join(definition['calls']))))
+                definition_scores[(path, definition['qualname'])] = value
+                score += value
+            base[path] = score
+
+        # Relevance spreads along imports in both directions
+        by_module = {self.module_name(path): path for path in base}
+        neighbours = {path: set() for path in base}
+        for path in base:
+            for module in (entries.get(path) or {}).get('imports', []):
+                target = by_module.get(module.lstrip('.'))
+                if target is not None and target != path:
+                    neighbours[path].add(target)
+                    neighbours[target].add(path)
+        scores = {path: score + 0.5 * max((base[n] for n in neighbours[path]), default=0)
+                  for path, score in base.items()}
+        return scores, definition_scores
+
+
+def render_stub(path: str, entry: Optional[dict], source_lines: List[str], line_numbers: bool,
+                expanded: Set[str] = frozenset()) -> str:
+    """
+    A file as its definitions' signatures and first docstring lines, with the definitions named in
+    `expanded` (qualnames) included in full.
+    """
+    def numbered(number: int, text: str) -> str:
+        return f"{number: >4}: {text}" if line_numbers else text
+
+    out = []
+    if entry is None or entry.get('error'):
+        reason = entry['error'] if entry else 'not Python'
+        out.append(f"[contents omitted: {reason}]")
+    else:
+        if entry['doc']:
+            out.append(numbered(1, f'"""{entry["doc"]}"""'))
+        inside_expanded = None
+        for definition in entry['definitions']:
+            qualname = definition['qualname']
+            if inside_expanded and qualname.startswith(inside_expanded + '.'):
+                continue  # Already part of an expanded class
+            if qualname in expanded:
+                inside_expanded = qualname
+                for number in range(definition['start'], definition['end'] + 1):
+                    out.append(numbered(number, source_lines[number - 1].rstrip('\n')))
+                continue
+            indent = '    ' * definition['depth']
+            signature_lines = definition['signature'].split('\n')
+            for offset, line in enumerate(signature_lines):
+                out.append(numbered(definition['start'] + offset, indent + line))
+            body_indent = indent + '    '
+            if definition['doc']:
+                out.append(f"{'      ' if line_numbers else ''}{body_indent}\"\"\"{definition['doc']}\"\"\"")
+            if definition['kind'] != 'class':
+                out.append(f"{'      ' if line_numbers else ''}{body_indent}...")
+    body = '\n'.join(out)
+    return f'--- BEGIN {path} (signatures only) ---\n{body}\n--- END {path} ---\n\n'
+
+
+def plan_snapshot(paths: List[str], blocks: Dict[str, str], entries: Dict[str, dict], index: SymbolIndex,
+                  query: str, budget: int, count: Callable[[str], int], line_numbers: bool) -> List[str]:
+    """
+    Choose what each file contributes to a snapshot of at most `budget` tokens: its full block for
+    the most relevant files, a stub with its most relevant definitions in full for the next ones,
+    a signatures-only stub for the rest and, if even the stubs do not fit, nothing for the least
+    relevant files (listed at the end, by name if the names fit). Returns the texts in path order.
+    """
+    scores, definition_scores = index.rank(entries, paths, query)
+    ranked = sorted(paths, key=lambda path: (-scores[path], path))
+    sources = {}
+
+    def source_lines(path):
+        if path not in sources:
+            try:
+                with open(path, 'r') as f:
+                    sources[path] = f.readlines()
+            except (OSError, UnicodeDecodeError):
+                sources[path] = []
+        return sources[path]
+
+    chosen = {path: render_stub(path, entries.get(path), [], line_numbers) for path in paths}
+    costs = {path: count(text) for path, text in chosen.items()}
+    used = sum(costs.values())
+    omitted = []
+    # Dropped files are listed at the end, so room for at least their number has to be kept
+    for path in reversed(ranked):
+        if used + (count(f"[{len(omitted)} less relevant files omitted]\n\n") if omitted else 0) <= budget:
+            break
+        used -= costs.pop(path)
+        del chosen[path]
+        omitted.append(path)
+    listing = ''
+    if omitted:
+        # With their names if those fit too
+        for listing in (f"[{len(omitted)} less relevant files omitted: {', '.join(sorted(omitted))}]\n\n",
+                        f"[{len(omitted)} less relevant files omitted]\n\n", ''):
+            if used + count(listing) <= budget:
+                break
+    used += count(listing)
+
+    for path in ranked:
+        if path not in chosen:
+            continue
+        full_cost = count(blocks[path])
+        if used - costs[path] + full_cost <= budget:
+            used += full_cost - costs[path]
+            chosen[path], costs[path] = blocks[path], full_cost
+            continue
+        # Too big as a whole: expand its most relevant definitions while they fit
+        relevant = sorted(
+            (d for d in (entries.get(path) or {}).get('definitions', []) if definition_scores.get((path, d['qualname']))),
+            key=lambda d: -definition_scores[(path, d['qualname'])]
+        )
+        expanded = set()
+        for definition in relevant:
+            candidate = render_stub(path, entries[path], source_lines(path), line_numbers, expanded | {definition['qualname']})
+            cost = count(candidate)
+            if used - costs[path] + cost <= budget:
+                used += cost - costs[path]
+                chosen[path], costs[path] = candidate, cost
+                expanded.add(definition['qualname'])
+
+    return [chosen[path] for path in sorted(chosen)] + ([listing] if listing else [])
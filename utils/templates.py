@@ -0,0 +1,81 @@
+from typing import Dict, FrozenSet
+import re
+
+PLACEHOLDER = re.compile(r'\$\{([^}]+)\}')
+
+
+class StringTemplate:
+    """A string parsed once into literal text and ${id} references, resolved in a single pass."""
+
+    __slots__ = ('parts', 'refs')
+
+    def __init__(self, parts):
+        # re.split with a capture group alternates literals (even indices) and ids (odd indices)
+        self.parts = parts
+        self.refs: FrozenSet[str] = frozenset(parts[1::2])
+
+    def resolve(self, outputs: Dict[str, str]) -> str:
+        if len(self.parts) == 3 and not self.parts[0] and not self.parts[2] and self.parts[1] in outputs:
+            return str(outputs[self.parts[1]])  # The whole value is one placeholder: no copy
+        pieces = list(self.parts)
+        for index in range(1, len(pieces), 2):
+            name = pieces[index]
+            # Unknown ids are left as written
+            pieces[index] = str(outputs[name]) if name in outputs else f"${{{name}}}"
+        return ''.join(pieces)
+
+
+class DictTemplate:
+    """A dict whose values contain placeholders; only those values are re-resolved."""
+
+    __slots__ = ('value', 'templates', 'refs')
+
+    def __init__(self, value: dict, templates: dict):
+        self.value = value
+        self.templates = templates
+        self.refs = frozenset().union(*(t.refs for t in templates.values()))
+
+    def resolve(self, outputs: Dict[str, str]) -> dict:
+        resolved = dict(self.value)
+        for key, template in self.templates.items():
+            resolved[key] = template.resolve(outputs)
+        return resolved
+
+
+class ListTemplate:
+    """A list whose elements contain placeholders; every element is kept, in order."""
+
+    __slots__ = ('value', 'templates', 'refs')
+
+    def __init__(self, value: list, templates: dict):
+        self.value = value
+        self.templates = templates
+        self.refs = frozenset().union(*(t.refs for t in templates.values()))
+
+    def resolve(self, outputs: Dict[str, str]) -> list:
+        resolved = list(self.value)
+        for index, template in self.templates.items():
+            resolved[index] = template.resolve(outputs)
+        return resolved
+
+
+def compile_template(value):
+    """
+    Compile a (possibly nested) parameter value. Returns a template with `refs` and `resolve(outputs)`,
+    or None if the value contains no placeholders and can be used as-is.
+    """
+    if isinstance(value, str):
+        parts = PLACEHOLDER.split(value)
+        return StringTemplate(parts) if len(parts) > 1 else None
+    if isinstance(value, dict):
+        templates = {key: t for key, t in ((key, compile_template(v)) for key, v in value.items()) if t is not None}
+        return DictTemplate(value, templates) if templates else None
+    if isinstance(value, list):
+        templates = {index: t for index, t in enumerate(map(compile_template, value)) if t is not None}
+        return ListTemplate(value, templates) if templates else None
+    return None
+
+
+def resolve_template(template, value, outputs: Dict[str, str]):
+    """Resolve a compiled template, or return the original value if it had no placeholders."""
+    return value if template is None else template.resolve(outputs)
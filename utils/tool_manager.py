@@ -1,30 +1,89 @@
 from tools.base_tool import BaseTool
-from typing import Dict, List
+from utils.schema_registry import SchemaRegistry
+from utils.tool_manifest import ToolManifest, LazyTool
+from utils.context_window import ContextWindow
+from utils.llm_client import LLMClient
+from utils.instrumentation import Tracer
+from utils.streaming import consume_stream, aconsume_stream
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+import contextvars
+import threading
+import asyncio
 import inspect
 import pkgutil
 import importlib
 import traceback
-from openai import OpenAI
 from colorama import Fore
+import os
 import importlib
 import logging
 import json
 import re
 
+# Names of the tools whose lock the current call chain holds (see ToolManager.tool_lock)
+held_tool_locks: ContextVar[frozenset] = ContextVar('pyline_held_tool_locks', default=frozenset())
+
 
 class ToolManager:
-    def __init__(self, package='tools', model='gpt-4-1106-preview'):
+    def __init__(self, package='tools', model='gpt-4-1106-preview', lazy=False, manifest_path=None, max_tool_workers=1,
+                 stream=False, on_delta=None, on_tool_delta=None, token_budget=None, response_cache=None, llm=None, tracer=None,
+                 approval=None, echo_tool_output=True):
         tools_package = importlib.import_module(package)
         self.logger = logging.getLogger(__name__)
         self.logger.info('ToolManager initialized') # Added logging
         self.tools: Dict[str, BaseTool] = {}
-        self.client = None
+        # Pooled, rate-limited OpenAI clients shared with every LLM-calling tool
+        self.llm = llm if llm is not None else LLMClient()
         self.model = model
+        # Spans for turns, completions and tool calls; exported by the caller (see main.py)
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.schema_registry = SchemaRegistry(self.generate_json_for_tool)
+
+        # With max_tool_workers > 1, the tool calls of one assistant turn run concurrently
+        self.max_tool_workers = max_tool_workers
+        self.tool_pool = None
+        self.tool_semaphore = None
+        self.tool_locks: Dict[str, threading.Lock] = {}
+
+        # An approval callable (e.g. ApprovalPolicy) replaces the interactive y/n prompt for unattended runs
+        self.approval = approval
+        self.echo_tool_output = echo_tool_output
+
+        # In streaming mode content deltas are handed to on_delta as they arrive (printed by default)
+        self.stream = stream
+        self.on_delta = on_delta if on_delta is not None else self.print_delta
+        # Deltas of completions that tools make on their own (e.g. GptTool) go to on_tool_delta(tool_name, text),
+        # never to on_delta; without one those completions are not streamed
+        self.on_tool_delta = on_tool_delta
+
+        # With a token budget, old tool outputs are trimmed or evicted before each completion
+        self.context_window = ContextWindow(token_budget, model=model) if token_budget else None
+
+        # Optional ResponseCache shared by every LLM call the manager and its tools make
+        self.response_cache = response_cache
+
+        # In lazy mode tools are registered from the manifest and only imported on first use
+        self.manifest = None
+        if lazy:
+            if manifest_path is None:
+                manifest_path = os.path.join(tools_package.__path__[0], '.tool_manifest.json')
+            self.manifest = ToolManifest(manifest_path, self.generate_json_for_tool)
+
         self.load_tools(tools_package)
 
+    @staticmethod
+    def print_delta(text: str):
+        print(text, end='', flush=True)
+
     # Split the discovery into two phases
     def load_tools(self, tools_package):
-        atomic_tools, complex_tools = self.discover_tools(tools_package)
+        if self.manifest is not None:
+            atomic_tools, complex_tools = self.manifest.discover(tools_package)
+        else:
+            atomic_tools, complex_tools = self.discover_tools(tools_package)
 
         # Load atomic tools first
         for name, tool_cls in atomic_tools.items():
@@ -41,6 +100,7 @@ class ToolManager:
                 self.logger.error(error_message)
         
         self.logger.info(f"Loaded tools: {self.tools}")
+        self.schema_registry.sync(self.tools)
         
     # Check if specified dependencies are satisfied
     def check_dependencies(self, dependencies: List[str]) -> bool:
@@ -124,9 +184,9 @@ class ToolManager:
         return json_definition
 
     def get_tools_json(self):
-        return [
-            self.generate_json_for_tool(tool.__class__) for tool in self.tools.values()
-        ]
+        # Cheap fingerprint check per tool; only tools changed at runtime (e.g. via ExecTool) are re-introspected
+        self.schema_registry.sync(self.tools)
+        return self.schema_registry.payload()
 
     # Separate discovery into atomic and complex tools
     def discover_tools(self, tools_package):
@@ -146,70 +206,345 @@ class ToolManager:
 
         return atomic_tools, complex_tools
         
+    @contextmanager
+    def tool_lock(self, tool_name: str):
+        """
+        Serialize calls to a tool that is not parallel-safe. The lock belongs to the call chain, not
+        the thread: calls made on behalf of the holder, directly or on threads running a copy of its
+        context (pipeline steps, channel producers), go ahead without it, so a tool may call itself
+        through PipelineTool without deadlocking on its own lock.
+        """
+        held = held_tool_locks.get()
+        if tool_name in held:
+            yield
+            return
+        with self.tool_locks.setdefault(tool_name, threading.Lock()):
+            token = held_tool_locks.set(held | {tool_name})
+            try:
+                yield
+            finally:
+                held_tool_locks.reset(token)
+
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         try:
             tool_obj = self.tools[tool_name]
-            return tool_obj.execute(**kwargs)
+            if isinstance(tool_obj, LazyTool):
+                tool_obj = tool_obj.resolve()
+            with self.tracer.span('tool_call', tool_name):
+                if tool_obj.allows_parallel(**kwargs):
+                    return tool_obj.execute(**kwargs)
+                with self.tool_lock(tool_name):
+                    return tool_obj.execute(**kwargs)
+        except Exception as e:
+            return f"Error executing {tool_name}: {traceback.format_exc()} {e}"
+
+    def execute_tool_stream(self, tool_name: str, chunks=None, **kwargs) -> Iterator[str]:
+        """Streaming counterpart of execute_tool: yields the tool's output chunks, or one error message."""
+        try:
+            tool_obj = self.tools[tool_name]
+            if isinstance(tool_obj, LazyTool):
+                tool_obj = tool_obj.resolve()
+            with self.tracer.span('tool_call', tool_name, stream=True):
+                if tool_obj.allows_parallel(**kwargs):
+                    yield from tool_obj.execute_stream(chunks, **kwargs)
+                    return
+                with self.tool_lock(tool_name):
+                    yield from tool_obj.execute_stream(chunks, **kwargs)
+        except Exception as e:
+            yield f"Error executing {tool_name}: {traceback.format_exc()} {e}"
+
+    async def aexecute_tool(self, tool_name: str, **kwargs) -> str:
+        try:
+            tool_obj = self.tools[tool_name]
+            if isinstance(tool_obj, LazyTool):
+                tool_obj = tool_obj.resolve()
+            if not tool_obj.allows_parallel(**kwargs) or type(tool_obj).aexecute is BaseTool.aexecute:
+                # Take the per-tool lock on a worker thread instead of blocking the event loop, and
+                # open the span of a synchronous tool there so it measures that thread's CPU time;
+                # to_thread carries the current span over so the tool call nests under it
+                return await asyncio.to_thread(self.execute_tool, tool_name, **kwargs)
+            with self.tracer.span('tool_call', tool_name):
+                return await tool_obj.aexecute(**kwargs)
         except Exception as e:
             return f"Error executing {tool_name}: {traceback.format_exc()} {e}"
 
+    def confirm_tool_call(self, tool_name: str, function_args: str) -> bool:
+        if self.approval is not None:
+            return self.approval(tool_name, function_args)
+        return input(f"{Fore.MAGENTA}{tool_name}({function_args}) ? (y/n) ").lower() != 'n'
+
+    async def aconfirm_tool_call(self, tool_name: str, function_args: str) -> bool:
+        if self.approval is not None:
+            return self.approval(tool_name, function_args)
+        # input() blocks, so ask on a worker thread to keep the loop free
+        return await asyncio.to_thread(self.confirm_tool_call, tool_name, function_args)
+
+    def echo(self, text: str):
+        if self.echo_tool_output:
+            print(f"{Fore.MAGENTA}{text}")
+
+    @staticmethod
+    def tool_call_kwargs(tool_call) -> dict:
+        function_args = tool_call.function.arguments
+        try:
+            return json.loads(function_args)
+        except Exception as e:
+            print(f'{Fore.RED}Error parsing JSON {function_args=}: {e}')
+            return {}
+
+    def run_tool_call(self, tool_call) -> str:
+        return self.execute_tool(tool_call.function.name, **self.tool_call_kwargs(tool_call))
+
+    async def arun_tool_call(self, tool_call) -> str:
+        return await self.aexecute_tool(tool_call.function.name, **self.tool_call_kwargs(tool_call))
+
+    @staticmethod
+    def tool_response(tool_call, result) -> Dict[str, str]:
+        if result is None:
+            result = "None"
+
+        return {
+            "tool_call_id": tool_call.id,
+            "role": "tool",
+            "name": tool_call.function.name,
+            "content": json.dumps(result) if isinstance(result, dict) else result
+        }
+
+    def start_tool_call(self, tool_call, confirmed=None) -> Optional[Future]:
+        """
+        Confirm a tool call and start it. Sequential managers run it inline; concurrent ones
+        submit it to the tool pool. Returns None if the call was rejected.
+        """
+        if confirmed is None:
+            confirmed = self.confirm_tool_call(tool_call.function.name, tool_call.function.arguments)
+        if not confirmed:
+            return None
+
+        if self.max_tool_workers > 1:
+            if self.tool_pool is None:
+                self.tool_pool = ThreadPoolExecutor(max_workers=self.max_tool_workers, thread_name_prefix='tool')
+            # Run in a copy of the caller's context so the tool call's span nests under the turn
+            return self.tool_pool.submit(contextvars.copy_context().run, self.run_tool_call, tool_call)
+
+        self.echo("=>")
+        future = Future()
+        future.set_result(self.run_tool_call(tool_call))
+        self.echo(future.result())
+        return future
+
+    def collect_tool_calls(self, tool_calls, futures) -> List[Dict[str, str]]:
+        """Wait for started tool calls and build their responses in call order."""
+        tool_call_responses = []
+        for tool_call, future in zip(tool_calls, futures):
+            if future is None:
+                result = f"User rejected tool usage!"
+            else:
+                result = future.result()
+                if self.max_tool_workers > 1:
+                    self.echo(f"{tool_call.function.name} =>")
+                    self.echo(result)
+            tool_call_responses.append(self.tool_response(tool_call, result))
+        return tool_call_responses
+
+    def run_tool_calls(self, tool_calls) -> List[Dict[str, str]]:
+        """Confirm and execute the tool calls of one assistant turn, returning responses in call order."""
+        if self.max_tool_workers <= 1:
+            futures = [self.start_tool_call(tool_call) for tool_call in tool_calls]
+        else:
+            # Ask for every confirmation up front so the prompts don't interleave with running tools
+            approved = [self.confirm_tool_call(tc.function.name, tc.function.arguments) for tc in tool_calls]
+            futures = [self.start_tool_call(tool_call, ok) for tool_call, ok in zip(tool_calls, approved)]
+        return self.collect_tool_calls(tool_calls, futures)
+
+    async def arun_tool_calls(self, tool_calls) -> List[Dict[str, str]]:
+        """Async counterpart of run_tool_calls."""
+        if self.max_tool_workers <= 1:
+            tasks = [await self.astart_tool_call(tool_call) for tool_call in tool_calls]
+        else:
+            approved = [await self.aconfirm_tool_call(tc.function.name, tc.function.arguments) for tc in tool_calls]
+            tasks = [await self.astart_tool_call(tool_call, ok) for tool_call, ok in zip(tool_calls, approved)]
+        return await self.acollect_tool_calls(tool_calls, tasks)
+
+    def tool_slots(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to one event loop, so recreate the semaphore for a new loop
+        loop = asyncio.get_running_loop()
+        if self.tool_semaphore is None or self.tool_semaphore[0] is not loop:
+            self.tool_semaphore = (loop, asyncio.Semaphore(self.max_tool_workers))
+        return self.tool_semaphore[1]
+
+    async def astart_tool_call(self, tool_call, confirmed=None) -> Optional[asyncio.Task]:
+        if confirmed is None:
+            confirmed = await self.aconfirm_tool_call(tool_call.function.name, tool_call.function.arguments)
+        if not confirmed:
+            return None
+
+        if self.max_tool_workers > 1:
+            slots = self.tool_slots()
+
+            async def run():
+                async with slots:
+                    return await self.arun_tool_call(tool_call)
+            return asyncio.ensure_future(run())
+
+        self.echo("=>")
+        task = asyncio.ensure_future(self.arun_tool_call(tool_call))
+        await task
+        self.echo(task.result())
+        return task
+
+    async def acollect_tool_calls(self, tool_calls, tasks) -> List[Dict[str, str]]:
+        tool_call_responses = []
+        for tool_call, task in zip(tool_calls, tasks):
+            if task is None:
+                result = f"User rejected tool usage!"
+            else:
+                result = await task
+                if self.max_tool_workers > 1:
+                    self.echo(f"{tool_call.function.name} =>")
+                    self.echo(result)
+            tool_call_responses.append(self.tool_response(tool_call, result))
+        return tool_call_responses
+
+    def cached_response(self, params: dict, span, on_delta):
+        """Look the request up in the response cache; a hit's content is passed to on_delta whole."""
+        key, cached = self.response_cache.lookup(**params) if self.response_cache is not None else (None, None)
+        span.attributes['cached'] = cached is not None
+        if cached is not None and on_delta is not None and cached.choices[0].message.content:
+            # Tool calls of a cached response are run by the caller after the fact
+            on_delta(cached.choices[0].message.content)
+        return key, cached
+
+    @staticmethod
+    def stream_params(params: dict) -> dict:
+        # Ask for a final usage chunk; sent as extra_body, since the pinned SDK has no stream_options argument
+        extra_body = dict(params.get('extra_body') or {}, stream_options={'include_usage': True})
+        return dict(params, extra_body=extra_body)
+
+    def complete(self, params: dict, on_delta=None, on_tool_call=None):
+        """
+        Create a chat completion through the response cache, in a 'completion' span that records its
+        token usage. With on_delta the completion is streamed: content deltas go to on_delta and tool
+        calls to on_tool_call as soon as their arguments are complete. Used by the manager's own
+        turns and by tools that call the LLM.
+        """
+        with self.tracer.span('completion', params['model'], stream=on_delta is not None) as span:
+            key, cached = self.cached_response(params, span, on_delta)
+            if cached is not None:
+                return cached
+
+            self.logger.debug(f"Creating ChatCompletion for messages: {params['messages']}")
+            if on_delta is None:
+                response = self.llm.create(**params)
+            else:
+                stream = self.llm.create(stream=True, **self.stream_params(params))
+                response = consume_stream(stream, on_delta, on_tool_call)
+            self.tracer.record_usage(getattr(response, 'usage', None), params['model'])
+
+        if self.response_cache is not None:
+            self.response_cache.put(key, response)
+        return response
+
+    async def acomplete(self, params: dict, on_delta=None, on_tool_call=None):
+        """Async counterpart of complete; on_tool_call may be a coroutine function."""
+        with self.tracer.span('completion', params['model'], stream=on_delta is not None) as span:
+            key, cached = self.cached_response(params, span, on_delta)
+            if cached is not None:
+                return cached
+
+            self.logger.debug(f"Creating async ChatCompletion for messages: {params['messages']}")
+            if on_delta is None:
+                response = await self.llm.acreate(**params)
+            else:
+                stream = await self.llm.acreate(stream=True, **self.stream_params(params))
+                response = await aconsume_stream(stream, on_delta, on_tool_call)
+            self.tracer.record_usage(getattr(response, 'usage', None), params['model'])
+
+        if self.response_cache is not None:
+            self.response_cache.put(key, response)
+        return response
+
+    def create_completion(self, on_tool_call=None, **params):
+        """
+        Create a chat completion with the manager's client and model. In streaming mode content
+        deltas go to on_delta and tool calls to on_tool_call as soon as their arguments are complete.
+        """
+        if self.context_window is not None:
+            self.context_window.fit(params['messages'])
+        return self.complete(dict(model=self.model, **params), self.on_delta if self.stream else None, on_tool_call)
+
+    async def acreate_completion(self, on_tool_call=None, **params):
+        if self.context_window is not None:
+            self.context_window.fit(params['messages'])
+        return await self.acomplete(dict(model=self.model, **params), self.on_delta if self.stream else None,
+                                    on_tool_call)
 
     def get_response(self, messages: List[Dict[str, str]]) -> str:
-        if self.client is None:
-            self.client = OpenAI()
-        
-        self.logger.debug(f"Creating ChatCompletion for messages: {messages}")
-        response = self.client.chat.completions.create(
-            model=self.model,
+        with self.tracer.span('turn', 'get_response'):
+            return self.run_turn(messages)
+
+    async def aget_response(self, messages: List[Dict[str, str]]) -> str:
+        """Async counterpart of get_response, so one event loop can drive many conversations."""
+        with self.tracer.span('turn', 'aget_response'):
+            return await self.arun_turn(messages)
+
+    def run_turn(self, messages: List[Dict[str, str]]) -> str:
+        # Streamed tool calls are started while the rest of the completion is still arriving
+        tool_calls, futures = [], []
+
+        def dispatch(tool_call):
+            tool_calls.append(tool_call)
+            futures.append(self.start_tool_call(tool_call))
+
+        response = self.create_completion(
             messages=messages,
             tools=self.get_tools_json(),
-            tool_choice='auto'
+            tool_choice='auto',
+            on_tool_call=dispatch
         )
 
         completion_messages = response.choices[0].message
         messages.append(completion_messages)
-        tool_call_responses = []
-        # Process each tool call suggested by the GPT response
 
+        # Process each tool call suggested by the GPT response
         if completion_messages.tool_calls:
+            if tool_calls:
+                messages.extend(self.collect_tool_calls(tool_calls, futures))
+            else:
+                messages.extend(self.run_tool_calls(completion_messages.tool_calls))
 
-            for tool_call in completion_messages.tool_calls:
-                tool_name = tool_call.function.name
-                function_args = tool_call.function.arguments
-
-                # Execute the tool
-                if input(f"{Fore.MAGENTA}{tool_name}({function_args}) ? (y/n) ").lower() == 'n':
-                    result = f"User rejected tool usage!"
-                else:
-                    print(f"{Fore.MAGENTA}=>")
-                    try:
-                        kwargs = json.loads(function_args)
-                    except Exception as e:
-                        print(f'{Fore.RED}Error parsing JSON {function_args=}: {e}')
-                        kwargs = {}
-
-                    result = self.execute_tool(tool_name, **kwargs)
-                    print(f"{Fore.MAGENTA}{result}")
-
-                if result is None:
-                    result = "None"
-
-                # Prepare response
-                tool_response = {
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": tool_name,
-                    "content": json.dumps(result) if isinstance(result, dict) else result
-                }
-                tool_call_responses.append(tool_response)
-            
-            messages.extend(tool_call_responses)
-
-            second_response = self.client.chat.completions.create(
-                model=self.model,
+            second_response = self.create_completion(
                 messages=messages # disallow repeated function calls?
             )
             return second_response.choices[0].message
         
         else:
             return completion_messages
+
+    async def arun_turn(self, messages: List[Dict[str, str]]) -> str:
+        tool_calls, tasks = [], []
+
+        async def dispatch(tool_call):
+            tool_calls.append(tool_call)
+            tasks.append(await self.astart_tool_call(tool_call))
+
+        response = await self.acreate_completion(
+            messages=messages,
+            tools=self.get_tools_json(),
+            tool_choice='auto',
+            on_tool_call=dispatch
+        )
+
+        completion_messages = response.choices[0].message
+        messages.append(completion_messages)
+
+        if completion_messages.tool_calls:
+            if tool_calls:
+                messages.extend(await self.acollect_tool_calls(tool_calls, tasks))
+            else:
+                messages.extend(await self.arun_tool_calls(completion_messages.tool_calls))
+
+            second_response = await self.acreate_completion(messages=messages)
+            return second_response.choices[0].message
+
+        else:
+            return completion_messages
@@ -0,0 +1,157 @@
+from tools.base_tool import BaseTool
+from typing import Callable, Dict, List, Tuple
+import importlib
+import importlib.util
+import threading
+import hashlib
+import inspect
+import logging
+import pkgutil
+import json
+import os
+
+
+class ToolSpec:
+    """Everything the manager needs to register a tool without importing its module."""
+
+    def __init__(self, name: str, module: str, dependencies: List[str], schema: dict):
+        self.name = name
+        self.module = module
+        self.dependencies = dependencies
+        self.schema = schema
+
+    def __call__(self, manager) -> 'LazyTool':
+        # Mirrors `tool_cls(manager)` so specs can be loaded exactly like tool classes
+        return LazyTool(manager, self)
+
+
+class LazyTool:
+    """Placeholder registered in `ToolManager.tools` until the tool is first used."""
+
+    def __init__(self, manager, spec: ToolSpec):
+        self.manager = manager
+        self.spec = spec
+        self.tool = None
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        """Import the tool module, instantiate the tool and swap it into the manager."""
+        with self.lock:
+            if self.tool is None:
+                module = importlib.import_module(self.spec.module)
+                self.tool = getattr(module, self.spec.name)(self.manager)
+                self.manager.tools[self.spec.name] = self.tool
+                self.manager.logger.debug(f"Imported lazy tool {self.spec.name} from {self.spec.module}")
+        return self.tool
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not set in __init__, e.g. `execute`
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"<LazyTool {self.spec.name} ({self.spec.module})>"
+
+
+class ToolManifest:
+    """
+    On-disk record of the tools defined in each module of a tools package.
+
+    Entries are keyed by module name and validated against the module file's mtime and size,
+    falling back to a content hash, so unchanged modules never need to be imported at startup.
+    """
+    VERSION = 1
+
+    def __init__(self, path: str, builder: Callable[[type], dict]):
+        self.path = path
+        self.builder = builder
+        self.logger = logging.getLogger(__name__)
+        self.modules: Dict[str, dict] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == self.VERSION:
+            self.modules = data.get('modules', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.VERSION, 'modules': self.modules}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def is_current(self, entry: dict, path: str, stat: os.stat_result) -> bool:
+        if entry is None or entry.get('path') != path:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return True
+        # Touched but possibly unchanged (e.g. git checkout): compare contents before re-importing
+        if entry['sha256'] == self.file_hash(path):
+            entry['mtime_ns'], entry['size'] = stat.st_mtime_ns, stat.st_size
+            self.dirty = True
+            return True
+        return False
+
+    def build_entry(self, module_name: str, path: str, stat: os.stat_result) -> dict:
+        module = importlib.import_module(module_name)
+        tools = {}
+        for member_name, obj in inspect.getmembers(module):
+            if (inspect.isclass(obj) and issubclass(obj, BaseTool) and member_name != 'BaseTool'
+                    and obj.__module__ == module_name):
+                tools[member_name] = {
+                    'dependencies': list(getattr(obj, 'dependencies', [])),
+                    'schema': self.builder(obj),
+                }
+        self.logger.info(f"Rebuilt manifest entry for {module_name}: {list(tools)}")
+        return {
+            'path': path,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': self.file_hash(path),
+            'tools': tools,
+        }
+
+    def discover(self, tools_package) -> Tuple[Dict[str, ToolSpec], Dict[str, ToolSpec]]:
+        """Drop-in for `ToolManager.discover_tools` that yields ToolSpecs instead of classes."""
+        atomic_tools = {}
+        complex_tools = {}
+        seen = set()
+        for finder, name, ispkg in pkgutil.iter_modules(
+            tools_package.__path__,
+            tools_package.__name__ + "."):
+            if ispkg:
+                continue
+            spec = importlib.util.find_spec(name)
+            path = spec.origin
+            stat = os.stat(path)
+            entry = self.modules.get(name)
+            if not self.is_current(entry, path, stat):
+                entry = self.modules[name] = self.build_entry(name, path, stat)
+                self.dirty = True
+            seen.add(name)
+
+            for tool_name, tool in entry['tools'].items():
+                tool_spec = ToolSpec(tool_name, name, tool['dependencies'], tool['schema'])
+                if not tool_spec.dependencies:
+                    atomic_tools[tool_name] = tool_spec
+                else:
+                    complex_tools[tool_name] = tool_spec
+
+        for name in [name for name in self.modules if name not in seen]:
+            del self.modules[name]
+            self.dirty = True
+
+        if self.dirty:
+            self.save()
+        return atomic_tools, complex_tools